@@ -25,32 +25,76 @@ not specific to any installation mode (tui, gui, ks).
 """
 
 import os
+import errno
+import copy
+import shutil
+import stat
 import tempfile
 import subprocess
 import zipfile
 import tarfile
-import cpioarchive
 import re
+import struct
+import zlib
+import bz2
+import gzip
 import logging
+import hashlib
+import json
+import threading
 
-from collections import namedtuple
+from collections import namedtuple, deque
 from functools import wraps
+from multiprocessing.pool import ThreadPool
+try:
+    from queue import Queue, Empty
+except ImportError:
+    from Queue import Queue, Empty
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import rpm
+except ImportError:
+    rpm = None
 from pyanaconda import constants
 from pyanaconda import nm
 from pyanaconda.threads import threadMgr, AnacondaThread
 from org_fedora_oscap import utils
 from org_fedora_oscap.data_fetch import fetch_data
+from org_fedora_oscap.oscap_worker import OSCAPWorker
+from org_fedora_oscap.content_handling import ContentHandlingError, \
+    summarize_results
 
 log = logging.getLogger("anaconda")
 
 # everything else should be private
 __all__ = ["run_oscap_remediate", "get_fix_rules_pre",
+           "precompute_fix_rules_pre", "cancel_fix_rules_precomputation",
            "wait_and_fetch_net_data", "extract_data", "strip_content_dir",
+           "install_rpms", "start_oscap_worker", "stop_oscap_worker",
+           "generate_remediation_script", "run_remediation_script",
+           "install_first_boot_unit", "schedule_first_boot_evaluation",
+           "schedule_first_boot_report", "postprocess_results",
            "OSCAPaddonError"]
 
 INSTALLATION_CONTENT_DIR = "/tmp/openscap_data/"
 TARGET_CONTENT_DIR = "/root/openscap_data/"
 
+# data computed from the content and reused between the phases of the
+# installation (hidden, so that it is not copied to the target system)
+CACHE_DIR = utils.join_paths(INSTALLATION_CONTENT_DIR, ".cache")
+FIX_RULES_CACHE_DIR = utils.join_paths(CACHE_DIR, "fix_rules")
+PROFILES_CACHE_DIR = utils.join_paths(CACHE_DIR, "profiles")
+
 SSG_DIR = "/usr/share/xml/scap/ssg/content/"
 SSG_CONTENT = "ssg-rhel7-ds.xml"
 if constants.shortProductName != 'anaconda':
@@ -64,16 +108,113 @@ RESULTS_PATH = utils.join_paths(TARGET_CONTENT_DIR,
                                 "eval_remediate_results.xml")
 REPORT_PATH = utils.join_paths(TARGET_CONTENT_DIR,
                                "eval_remediate_report.html")
+ARF_RESULTS_PATH = utils.join_paths(TARGET_CONTENT_DIR,
+                                    "eval_remediate_results_arf.xml")
+RESULTS_SUMMARY_PATH = utils.join_paths(TARGET_CONTENT_DIR,
+                                        "eval_remediate_summary.json")
+REMEDIATION_LOG_PATH = utils.join_paths(TARGET_CONTENT_DIR,
+                                        "eval_remediate.log")
+
+# results format -> path to the results file
+RESULTS_PATHS = {"xccdf": RESULTS_PATH, "arf": ARF_RESULTS_PATH}
+
+# compression of the results -> suffix of the compressed files
+RESULTS_COMPRESSIONS = {"gzip": ".gz", "zstd": ".zst"}
+
+# bump when the format of the results summary changes
+RESULTS_SUMMARY_VERSION = 1
+REMEDIATION_SCRIPT_PATH = utils.join_paths(TARGET_CONTENT_DIR,
+                                           "remediation.sh")
+
+# fix elements with this 'system' attribute make up the remediation script
+SCRIPT_FIX_SYSTEM_ATTR = "urn:xccdf:fix:script:sh"
+
+# first-boot systemd units are installed to this directory and enabled for
+# this target
+SYSTEMD_UNITS_DIR = "/etc/systemd/system"
+FIRST_BOOT_TARGET = "multi-user.target"
+FIRST_BOOT_EVAL_UNIT = "oscap-anaconda-addon-eval.service"
+FIRST_BOOT_REPORT_UNIT = "oscap-anaconda-addon-report.service"
+
+FIRST_BOOT_UNIT_TEMPLATE = """[Unit]
+Description=%(description)s
+After=%(target)s
+
+[Service]
+Type=oneshot
+ExecStart=%(command)s
+SuccessExitStatus=%(success_statuses)s
+# only run once
+ExecStartPost=/usr/bin/systemctl disable %(unit)s
+
+[Install]
+WantedBy=%(target)s
+"""
 
 PRE_INSTALL_FIX_SYSTEM_ATTR = "urn:redhat:anaconda:pre"
 
 THREAD_FETCH_DATA = "AnaOSCAPdataFetchThread"
+THREAD_PRECOMPUTE_FIX_RULES = "AnaOSCAPfixRulesThread"
+THREAD_REMEDIATION_STDERR = "AnaOSCAPremediationStderrThread"
+
+# number of threads generating fix rules for profiles in the background
+PRECOMPUTE_WORKERS = 2
 
-SUPPORTED_ARCHIVES = (".zip", ".tar", ".tar.gz", ".tar.bz2", )
+# seconds an idle background thread waits for more work before it quits
+PRECOMPUTE_IDLE_TIMEOUT = 5
+
+SUPPORTED_ARCHIVES = (".zip", ".tar", ".tar.gz", ".tar.bz2", ".tar.xz",
+                      ".tar.zst", )
 
 # buffer size for reading and writing out data (in bytes)
 IO_BUF_SIZE = 2 * 1024 * 1024
 
+# the "new" (SVR4) ASCII cpio format produced by rpm2cpio
+CPIO_NEWC_MAGICS = ("070701", "070702")
+CPIO_HEADER_SIZE = 110
+CPIO_TRAILER = "TRAILER!!!"
+
+# RPM file format (lead, signature and header)
+RPM_LEAD_SIZE = 96
+RPM_LEAD_MAGIC = "\xed\xab\xee\xdb"
+RPM_HEADER_MAGIC = "\x8e\xad\xe8\x01"
+RPM_STRING_TYPE = 6
+RPMTAG_PAYLOADFORMAT = 1124
+RPMTAG_PAYLOADCOMPRESSOR = 1125
+
+# how much compressed data is decompressed at once
+DECOMPRESS_CHUNK_SIZE = 64 * 1024
+
+# errors raised by the (streaming) decompressors
+DECOMPRESSION_ERRORS = (zlib.error, IOError, EOFError, ValueError)
+if lzma:
+    DECOMPRESSION_ERRORS += (lzma.LZMAError,)
+if zstandard:
+    DECOMPRESSION_ERRORS += (zstandard.ZstdError,)
+
+# external (multi-core) decompressors tried (in the given order) for the
+# compressed tarballs before falling back to in-process decompression
+TARBALL_DECOMPRESSORS = {"bz2": (["lbzip2", "-dc"], ["pbzip2", "-dc"]),
+                         "xz": (["xz", "-T0", "-dc"],),
+                         "zst": (["zstd", "-T0", "-dcq"],),
+                         }
+
+# number of threads extracting members of a ZIP archive (1 to extract them
+# one by one)
+ZIP_EXTRACT_WORKERS = 4
+
+# progress of the remediation is reported after every this many rules
+REMEDIATION_PROGRESS_STEP = 10
+
+# number of the last lines of the oscap tool's stderr kept for error messages
+STDERR_TAIL_LINES = 20
+
+# bump when the format of the extraction manifests changes
+EXTRACTION_MANIFEST_VERSION = 1
+
+# suffixes of the files that may be SCAP content
+CONTENT_FILE_SUFFIXES = (".xml", ".xml.bz2")
+
 
 class OSCAPaddonError(Exception):
     """Exception class for OSCAP addon related errors."""
@@ -104,21 +245,416 @@ MESSAGE_TYPE_INFO = 2
 RuleMessage = namedtuple("RuleMessage", ["origin", "type", "text"])
 
 
-def get_fix_rules_pre(profile, fpath, ds_id="", xccdf_id="", tailoring=""):
+class FixRulesCache(object):
     """
-    Get fix rules for the pre-installation environment for a given profile in a
-    given datastream and checklist in a given file.
+    Cache of the fix rules generated from SCAP content. Items are kept in
+    memory and mirrored to files in the given directory so that they survive
+    switching from the GUI to the kickstart processing (and anaconda restarts).
+
+    Keys contain digests of the content and tailoring files, so a changed file
+    never gets stale rules.
+
+    """
+
+    def __init__(self, cache_dir):
+        """
+        :param cache_dir: directory to mirror the cached items to
+        :type cache_dir: str
+
+        """
+
+        self._cache_dir = cache_dir
+        self._items = dict()
+        self._lock = threading.Lock()
+
+        # events for the items that are just being generated
+        self._pending = dict()
+
+    @staticmethod
+    def make_key(profile, fpath, template, ds_id="", xccdf_id="",
+                 tailoring=""):
+        """
+        Create a key for the fix rules of the given profile.
+
+        :see: _run_oscap_gen_fix
+        :return: key for the fix rules
+        :rtype: tuple
+        :raise OSError: if the content or tailoring file cannot be accessed
+
+        """
+
+        content_digest = utils.get_file_digest(fpath)
+        tailoring_digest = ""
+        if tailoring:
+            tailoring_digest = utils.get_file_digest(tailoring)
+
+        return (content_digest, tailoring_digest, ds_id or "", xccdf_id or "",
+                profile, template)
+
+    def _item_path(self, key):
+        key_digest = hashlib.sha256("\0".join(key)).hexdigest()
+        return utils.join_paths(self._cache_dir, key_digest)
+
+    def get(self, key):
+        """
+        Get cached fix rules for the given key.
+
+        :return: cached fix rules or None if not found
+        :rtype: str or None
+
+        """
 
+        with self._lock:
+            if key in self._items:
+                return self._items[key]
+
+        try:
+            with open(self._item_path(key), "r") as fobj:
+                rules = fobj.read()
+        except IOError:
+            return None
+
+        with self._lock:
+            self._items[key] = rules
+
+        return rules
+
+    def store(self, key, rules):
+        """
+        Store the fix rules for the given key.
+
+        :type rules: str
+
+        """
+
+        with self._lock:
+            self._items[key] = rules
+
+        # write to a temporary file and rename it so that nobody can see
+        # a partially written item
+        try:
+            utils.ensure_dir_exists(self._cache_dir)
+            temp_fd, temp_path = tempfile.mkstemp(dir=self._cache_dir)
+            with os.fdopen(temp_fd, "w") as fobj:
+                fobj.write(rules)
+            os.rename(temp_path, self._item_path(key))
+        except (IOError, OSError) as err:
+            # just not persistent, the in-memory item is enough to go on
+            log.debug("OSCAP addon: failed to store fix rules: %s", err)
+
+    def get_or_generate(self, key, generate):
+        """
+        Get cached fix rules for the given key or generate (and store) them
+        with the given function. If some other thread is already generating
+        the rules for the same key, wait for it instead of doing the same work
+        again.
+
+        :param generate: function generating the fix rules
+        :type generate: () -> str
+        :return: fix rules for the given key
+        :rtype: str
+
+        """
+
+        while True:
+            rules = self.get(key)
+            if rules is not None:
+                return rules
+
+            with self._lock:
+                event = self._pending.get(key)
+                generating = event is None
+                if generating:
+                    event = threading.Event()
+                    self._pending[key] = event
+
+            if not generating:
+                # wait for the other thread and try again (the other thread
+                # may have failed)
+                event.wait()
+                continue
+
+            try:
+                rules = generate()
+                self.store(key, rules)
+                return rules
+            finally:
+                with self._lock:
+                    del self._pending[key]
+                event.set()
+
+
+_fix_rules_cache = FixRulesCache(FIX_RULES_CACHE_DIR)
+
+
+def get_fix_rules_pre(profile, fpath, ds_id="", xccdf_id="", tailoring="",
+                      content_handler=None):
+    """
+    Get fix rules for the pre-installation environment for a given profile in a
+    given datastream and checklist in a given file. Results are cached, so the
+    rules are only generated once for every combination of the arguments and
+    content.
+
+    :param content_handler: handler of the already loaded content that should
+                            be used to get the rules without running the oscap
+                            tool if there is no worker started for the content
+                            with start_oscap_worker (the oscap tool is run if
+                            the handler or the worker fails)
+    :type content_handler: content_handling.DataStreamHandler or
+                           content_handling.BenchmarkHandler or
+                           content_handling.CachedContentHandler or
+                           content_handling.FixesIndex or None
     :see: run_oscap_remediate
     :see: _run_oscap_gen_fix
+    :see: FixRulesCache
     :return: fix rules for a given profile
     :rtype: str
 
     """
 
-    return _run_oscap_gen_fix(profile, fpath, PRE_INSTALL_FIX_SYSTEM_ATTR,
-                              ds_id=ds_id, xccdf_id=xccdf_id,
-                              tailoring=tailoring)
+    if not profile:
+        return ""
+
+    def generate():
+        handler = _get_oscap_worker(fpath, tailoring) or content_handler
+        if handler:
+            try:
+                return handler.get_fix_rules(profile,
+                                             PRE_INSTALL_FIX_SYSTEM_ATTR,
+                                             ds_id, xccdf_id)
+            except ContentHandlingError as err:
+                log.info("OSCAP addon: failed to get fix rules from the "
+                         "loaded content, running oscap: %s", err)
+
+        return _run_oscap_gen_fix(profile, fpath, PRE_INSTALL_FIX_SYSTEM_ATTR,
+                                  ds_id=ds_id, xccdf_id=xccdf_id,
+                                  tailoring=tailoring)
+
+    try:
+        key = FixRulesCache.make_key(profile, fpath,
+                                     PRE_INSTALL_FIX_SYSTEM_ATTR,
+                                     ds_id, xccdf_id, tailoring)
+    except OSError:
+        # cannot be cached, let the oscap tool report the problem
+        return generate()
+
+    return _fix_rules_cache.get_or_generate(key, generate)
+
+
+# worker keeping the current content loaded, see start_oscap_worker
+_oscap_worker = None
+_oscap_worker_lock = threading.Lock()
+
+
+def start_oscap_worker(fpath, tailoring=""):
+    """
+    Start a worker process loading the given content in the background and
+    then generating fix rules from it for get_fix_rules_pre, so that the
+    content is only loaded once for all the profiles and outside of the
+    (GUI) process. Any worker started for other content before is stopped.
+
+    :param fpath: path to a file with SCAP content
+    :type fpath: str
+    :param tailoring: path to a tailoring file
+    :type tailoring: str
+    :see: oscap_worker.OSCAPWorker
+
+    """
+
+    global _oscap_worker
+
+    with _oscap_worker_lock:
+        old_worker = _oscap_worker
+        _oscap_worker = OSCAPWorker(fpath, tailoring or "")
+        worker = _oscap_worker
+
+    if old_worker:
+        old_worker.stop()
+
+    try:
+        worker.start()
+    except ContentHandlingError as err:
+        # tried again with the first request
+        log.info("OSCAP addon: failed to start the fix rules worker: %s", err)
+
+
+def stop_oscap_worker():
+    """Stop the worker started with start_oscap_worker (if any)."""
+
+    global _oscap_worker
+
+    with _oscap_worker_lock:
+        worker = _oscap_worker
+        _oscap_worker = None
+
+    if worker:
+        worker.stop()
+
+
+def _get_oscap_worker(fpath, tailoring=""):
+    """
+    Get the worker started for the given content (if any).
+
+    :rtype: oscap_worker.OSCAPWorker or None
+
+    """
+
+    with _oscap_worker_lock:
+        worker = _oscap_worker
+
+    if worker and worker.content_path == fpath and \
+       worker.tailoring_path == (tailoring or ""):
+        return worker
+    else:
+        return None
+
+
+def _order_by_proximity(items, center):
+    """
+    Order the given items so that the given center item goes first followed
+    by its neighbours in the order of their distance from it.
+
+    :param items: items to order
+    :type items: list
+    :param center: item the others should be ordered around (or None)
+    :return: ordered items
+    :rtype: list
+
+    """
+
+    if center not in items:
+        return list(items)
+
+    idx = items.index(center)
+    ret = [center]
+    for dist in range(1, len(items)):
+        if idx + dist < len(items):
+            ret.append(items[idx + dist])
+        if idx - dist >= 0:
+            ret.append(items[idx - dist])
+
+    return ret
+
+
+class FixRulesPrecomputer(object):
+    """
+    Bounded pool of threads generating pre-installation fix rules for profiles
+    in the background so that they are ready (cached) once the user chooses
+    a profile.
+
+    :see: get_fix_rules_pre
+
+    """
+
+    def __init__(self, workers=PRECOMPUTE_WORKERS):
+        """
+        :param workers: maximum number of threads generating the rules
+        :type workers: int
+
+        """
+
+        self._max_workers = workers
+        self._workers = 0
+
+        # threads registered with the thread manager need unique names
+        self._threads_started = 0
+        self._queue = Queue()
+        self._lock = threading.Lock()
+
+        # increased every time the work is rescheduled, so that the workers can
+        # recognize outdated tasks
+        self._generation = 0
+
+    def schedule(self, profiles, fpath, ds_id="", xccdf_id="", tailoring="",
+                 first=None, content_handler=None):
+        """
+        Schedule generation of the fix rules for the given profiles replacing
+        any work scheduled before.
+
+        :param profiles: IDs of the profiles to generate fix rules for
+        :type profiles: list of strings
+        :param first: ID of the profile whose rules should be generated first,
+                      followed by its neighbours in the profiles list
+        :type first: str or None
+        :see: get_fix_rules_pre
+
+        """
+
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            for profile in _order_by_proximity(profiles, first):
+                self._queue.put((generation, profile, fpath, ds_id, xccdf_id,
+                                 tailoring, content_handler))
+
+            while self._workers < min(self._max_workers, len(profiles)):
+                self._threads_started += 1
+                name = "%s%d" % (THREAD_PRECOMPUTE_FIX_RULES,
+                                 self._threads_started)
+                threadMgr.add(AnacondaThread(name=name, target=self._run,
+                                             fatal=False))
+                self._workers += 1
+
+    def cancel(self):
+        """Drop all the scheduled work that has not been started yet."""
+
+        with self._lock:
+            self._generation += 1
+
+    def _run(self):
+        while True:
+            try:
+                task = self._queue.get(timeout=PRECOMPUTE_IDLE_TIMEOUT)
+            except Empty:
+                with self._lock:
+                    # check again with the lock held to not miss any new work
+                    if self._queue.empty():
+                        self._workers -= 1
+                        return
+                continue
+
+            (generation, profile, fpath, ds_id, xccdf_id, tailoring,
+             handler) = task
+            if generation != self._generation:
+                # outdated
+                continue
+
+            try:
+                get_fix_rules_pre(profile, fpath, ds_id, xccdf_id, tailoring,
+                                  handler)
+            # pylint: disable-msg=W0703
+            except Exception as err:
+                # only fills the cache, the error (if any) is reported if the
+                # profile is chosen
+                log.debug("OSCAP addon: failed to precompute fix rules for "
+                          "profile '%s': %s", profile, err)
+
+
+_fix_rules_precomputer = FixRulesPrecomputer()
+
+
+def precompute_fix_rules_pre(profiles, fpath, ds_id="", xccdf_id="",
+                             tailoring="", first=None, content_handler=None):
+    """
+    Start generating the fix rules for the pre-installation environment for
+    the given profiles in the background.
+
+    :see: FixRulesPrecomputer.schedule
+
+    """
+
+    _fix_rules_precomputer.schedule(profiles, fpath, ds_id, xccdf_id,
+                                    tailoring, first, content_handler)
+
+
+def cancel_fix_rules_precomputation():
+    """
+    Stop generating the fix rules in the background (e.g. because the content
+    changed).
+
+    """
+
+    _fix_rules_precomputer.cancel()
 
 
 def _run_oscap_gen_fix(profile, fpath, template, ds_id="", xccdf_id="",
@@ -141,18 +677,8 @@ def _run_oscap_gen_fix(profile, fpath, template, ds_id="", xccdf_id="",
 
     args = ["oscap", "xccdf", "generate", "fix"]
     args.append("--template=%s" % template)
-
-    # oscap uses the default profile by default
-    if profile.lower() != "default":
-        args.append("--profile=%s" % profile)
-    if ds_id:
-        args.append("--datastream-id=%s" % ds_id)
-    if xccdf_id:
-        args.append("--xccdf-id=%s" % xccdf_id)
-    if tailoring:
-        args.append("--tailoring-file=%s" % tailoring)
-
-    args.append(fpath)
+    args.extend(_get_oscap_content_args(profile, fpath, ds_id, xccdf_id,
+                                        tailoring))
 
     try:
         proc = subprocess.Popen(args, stdout=subprocess.PIPE,
@@ -177,14 +703,102 @@ def _run_oscap_gen_fix(profile, fpath, template, ds_id="", xccdf_id="",
     return stdout
 
 
+class RemediationOutputParser(object):
+    """
+    Incremental parser of the output of the 'oscap xccdf eval --remediate'
+    command counting the evaluated and remediated rules.
+
+    """
+
+    def __init__(self, progress_cb=None):
+        """
+        :param progress_cb: function called with the parser when the
+                            remediation starts and every
+                            REMEDIATION_PROGRESS_STEP rules
+        :type progress_cb: RemediationOutputParser -> None or None
+
+        """
+
+        self._progress_cb = progress_cb
+
+        self.remediating = False
+
+        # result -> number of rules
+        self.eval_results = dict()
+        self.fix_results = dict()
+
+        # OpenSCAP errors reported on stderr
+        self.errors = []
+
+    @property
+    def evaluated(self):
+        """Number of rules evaluated so far"""
+
+        return sum(self.eval_results.itervalues())
+
+    @property
+    def remediated(self):
+        """Number of rules whose remediation was run so far"""
+
+        return sum(self.fix_results.itervalues())
+
+    def _report_progress(self):
+        if self._progress_cb:
+            self._progress_cb(self)
+
+    def feed_stdout(self, line):
+        """
+        Process a line of the oscap tool's stdout.
+
+        :type line: str
+
+        """
+
+        line = line.strip()
+        if line.startswith("--- Starting Remediation"):
+            self.remediating = True
+            self._report_progress()
+            return
+
+        # the key and the value are separated by "\r\t"
+        fields = line.split(None, 1)
+        if len(fields) != 2 or fields[0] != "Result":
+            return
+
+        results = self.fix_results if self.remediating else self.eval_results
+        result = fields[1].strip()
+        results[result] = results.get(result, 0) + 1
+
+        if sum(results.itervalues()) % REMEDIATION_PROGRESS_STEP == 0:
+            self._report_progress()
+
+    def feed_stderr(self, line):
+        """
+        Process a line of the oscap tool's stderr.
+
+        :type line: str
+
+        """
+
+        match = re.search(r'OpenSCAP Error:.*', line)
+        if match:
+            log.warning("OSCAP addon: " + match.group(0))
+            self.errors.append(match.group(0))
+
+
 def run_oscap_remediate(profile, fpath, ds_id="", xccdf_id="", tailoring="",
-                        chroot=""):
+                        chroot="", progress_cb=None, report=True,
+                        results_format="xccdf"):
     """
     Run the evaluation and remediation with the oscap tool on a given file,
     doing the remediation as defined in a given profile defined in a given
     checklist that is a part of a given datastream. If requested, run in
     chroot.
 
+    The output of the oscap tool is processed line by line as it comes and
+    written to the REMEDIATION_LOG_PATH file (in the chroot) instead of being
+    kept in memory.
+
     :param profile: id of the profile that will drive the remediation
     :type profile: str
     :param fpath: path to a file with SCAP content
@@ -198,207 +812,1198 @@ def run_oscap_remediate(profile, fpath, ds_id="", xccdf_id="", tailoring="",
     :type tailoring: str
     :param chroot: path to the root the oscap tool should be run in
     :type chroot: str
-    :return: oscap tool's stdout (summary of the rules, checks and fixes)
-    :rtype: str
+    :param progress_cb: function to report the progress of the evaluation and
+                        remediation to
+    :type progress_cb: RemediationOutputParser -> None or None
+    :param report: whether to write the HTML report to REPORT_PATH (it can be
+                   generated from the results later, see
+                   schedule_first_boot_report)
+    :type report: bool
+    :param results_format: format of the results (see RESULTS_PATHS)
+    :type results_format: str
+    :see: RemediationOutputParser
+    :return: parser of the output with the numbers of rules evaluated and
+             remediated (None if no profile given)
+    :rtype: RemediationOutputParser or None
 
     """
 
     if not profile:
-        return ""
-
-    def do_chroot():
-        """Helper function doing the chroot if requested."""
-        if chroot and chroot != "/":
-            os.chroot(chroot)
-            os.chdir("/")
+        return None
 
     # make sure the directory for the results exists
-    results_dir = os.path.dirname(RESULTS_PATH)
-    if chroot:
-        results_dir = os.path.normpath(chroot + "/" + results_dir)
-    utils.ensure_dir_exists(results_dir)
+    utils.ensure_dir_exists(_get_chroot_path(os.path.dirname(RESULTS_PATH),
+                                             chroot))
 
     args = ["oscap", "xccdf", "eval"]
     args.append("--remediate")
-    args.append("--results=%s" % RESULTS_PATH)
-    args.append("--report=%s" % REPORT_PATH)
-
-    # oscap uses the default profile by default
-    if profile.lower() != "default":
-        args.append("--profile=%s" % profile)
-    if ds_id:
-        args.append("--datastream-id=%s" % ds_id)
-    if xccdf_id:
-        args.append("--xccdf-id=%s" % xccdf_id)
-    if tailoring:
-        args.append("--tailoring-file=%s" % tailoring)
+    if results_format == "arf":
+        args.append("--results-arf=%s" % ARF_RESULTS_PATH)
+    else:
+        args.append("--results=%s" % RESULTS_PATH)
+    if report:
+        args.append("--report=%s" % REPORT_PATH)
+    args.extend(_get_oscap_content_args(profile, fpath, ds_id, xccdf_id,
+                                        tailoring))
 
-    args.append(fpath)
+    log_path = _get_chroot_path(REMEDIATION_LOG_PATH, chroot)
+    try:
+        log_file = open(log_path, "w")
+    except IOError as err:
+        log.warning("OSCAP addon: cannot write the remediation log: %s", err)
+        log_file = open(os.devnull, "w")
 
     try:
         proc = subprocess.Popen(args,
                                 stdout=subprocess.PIPE,
                                 stderr=subprocess.PIPE,
-                                preexec_fn=do_chroot)
+                                preexec_fn=_make_preexec_chroot(chroot))
     except OSError as oserr:
+        log_file.close()
         msg = "Failed to run the oscap tool: %s" % oserr
         raise OSCAPaddonError(msg)
 
-    (stdout, stderr) = proc.communicate()
+    parser = RemediationOutputParser(progress_cb)
+    log_lock = threading.Lock()
+    stderr_tail = deque(maxlen=STDERR_TAIL_LINES)
 
-    messages = re.findall(r'OpenSCAP Error:.*', stderr)
-    if messages:
-        for message in messages:
-            log.warning("OSCAP addon: " + message)
+    def spool(line):
+        with log_lock:
+            log_file.write(line)
+
+    def read_stderr():
+        for line in iter(proc.stderr.readline, ""):
+            spool(line)
+            stderr_tail.append(line)
+            parser.feed_stderr(line)
+
+    # both streams need to be read at the same time, otherwise the oscap tool
+    # could block writing to the other one
+    stderr_thread = threading.Thread(name=THREAD_REMEDIATION_STDERR,
+                                     target=read_stderr)
+    stderr_thread.daemon = True
+    stderr_thread.start()
+
+    try:
+        for line in iter(proc.stdout.readline, ""):
+            spool(line)
+            parser.feed_stdout(line)
+    finally:
+        stderr_thread.join()
+        proc.wait()
+        log_file.close()
+
+    log.info("OSCAP addon: %d rules evaluated, %d remediated",
+             parser.evaluated, parser.remediated)
 
-    # save stdout?
     # pylint thinks Popen has no attribute returncode
     # pylint: disable-msg=E1101
     if proc.returncode not in (0, 2):
         # 0 -- success; 2 -- no error, but checks/remediation failed
         msg = "Content evaluation and remediation with the oscap tool "\
-            "failed: %s" % stderr
+            "failed: %s" % "".join(stderr_tail)
         raise OSCAPaddonError(msg)
 
-    return stdout
+    return parser
 
 
-def wait_and_fetch_net_data(url, out_file, ca_certs=None):
+def _get_oscap_content_args(profile, fpath, ds_id="", xccdf_id="",
+                            tailoring=""):
     """
-    Function that waits for network connection and starts a thread that fetches
-    data over network.
+    Get the arguments for the oscap tool specifying the content and profile.
 
-    :see: org_fedora_oscap.data_fetch.fetch_data
-    :return: the name of the thread running fetch_data
-    :rtype: str
+    :see: run_oscap_remediate
+    :rtype: list of strings
 
     """
 
-    # get thread that tries to establish a network connection
-    nm_conn_thread = threadMgr.get(constants.THREAD_WAIT_FOR_CONNECTING_NM)
-    if nm_conn_thread:
-        # NM still connecting, wait for it to finish
-        nm_conn_thread.join()
+    args = []
 
-    if not nm.nm_is_connected():
-        raise OSCAPaddonNetworkError("Network connection needed to fetch data.")
+    # oscap uses the default profile by default
+    if profile.lower() != "default":
+        args.append("--profile=%s" % profile)
+    if ds_id:
+        args.append("--datastream-id=%s" % ds_id)
+    if xccdf_id:
+        args.append("--xccdf-id=%s" % xccdf_id)
+    if tailoring:
+        args.append("--tailoring-file=%s" % tailoring)
 
-    fetch_data_thread = AnacondaThread(name=THREAD_FETCH_DATA,
-                                       target=fetch_data,
-                                       args=(url, out_file, ca_certs),
-                                       fatal=False)
+    args.append(fpath)
 
-    # register and run the thread
-    threadMgr.add(fetch_data_thread)
+    return args
 
-    return THREAD_FETCH_DATA
 
+def _get_chroot_path(path, chroot=""):
+    """Get the path to the given file in the given chroot (if any)."""
 
-def extract_data(archive, out_dir, ensure_has_files=None):
-    """
-    Fuction that extracts the given archive to the given output directory. It
-    tries to find out the archive type by the file name.
+    if chroot:
+        return os.path.normpath(chroot + "/" + path)
+    else:
+        return path
 
-    :param archive: path to the archive file that should be extracted
-    :type archive: str
-    :param out_dir: output directory the archive should be extracted to
-    :type out_dir: str
-    :param ensure_has_files: relative paths to the files that must exist in the
-                             archive
-    :type ensure_has_files: iterable of strings or None
-    :return: a list of files and directories extracted from the archive
-    :rtype: [str]
 
+def _make_preexec_chroot(chroot):
     """
+    Get a function for subprocess.Popen's preexec_fn argument doing the chroot
+    if requested.
 
-    # get rid of empty file paths
-    ensure_has_files = [fpath for fpath in ensure_has_files if fpath]
+    """
 
-    if archive.endswith(".zip"):
-        # ZIP file
-        try:
-            zfile = zipfile.ZipFile(archive, "r")
-        except zipfile.BadZipfile as err:
-            raise ExtractionError(err.message)
+    def do_chroot():
+        if chroot and chroot != "/":
+            os.chroot(chroot)
+            os.chdir("/")
 
-        # generator for the paths of the files found in the archive (dirs end
-        # with "/")
-        files = set(info.filename for info in zfile.filelist
-                    if not info.filename.endswith("/"))
-        for fpath in ensure_has_files or ():
-            if fpath not in files:
-                msg = "File '%s' not found in the archive '%s'" % (fpath,
-                                                                   archive)
-                raise ExtractionError(msg)
+    return do_chroot
 
-        utils.ensure_dir_exists(out_dir)
-        zfile.extractall(path=out_dir)
-        result = [utils.join_paths(out_dir, info.filename) for info in zfile.filelist]
-        zfile.close()
-        return result
+
+def generate_remediation_script(profile, fpath, ds_id="", xccdf_id="",
+                                tailoring="", chroot=""):
+    """
+    Generate a shell script doing the remediation for the given profile with
+    the oscap tool (run in chroot if requested) without evaluating the rules.
+    The script is written to REMEDIATION_SCRIPT_PATH.
+
+    :see: run_oscap_remediate
+    :return: path to the script (in the chroot)
+    :rtype: str
+    :raise OSCAPaddonError: if the script cannot be generated
+
+    """
+
+    utils.ensure_dir_exists(_get_chroot_path(os.path.dirname(REMEDIATION_SCRIPT_PATH),
+                                             chroot))
+
+    args = ["oscap", "xccdf", "generate", "fix"]
+    args.append("--template=%s" % SCRIPT_FIX_SYSTEM_ATTR)
+    args.append("--output=%s" % REMEDIATION_SCRIPT_PATH)
+    args.extend(_get_oscap_content_args(profile, fpath, ds_id, xccdf_id,
+                                        tailoring))
+
+    try:
+        proc = subprocess.Popen(args, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE,
+                                preexec_fn=_make_preexec_chroot(chroot))
+    except OSError as oserr:
+        msg = "Failed to run the oscap tool: %s" % oserr
+        raise OSCAPaddonError(msg)
+
+    (_stdout, stderr) = proc.communicate()
+
+    # pylint: disable-msg=E1101
+    if proc.returncode != 0:
+        msg = "Failed to generate the remediation script with the oscap "\
+            "tool: %s" % stderr
+        raise OSCAPaddonError(msg)
+
+    return REMEDIATION_SCRIPT_PATH
+
+
+def run_remediation_script(chroot=""):
+    """
+    Run the script generated by generate_remediation_script (in chroot if
+    requested), writing its output to the REMEDIATION_LOG_PATH file. Failures
+    of individual fixes are only logged, they show up in the evaluation of
+    the system.
+
+    :raise OSCAPaddonError: if the script cannot be run
+
+    """
+
+    log_path = _get_chroot_path(REMEDIATION_LOG_PATH, chroot)
+    try:
+        with open(log_path, "w") as log_file, open(os.devnull, "r") as null:
+            proc = subprocess.Popen(["/bin/bash", REMEDIATION_SCRIPT_PATH],
+                                    stdin=null,
+                                    stdout=log_file, stderr=subprocess.STDOUT,
+                                    preexec_fn=_make_preexec_chroot(chroot))
+            proc.wait()
+    except (OSError, IOError) as err:
+        msg = "Failed to run the remediation script: %s" % err
+        raise OSCAPaddonError(msg)
+
+    # pylint: disable-msg=E1101
+    if proc.returncode != 0:
+        log.warning("OSCAP addon: remediation script exited with %d, see %s",
+                    proc.returncode, REMEDIATION_LOG_PATH)
+
+
+def _systemd_quote(arg):
+    """Quote the given argument for the ExecStart= line of a systemd unit."""
+
+    if re.search(r'[\s"\'\\;%$]', arg):
+        escaped = arg.replace("\\", "\\\\").replace('"', '\\"')
+        return '"%s"' % escaped.replace("%", "%%").replace("$", "$$")
+    else:
+        return arg
+
+
+def install_first_boot_unit(unit, description, args, chroot="",
+                            success_statuses=(0,)):
+    """
+    Install and enable a systemd unit running the given command once on the
+    first boot of the system.
+
+    :param unit: name of the unit (e.g. "my-service.service")
+    :type unit: str
+    :param description: description of the unit
+    :type description: str
+    :param args: command to run (the program has to be given with its
+                 absolute path)
+    :type args: list of strings
+    :param chroot: root of the system to install the unit into
+    :type chroot: str
+    :param success_statuses: exit statuses of the command meaning success
+    :type success_statuses: iterable of ints
+    :raise OSCAPaddonError: if the unit cannot be installed
+
+    """
+
+    units_dir = _get_chroot_path(SYSTEMD_UNITS_DIR, chroot)
+    wants_dir = utils.join_paths(units_dir, "%s.wants" % FIRST_BOOT_TARGET)
+    unit_path = utils.join_paths(units_dir, unit)
+    link_path = utils.join_paths(wants_dir, unit)
+
+    unit_data = FIRST_BOOT_UNIT_TEMPLATE % {
+        "description": description, "target": FIRST_BOOT_TARGET,
+        "command": " ".join(_systemd_quote(arg) for arg in args),
+        "success_statuses": " ".join(str(status) for status in
+                                     success_statuses),
+        "unit": unit,
+        }
+
+    try:
+        utils.ensure_dir_exists(wants_dir)
+        with open(unit_path, "w") as fobj:
+            fobj.write(unit_data)
+        # what 'systemctl enable' would do
+        if os.path.lexists(link_path):
+            os.unlink(link_path)
+        os.symlink(utils.join_paths(SYSTEMD_UNITS_DIR, unit), link_path)
+    except (OSError, IOError) as err:
+        msg = "Failed to install the '%s' unit: %s" % (unit, err)
+        raise OSCAPaddonError(msg)
+
+
+def schedule_first_boot_evaluation(profile, fpath, ds_id="", xccdf_id="",
+                                   tailoring="", chroot=""):
+    """
+    Install a first-boot unit evaluating the system with the given profile
+    and writing the results and report to RESULTS_PATH and REPORT_PATH.
+
+    :see: run_oscap_remediate
+    :see: install_first_boot_unit
+
+    """
+
+    args = ["/usr/bin/oscap", "xccdf", "eval"]
+    args.append("--results=%s" % RESULTS_PATH)
+    args.append("--report=%s" % REPORT_PATH)
+    args.extend(_get_oscap_content_args(profile, fpath, ds_id, xccdf_id,
+                                        tailoring))
+
+    # 2 -- no error, but some checks failed
+    install_first_boot_unit(FIRST_BOOT_EVAL_UNIT,
+                            "Evaluation of the system with OpenSCAP", args,
+                            chroot, success_statuses=(0, 2))
+
+
+def schedule_first_boot_report(chroot="", results_path=RESULTS_PATH):
+    """
+    Install a first-boot unit generating the HTML report (REPORT_PATH) from
+    the results of the evaluation so that the report doesn't have to be
+    rendered during the installation.
+
+    :param results_path: path to the (XCCDF or ARF) results file
+    :type results_path: str
+    :see: install_first_boot_unit
+
+    """
+
+    args = ["/usr/bin/oscap", "xccdf", "generate", "report",
+            "--output=%s" % REPORT_PATH, results_path]
+
+    install_first_boot_unit(FIRST_BOOT_REPORT_UNIT,
+                            "Generation of the OpenSCAP evaluation report",
+                            args, chroot)
+
+
+def _compress_file(fpath, compression):
+    """
+    Compress the given file with the given compression and remove it.
+
+    :param compression: one of the RESULTS_COMPRESSIONS keys
+    :type compression: str
+    :return: path to the compressed file
+    :rtype: str
+    :raise OSCAPaddonError: if the file cannot be compressed
+
+    """
+
+    out_path = fpath + RESULTS_COMPRESSIONS[compression]
+    try:
+        if compression == "gzip":
+            with open(fpath, "rb") as in_file:
+                out_file = gzip.open(out_path, "wb")
+                try:
+                    shutil.copyfileobj(in_file, out_file, IO_BUF_SIZE)
+                finally:
+                    out_file.close()
+        elif zstandard:
+            with open(fpath, "rb") as in_file, open(out_path, "wb") as out_file:
+                zstandard.ZstdCompressor().copy_stream(in_file, out_file)
+        else:
+            ret = subprocess.call(["zstd", "-q", "-f", "-o", out_path, fpath])
+            if ret != 0:
+                raise OSCAPaddonError("zstd exited with %d" % ret)
+        os.unlink(fpath)
+    except (EnvironmentError, OSCAPaddonError) as err:
+        msg = "Failed to compress '%s': %s" % (fpath, err)
+        raise OSCAPaddonError(msg)
+
+    return out_path
+
+
+def postprocess_results(profile, results_format="xccdf", compression="",
+                        chroot=""):
+    """
+    Write a summary of the results of the evaluation to RESULTS_SUMMARY_PATH
+    and compress the results and the report if requested. The summary is a
+    JSON object with the numbers of rules per result type, the IDs of the
+    failed rules and the paths to the (compressed) results and report files,
+    so that it can be read without parsing the results.
+
+    :param profile: ID of the profile used for the evaluation
+    :type profile: str
+    :param results_format: format of the results (see RESULTS_PATHS)
+    :type results_format: str
+    :param compression: compression of the results and the report (see
+                        RESULTS_COMPRESSIONS) or "" for no compression
+    :type compression: str
+    :param chroot: root of the system the results were written to
+    :type chroot: str
+    :return: the summary
+    :rtype: dict
+    :raise OSCAPaddonError: if the results cannot be processed
+
+    """
+
+    results_path = RESULTS_PATHS[results_format]
+    try:
+        (counts, failed_rules) = summarize_results(_get_chroot_path(results_path,
+                                                                    chroot))
+    except ContentHandlingError as err:
+        raise OSCAPaddonError(err)
+
+    report_path = REPORT_PATH
+    if not os.path.exists(_get_chroot_path(report_path, chroot)):
+        # not generated (yet)
+        report_path = None
+
+    if compression:
+        suffix = RESULTS_COMPRESSIONS[compression]
+        _compress_file(_get_chroot_path(results_path, chroot), compression)
+        results_path += suffix
+        if report_path:
+            _compress_file(_get_chroot_path(report_path, chroot), compression)
+            report_path += suffix
+
+    summary = {"version": RESULTS_SUMMARY_VERSION,
+               "profile": profile,
+               "results": counts,
+               "failed_rules": failed_rules,
+               "results_file": results_path,
+               "report_file": report_path,
+               }
+    try:
+        with open(_get_chroot_path(RESULTS_SUMMARY_PATH, chroot), "w") as fobj:
+            json.dump(summary, fobj, indent=2, sort_keys=True)
+    except IOError as err:
+        msg = "Failed to write the results summary: %s" % err
+        raise OSCAPaddonError(msg)
+
+    return summary
+
+
+def wait_and_fetch_net_data(url, out_file, ca_certs=None, fingerprint=""):
+    """
+    Function that waits for network connection and starts a thread that fetches
+    data over network.
+
+    :see: org_fedora_oscap.data_fetch.fetch_data
+    :return: the name of the thread running fetch_data
+    :rtype: str
+
+    """
+
+    # get thread that tries to establish a network connection
+    nm_conn_thread = threadMgr.get(constants.THREAD_WAIT_FOR_CONNECTING_NM)
+    if nm_conn_thread:
+        # NM still connecting, wait for it to finish
+        nm_conn_thread.join()
+
+    if not nm.nm_is_connected():
+        raise OSCAPaddonNetworkError("Network connection needed to fetch data.")
+
+    fetch_data_thread = AnacondaThread(name=THREAD_FETCH_DATA,
+                                       target=fetch_data,
+                                       args=(url, out_file, ca_certs,
+                                             fingerprint),
+                                       fatal=False)
+
+    # register and run the thread
+    threadMgr.add(fetch_data_thread)
+
+    return THREAD_FETCH_DATA
+
+
+def extract_data(archive, out_dir, ensure_has_files=None, content_only=False):
+    """
+    Fuction that extracts the given archive to the given output directory. It
+    tries to find out the archive type by the file name.
+
+    :param archive: path to the archive file that should be extracted
+    :type archive: str
+    :param out_dir: output directory the archive should be extracted to
+    :type out_dir: str
+    :param ensure_has_files: relative paths to the files that must exist in the
+                             archive
+    :type ensure_has_files: iterable of strings or None
+    :param content_only: whether to only extract the files from
+                         ensure_has_files and the files that may be SCAP
+                         content (see CONTENT_FILE_SUFFIXES) and skip the
+                         others (e.g. documentation), the rest can be
+                         extracted later by calling this function again
+    :type content_only: bool
+    :return: a list of files and directories extracted from the archive
+    :rtype: [str]
+
+    """
+
+    # get rid of empty file paths
+    ensure_has_files = [fpath for fpath in ensure_has_files or () if fpath]
+
+    # the same archive may have already been extracted (e.g. both by the GUI
+    # and in the setup phase)
+    manifest_path = _get_manifest_path(archive, out_dir, ensure_has_files,
+                                       content_only)
+    try:
+        archive_digest = utils.get_file_digest(archive)
+    except OSError:
+        # let the extraction report the problem
+        archive_digest = None
+
+    if archive_digest:
+        result = _load_manifest(manifest_path, archive_digest)
+        if result is not None:
+            log.debug("OSCAP addon: '%s' already extracted", archive)
+            return result
+
+    result = _extract_archive(archive, out_dir, ensure_has_files, content_only)
+
+    if archive_digest:
+        _store_manifest(manifest_path, archive_digest, result)
+
+    return result
+
+
+def _get_manifest_path(archive, out_dir, ensure_has_files, content_only):
+    """
+    Get path to the manifest of the extraction of the given archive with the
+    given arguments.
+
+    :see: extract_data
+    :rtype: str
+
+    """
+
+    key = "\0".join([os.path.abspath(archive), str(content_only)] +
+                    sorted(ensure_has_files))
+    key_digest = hashlib.sha256(key).hexdigest()[:16]
+
+    # hidden so that it is not copied to the target system with the content
+    return utils.join_paths(out_dir, ".extraction-%s.json" % key_digest)
+
+
+def _get_file_state(fpath):
+    """
+    Get the state of the given extracted file or directory that tells if the
+    file has been changed since.
+
+    :return: size and modification time of the file (None for directories)
+    :rtype: [int, float] or None
+    :raise OSError: if the file doesn't exist
+
+    """
+
+    stat_res = os.lstat(fpath)
+    if stat.S_ISDIR(stat_res.st_mode):
+        return None
+    else:
+        return [stat_res.st_size, stat_res.st_mtime]
+
+
+def _load_manifest(manifest_path, archive_digest):
+    """
+    Get the result of an earlier extraction of the archive with the given
+    digest from the given manifest if all the extracted files are still there
+    unchanged.
+
+    :return: list of the extracted files and directories or None
+    :rtype: [str] or None
+
+    """
+
+    try:
+        with open(manifest_path, "r") as fobj:
+            manifest = json.load(fobj)
+
+        if manifest["version"] != EXTRACTION_MANIFEST_VERSION or \
+           manifest["archive_digest"] != archive_digest:
+            return None
+
+        for (fpath, state) in manifest["files"]:
+            if _get_file_state(fpath) != state:
+                return None
+    except (EnvironmentError, ValueError, KeyError, TypeError):
+        return None
+
+    return [fpath.encode("utf-8") for (fpath, _state) in manifest["files"]]
+
+
+def _store_manifest(manifest_path, archive_digest, result):
+    """
+    Store the manifest of the extraction of the archive with the given
+    digest.
+
+    :param result: list of the extracted files and directories
+    :type result: [str]
+
+    """
+
+    try:
+        files = [(fpath, _get_file_state(fpath)) for fpath in result]
+        manifest = {"version": EXTRACTION_MANIFEST_VERSION,
+                    "archive_digest": archive_digest,
+                    "files": files,
+                    }
+        with open(manifest_path, "w") as fobj:
+            json.dump(manifest, fobj)
+    except (EnvironmentError, ValueError) as err:
+        # only means the next extraction cannot be skipped
+        log.debug("OSCAP addon: failed to store extraction manifest: %s", err)
+
+
+def _extract_archive(archive, out_dir, ensure_has_files, content_only):
+    """
+    Extract the given archive to the given output directory.
+
+    :see: extract_data
+
+    """
+
+    if archive.endswith(".zip"):
+        # ZIP file
+        return _extract_zip(archive, out_dir, ensure_has_files, content_only)
     elif archive.endswith(".tar"):
         # plain tarball
-        return _extract_tarball(archive, out_dir, ensure_has_files, None)
+        return _extract_tarball(archive, out_dir, ensure_has_files, None,
+                                content_only)
     elif archive.endswith(".tar.gz"):
         # gzipped tarball
-        return _extract_tarball(archive, out_dir, ensure_has_files, "gz")
+        return _extract_tarball(archive, out_dir, ensure_has_files, "gz",
+                                content_only)
     elif archive.endswith(".tar.bz2"):
         # bzipped tarball
-        return _extract_tarball(archive, out_dir, ensure_has_files, "bz2")
+        return _extract_tarball(archive, out_dir, ensure_has_files, "bz2",
+                                content_only)
+    elif archive.endswith(".tar.xz"):
+        # xz-compressed tarball
+        return _extract_tarball(archive, out_dir, ensure_has_files, "xz",
+                                content_only)
+    elif archive.endswith(".tar.zst"):
+        # zstd-compressed tarball
+        return _extract_tarball(archive, out_dir, ensure_has_files, "zst",
+                                content_only)
     elif archive.endswith(".rpm"):
         # RPM
-        return _extract_rpm(archive, out_dir, ensure_has_files)
+        return _extract_rpm(archive, out_dir, ensure_has_files, content_only)
     # elif other types of archives
     else:
         raise ExtractionError("Unsuported archive type")
 
 
-def _extract_tarball(archive, out_dir, ensure_has_files, alg):
+def _extract_zip(archive, out_dir, ensure_has_files, content_only=False,
+                 workers=None):
     """
-    Extract the given TAR archive to the given output directory and make sure
-    the given file exists in the archive.
+    Extract the given ZIP archive to the given output directory and make sure
+    the given file exists in the archive. The members are extracted by
+    multiple threads (each with its own handle of the archive) in parallel.
 
     :see: extract_data
-    :param alg: compression algorithm used for the tarball
-    :type alg: str (one of "gz", "bz2") or None
+    :param content_only: whether to only extract the required files and the
+                         files that may be SCAP content
+    :type content_only: bool
+    :param workers: number of threads extracting the members
+                    (ZIP_EXTRACT_WORKERS by default)
+    :type workers: int
     :return: a list of files and directories extracted from the archive
     :rtype: [str]
 
     """
 
-    if alg and alg not in ("gz", "bz2",):
+    if workers is None:
+        workers = ZIP_EXTRACT_WORKERS
+
+    try:
+        zfile = zipfile.ZipFile(archive, "r")
+    except zipfile.BadZipfile as err:
+        raise ExtractionError(err.message)
+
+    # generator for the paths of the files found in the archive (dirs end
+    # with "/")
+    files = set(info.filename for info in zfile.filelist
+                if not info.filename.endswith("/"))
+    for fpath in ensure_has_files or ():
+        if fpath not in files:
+            zfile.close()
+            msg = "File '%s' not found in the archive '%s'" % (fpath,
+                                                               archive)
+            raise ExtractionError(msg)
+
+    members = zfile.filelist
+    if content_only:
+        members = [info for info in members
+                   if _is_content_member(info.filename, ensure_has_files)]
+
+    utils.ensure_dir_exists(out_dir)
+    try:
+        if workers > 1 and len(members) > 1:
+            _extract_zip_members(archive, out_dir, members, workers)
+        else:
+            zfile.extractall(path=out_dir, members=members)
+    except (zipfile.BadZipfile, zlib.error, EnvironmentError) as err:
+        raise ExtractionError(str(err))
+    finally:
+        zfile.close()
+
+    return [utils.join_paths(out_dir, info.filename) for info in members]
+
+
+def _extract_zip_members(archive, out_dir, members, workers):
+    """
+    Extract the given members of the given ZIP archive in parallel.
+
+    :param members: members of the archive to extract
+    :type members: [zipfile.ZipInfo]
+    :param workers: number of threads extracting the members
+    :type workers: int
+
+    """
+
+    thread_data = threading.local()
+    handles = []
+    handles_lock = threading.Lock()
+
+    def extract(info):
+        # ZipFile objects cannot be shared by threads
+        zfile = getattr(thread_data, "zfile", None)
+        if zfile is None:
+            zfile = thread_data.zfile = zipfile.ZipFile(archive, "r")
+            with handles_lock:
+                handles.append(zfile)
+
+        try:
+            zfile.extract(info, out_dir)
+        except OSError as err:
+            if err.errno != errno.EEXIST:
+                raise
+            # some other thread created the same parent directory in the
+            # meantime
+            zfile.extract(info, out_dir)
+
+    pool = ThreadPool(min(workers, len(members)))
+    try:
+        # the biggest members first to spread the work evenly
+        pool.map(extract, sorted(members, key=lambda info: info.file_size,
+                                 reverse=True))
+    finally:
+        pool.close()
+        pool.join()
+        for zfile in handles:
+            zfile.close()
+
+
+def _is_content_member(name, ensure_has_files):
+    """
+    Tell whether the archive member with the given name should be extracted
+    when only extracting content.
+
+    :param name: name (path) of the member
+    :type name: str
+    :param ensure_has_files: relative paths to the required files
+    :type ensure_has_files: iterable of strings
+    :rtype: bool
+
+    """
+
+    rel_path = lambda path: os.path.normpath(path).lstrip("/")
+
+    return (name.endswith(CONTENT_FILE_SUFFIXES) or
+            any(rel_path(name) == rel_path(fpath) for fpath in ensure_has_files))
+
+
+def _open_tarball(archive, alg):
+    """
+    Open the given TAR archive for reading in the stream mode. Compressed
+    tarballs are decompressed by an external (multi-core) decompressor if
+    available (see TARBALL_DECOMPRESSORS) and in-process otherwise.
+
+    :param alg: compression algorithm used for the tarball
+    :type alg: str (one of "gz", "bz2", "xz", "zst") or None
+    :return: the opened tarball and the decompressor process (if any)
+    :rtype: (tarfile.TarFile, subprocess.Popen or None)
+    :raise ExtractionError: if the tarball cannot be opened
+
+    """
+
+    if alg and alg not in ("gz", "bz2", "xz", "zst"):
         raise ExtractionError("Unsupported compression algorithm")
 
-    mode = "r"
-    if alg:
-        mode += ":%s" % alg
+    for command in TARBALL_DECOMPRESSORS.get(alg, ()):
+        try:
+            proc = subprocess.Popen(command + [archive], stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE)
+        except OSError:
+            # not available
+            continue
+
+        log.debug("OSCAP addon: decompressing '%s' with %s", archive,
+                  command[0])
+        try:
+            return (tarfile.TarFile.open(fileobj=proc.stdout, mode="r|"), proc)
+        except tarfile.TarError as err:
+            proc.stdout.close()
+            proc.wait()
+            raise ExtractionError(err.message)
 
+    # stream mode, no seeking back in the (decompressed) data
     try:
-        tfile = tarfile.TarFile.open(archive, mode)
+        if alg in ("gz", "bz2"):
+            return (tarfile.TarFile.open(archive, "r|" + alg), None)
+        elif not alg:
+            return (tarfile.TarFile.open(archive, "r|"), None)
+
+        if alg == "xz" and lzma:
+            decompressor = lzma.LZMADecompressor()
+        elif alg == "zst" and zstandard:
+            decompressor = zstandard.ZstdDecompressor().decompressobj()
+        else:
+            msg = "No decompressor available for the archive '%s'" % archive
+            raise ExtractionError(msg)
+
+        try:
+            fobj = open(archive, "rb")
+        except IOError as err:
+            raise ExtractionError(str(err))
+        return (tarfile.TarFile.open(fileobj=_DecompressingReader(fobj,
+                                                                  decompressor),
+                                     mode="r|"), None)
     except tarfile.TarError as err:
         raise ExtractionError(err.message)
 
-    # generator for the paths of the files found in the archive
-    files = set(member.path for member in tfile.getmembers()
-                if member.isfile())
 
-    for fpath in ensure_has_files or ():
-        if fpath not in files:
-            msg = "File '%s' not found in the archive '%s'" % (fpath, archive)
-            raise ExtractionError(msg)
+def _extract_tarball(archive, out_dir, ensure_has_files, alg,
+                     content_only=False):
+    """
+    Extract the given TAR archive to the given output directory and make sure
+    the given file exists in the archive. The archive is only read (and
+    decompressed) once, its members are extracted into a staging directory as
+    they come and only moved to the output directory if all the required
+    files are found in the archive. Otherwise the extracted data is removed.
+
+    :see: extract_data
+    :param alg: compression algorithm used for the tarball
+    :type alg: str (one of "gz", "bz2", "xz", "zst") or None
+    :param content_only: whether to only extract the required files and the
+                         files that may be SCAP content
+    :type content_only: bool
+    :return: a list of files and directories extracted from the archive
+    :rtype: [str]
+
+    """
+
+    tfile, proc = _open_tarball(archive, alg)
 
     utils.ensure_dir_exists(out_dir)
-    tfile.extractall(path=out_dir)
-    result = [utils.join_paths(out_dir, member.path) for member in tfile.getmembers()]
-    tfile.close()
+    staging_dir = tempfile.mkdtemp(prefix=".oscap_extract", dir=out_dir)
 
-    return result
+    paths = []
+    files = set()
+    directories = []
+    try:
+        try:
+            for member in tfile:
+                if member.isfile():
+                    files.add(member.path)
+                if content_only and not _is_content_member(member.path,
+                                                           ensure_has_files):
+                    continue
+
+                paths.append(member.path)
+                if member.isdir():
+                    # make sure the directory is writable until all its
+                    # contents is extracted (like TarFile.extractall does)
+                    directories.append(member)
+                    member = copy.copy(member)
+                    member.mode = 0o700
+                tfile.extract(member, staging_dir)
+
+            if proc:
+                # let the decompressor finish (there may be some padding
+                # after the end of the archive)
+                while proc.stdout.read(IO_BUF_SIZE):
+                    pass
+        except (tarfile.TarError, EnvironmentError) as err:
+            raise ExtractionError(str(err))
+        finally:
+            tfile.close()
+            if proc:
+                proc.stdout.close()
+                errors = proc.stderr.read()
+                proc.wait()
+
+        if proc and proc.returncode != 0:
+            msg = "Failed to decompress the archive '%s': %s" % (archive,
+                                                                errors.strip())
+            raise ExtractionError(msg)
+
+        for fpath in ensure_has_files or ():
+            if fpath not in files:
+                msg = "File '%s' not found in the archive '%s'" % (fpath, archive)
+                raise ExtractionError(msg)
+
+        try:
+            _move_tree(staging_dir, out_dir)
+
+            # set the attributes of the directories, the deepest ones first
+            directories.sort(key=lambda member: member.name, reverse=True)
+            for member in directories:
+                dir_path = utils.join_paths(out_dir, member.name)
+                tfile.chown(member, dir_path)
+                tfile.utime(member, dir_path)
+                tfile.chmod(member, dir_path)
+        except (tarfile.TarError, EnvironmentError) as err:
+            raise ExtractionError(str(err))
+    finally:
+        # nothing left here if everything went well
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+    return [utils.join_paths(out_dir, path) for path in paths]
+
+
+def _move_tree(src_dir, dst_dir):
+    """
+    Move the contents of the given source directory to the given destination
+    directory, merging the directories existing in both and replacing other
+    existing items.
 
+    :type src_dir: str
+    :type dst_dir: str
+    :raise EnvironmentError: if the contents cannot be moved
 
-def _extract_rpm(rpm_path, root="/", ensure_has_files=None):
+    """
+
+    for name in os.listdir(src_dir):
+        src_path = os.path.join(src_dir, name)
+        dst_path = os.path.join(dst_dir, name)
+
+        src_is_dir = os.path.isdir(src_path) and not os.path.islink(src_path)
+        dst_is_dir = os.path.isdir(dst_path) and not os.path.islink(dst_path)
+        if src_is_dir and dst_is_dir:
+            _move_tree(src_path, dst_path)
+        else:
+            if dst_is_dir:
+                shutil.rmtree(dst_path)
+            os.rename(src_path, dst_path)
+
+
+def _read_exactly(fobj, size):
+    """
+    Read exactly the given number of bytes from the given file object.
+
+    :raise ExtractionError: if the data ends prematurely
+
+    """
+
+    data = fobj.read(size)
+    if len(data) != size:
+        raise ExtractionError("Unexpected end of the archive")
+
+    return data
+
+
+def _iter_cpio_entries(fobj):
+    """
+    Generator of the entries of a "new" ASCII (SVR4) cpio archive read from
+    the given file object which doesn't have to be seekable (e.g. a pipe).
+    The data of an entry has to be processed before the next entry is
+    requested, the unprocessed data is skipped.
+
+    :param fobj: file object to read the archive from
+    :type fobj: file
+    :return: generator of (name, mode, data) tuples where data is a generator
+             of chunks (at most IO_BUF_SIZE bytes long) of the entry's data
+    :rtype: generator
+    :raise ExtractionError: if the archive is invalid
+
+    """
+
+    pad = lambda size: (4 - size % 4) % 4
+
+    while True:
+        header = _read_exactly(fobj, CPIO_HEADER_SIZE)
+        if header[:6] not in CPIO_NEWC_MAGICS:
+            raise ExtractionError("Unsupported or invalid cpio archive")
+
+        # 13 8-digit hexadecimal fields follow the magic
+        try:
+            fields = [int(header[i:i + 8], 16)
+                      for i in range(6, CPIO_HEADER_SIZE, 8)]
+        except ValueError:
+            raise ExtractionError("Invalid cpio archive header")
+        mode, size, name_size = fields[1], fields[6], fields[11]
+
+        # the name is NUL-terminated and padded together with the header
+        name = _read_exactly(fobj, name_size).rstrip("\0")
+        _read_exactly(fobj, pad(CPIO_HEADER_SIZE + name_size))
+        if name == CPIO_TRAILER:
+            return
+
+        def read_data(remaining=size):
+            while remaining:
+                buf = _read_exactly(fobj, min(remaining, IO_BUF_SIZE))
+                remaining -= len(buf)
+                yield buf
+
+        data = read_data()
+        yield (name, mode, data)
+
+        # skip the data not read by the caller
+        for _buf in data:
+            pass
+        _read_exactly(fobj, pad(size))
+
+
+class _DecompressingReader(object):
+    """
+    File-like object reading data from a file object through a (streaming)
+    decompressor.
+
+    """
+
+    def __init__(self, fobj, decompressor):
+        """
+        :param fobj: file object to read the compressed data from
+        :type fobj: file
+        :param decompressor: object decompressing the data passed to its
+                             decompress() method
+        """
+
+        self._fobj = fobj
+        self._decompressor = decompressor
+        self._eof = False
+
+        # decompressed chunks not read yet, the first one is read up to the
+        # offset (concatenating and slicing a single buffer would copy the
+        # not read data over and over again)
+        self._chunks = deque()
+        self._offset = 0
+        self._available = 0
+
+    def read(self, size):
+        """
+        Read (up to, if the data ends) size bytes of the decompressed data.
+
+        :raise ExtractionError: if the data cannot be decompressed
+
+        """
+
+        try:
+            while self._available < size and not self._eof:
+                chunk = self._fobj.read(DECOMPRESS_CHUNK_SIZE)
+                if chunk:
+                    data = self._decompressor.decompress(chunk)
+                else:
+                    self._eof = True
+                    data = ""
+                    if hasattr(self._decompressor, "flush"):
+                        data = self._decompressor.flush()
+                if data:
+                    self._chunks.append(data)
+                    self._available += len(data)
+        except DECOMPRESSION_ERRORS as err:
+            raise ExtractionError("Failed to decompress the data: %s" % err)
+
+        remaining = min(size, self._available)
+        self._available -= remaining
+        parts = []
+        while remaining:
+            chunk = self._chunks[0]
+            part = chunk[self._offset:self._offset + remaining]
+            parts.append(part)
+            remaining -= len(part)
+            if self._offset + len(part) == len(chunk):
+                self._chunks.popleft()
+                self._offset = 0
+            else:
+                self._offset += len(part)
+
+        return "".join(parts)
+
+    def close(self):
+        self._fobj.close()
+
+
+def _get_decompressor(compressor):
+    """
+    Get a streaming decompressor for the given RPM payload compressor.
+
+    :param compressor: value of the PAYLOADCOMPRESSOR RPM tag
+    :type compressor: str
+    :return: decompressor or None if the compressor is not supported
+             (possibly due to a missing module)
+
+    """
+
+    if compressor == "gzip":
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    elif compressor == "bzip2":
+        return bz2.BZ2Decompressor()
+    elif compressor in ("xz", "lzma") and lzma:
+        return lzma.LZMADecompressor()
+    elif compressor == "zstd" and zstandard:
+        return zstandard.ZstdDecompressor().decompressobj()
+    else:
+        return None
+
+
+def _read_rpm_header(fobj, pad=False):
+    """
+    Read an RPM header structure (signature or the main header) from the given
+    file object.
+
+    :param pad: whether the header is padded to 8 bytes (the signature is)
+    :type pad: bool
+    :return: dictionary of the string tags found in the header
+    :rtype: dict(int -> str)
+    :raise ExtractionError: if the header is invalid
+
+    """
+
+    intro = _read_exactly(fobj, 16)
+    if intro[:4] != RPM_HEADER_MAGIC:
+        raise ExtractionError("Invalid RPM header")
+
+    num_entries, data_size = struct.unpack(">II", intro[8:16])
+    index = _read_exactly(fobj, 16 * num_entries)
+    data = _read_exactly(fobj, data_size)
+    if pad:
+        _read_exactly(fobj, (8 - data_size % 8) % 8)
+
+    tags = dict()
+    for i in range(num_entries):
+        tag, tag_type, offset, _count = struct.unpack(">iiii",
+                                                      index[16 * i:16 * (i + 1)])
+        if tag_type == RPM_STRING_TYPE:
+            end = data.find("\0", offset)
+            if offset < 0 or end == -1:
+                raise ExtractionError("Invalid RPM header")
+            tags[tag] = data[offset:end]
+
+    return tags
+
+
+def _open_rpm_payload(rpm_path):
+    """
+    Open the cpio payload of the given RPM for reading (in-process).
+
+    :param rpm_path: path to the RPM file
+    :type rpm_path: str
+    :return: file-like object with the decompressed payload or None if the
+             payload format or compression is not supported
+    :rtype: file-like object or None
+    :raise ExtractionError: if the RPM cannot be read or is invalid
+
+    """
+
+    try:
+        fobj = open(rpm_path, "rb")
+    except IOError as err:
+        raise ExtractionError("Failed to open RPM '%s': %s" % (rpm_path, err))
+
+    try:
+        lead = _read_exactly(fobj, RPM_LEAD_SIZE)
+        if lead[:4] != RPM_LEAD_MAGIC:
+            raise ExtractionError("'%s' is not an RPM file" % rpm_path)
+
+        _read_rpm_header(fobj, pad=True)
+        tags = _read_rpm_header(fobj)
+    except (ExtractionError, IOError) as err:
+        fobj.close()
+        raise ExtractionError("Failed to read RPM '%s': %s" % (rpm_path, err))
+
+    decompressor = None
+    if tags.get(RPMTAG_PAYLOADFORMAT, "cpio") == "cpio":
+        decompressor = _get_decompressor(tags.get(RPMTAG_PAYLOADCOMPRESSOR,
+                                                  "gzip"))
+    if not decompressor:
+        fobj.close()
+        return None
+
+    return _DecompressingReader(fobj, decompressor)
+
+
+def _make_dirs(path, created):
+    """
+    Create the given directory and its missing parents, recording the created
+    directories in the given list.
+
+    """
+
+    missing = []
+    while path and not os.path.isdir(path):
+        missing.append(path)
+        path = os.path.dirname(path)
+
+    for dir_path in reversed(missing):
+        os.mkdir(dir_path)
+        created.append(dir_path)
+
+
+def _remove_created(created):
+    """Remove the given created files and directories (in reverse order)."""
+
+    for path in reversed(created):
+        try:
+            if os.path.isdir(path) and not os.path.islink(path):
+                os.rmdir(path)
+            else:
+                os.unlink(path)
+        except OSError as err:
+            log.debug("OSCAP addon: failed to remove '%s': %s", path, err)
+
+
+def _extract_rpm(rpm_path, root="/", ensure_has_files=None,
+                 content_only=False):
     """
     Extract the given RPM into the directory tree given by the root argument
-    and make sure the given file exists in the archive.
+    and make sure the given file exists in the archive. The payload of the
+    RPM is read in-process if its compression is supported, with rpm2cpio
+    otherwise, and processed as it comes, writing the entries out one by one.
+    If a required file is missing in the archive, the extracted files are
+    removed.
 
     :param rpm_path: path to the RPM file that should be extracted
     :type rpm_path: str
@@ -407,61 +2012,156 @@ def _extract_rpm(rpm_path, root="/", ensure_has_files=None):
     :param ensure_has_files: relative paths to the files that must exist in the
                              RPM
     :type ensure_has_files: iterable of strings or None
+    :param content_only: whether to only extract the required files and the
+                         files that may be SCAP content
+    :type content_only: bool
     :return: a list of files and directories extracted from the archive
     :rtype: [str]
 
     """
 
-    # run rpm2cpio and process the output with the cpioarchive module
-    temp_fd, temp_path = tempfile.mkstemp(prefix="oscap_rpm")
-    proc = subprocess.Popen(["rpm2cpio", rpm_path], stdout=temp_fd)
-    proc.wait()
-    if proc.returncode != 0:
-        msg = "Failed to convert RPM '%s' to cpio archive" % rpm_path
-        raise ExtractionError(msg)
+    ensure_has_files = ensure_has_files or ()
 
-    os.close(temp_fd)
+    proc = None
+    payload = _open_rpm_payload(rpm_path)
+    if payload is None:
+        log.info("OSCAP addon: cannot read the payload of '%s', using "
+                 "rpm2cpio", rpm_path)
+        try:
+            proc = subprocess.Popen(["rpm2cpio", rpm_path],
+                                    stdout=subprocess.PIPE)
+        except OSError as err:
+            msg = "Failed to convert RPM '%s' to cpio archive: %s" % (rpm_path,
+                                                                      err)
+            raise ExtractionError(msg)
+        payload = proc.stdout
 
+    # cpio entry names (paths) start with the dot
+    entry_names = []
+    extracted = []
+    # files and directories created by the extraction
+    created = []
     try:
-        archive = cpioarchive.CpioArchive(temp_path)
-    except cpioarchive.CpioError as err:
-        raise ExtractionError(err.message)
+        try:
+            for (name, mode, data) in _iter_cpio_entries(payload):
+                name = name.lstrip(".")
+                entry_names.append(name)
+                if content_only and not _is_content_member(name,
+                                                           ensure_has_files):
+                    continue
+
+                extracted.append(name)
+                out_fpath = os.path.normpath(root + name)
+
+                if stat.S_ISDIR(mode):
+                    _make_dirs(out_fpath, created)
+                    continue
+
+                _make_dirs(os.path.dirname(out_fpath), created)
+                if os.path.lexists(out_fpath):
+                    continue
+
+                if stat.S_ISLNK(mode):
+                    os.symlink("".join(data), out_fpath)
+                    created.append(out_fpath)
+                elif stat.S_ISREG(mode):
+                    with open(out_fpath, "wb") as out_file:
+                        created.append(out_fpath)
+                        for buf in data:
+                            out_file.write(buf)
+        except EnvironmentError as err:
+            raise ExtractionError(err)
+        finally:
+            payload.close()
+            if proc:
+                proc.wait()
+
+        if proc and proc.returncode != 0:
+            msg = "Failed to convert RPM '%s' to cpio archive" % rpm_path
+            raise ExtractionError(msg)
+
+        for fpath in ensure_has_files or ():
+            # RPM->cpio entries have absolute paths
+            if fpath not in entry_names and \
+               os.path.join("/", fpath) not in entry_names:
+                msg = "File '%s' not found in the archive '%s'" % (fpath, rpm_path)
+                raise ExtractionError(msg)
+    except ExtractionError:
+        _remove_created(created)
+        raise
 
-    # get entries from the archive (supports only iteration over entries)
-    entries = set(entry for entry in archive)
+    return [os.path.normpath(root + name) for name in extracted]
 
-    # cpio entry names (paths) start with the dot
-    entry_names = [entry.name.lstrip(".") for entry in entries]
 
-    for fpath in ensure_has_files or ():
-        # RPM->cpio entries have absolute paths
-        if fpath not in entry_names and \
-           os.path.join("/", fpath) not in entry_names:
-            msg = "File '%s' not found in the archive '%s'" % (fpath, rpm_path)
+def install_rpms(rpm_paths, root="/"):
+    """
+    Install the given RPM files into the system with the given root in a
+    single transaction using the rpm Python bindings. Just like with
+    'rpm -i --nodeps --nosignature', dependencies and signatures are not
+    checked, so no repository metadata needs to be loaded.
+
+    :param rpm_paths: paths to the RPM files that should be installed
+    :type rpm_paths: iterable of strings
+    :param root: root of the system the RPMs should be installed into
+    :type root: str
+    :raise ExtractionError: if the rpm Python bindings are not available or
+                            the installation fails
+
+    """
+
+    if rpm is None:
+        raise ExtractionError("The rpm Python bindings are not available")
+
+    trans = rpm.TransactionSet(root)
+    # pylint: disable-msg=W0212
+    trans.setVSFlags(rpm._RPMVSF_NOSIGNATURES | rpm._RPMVSF_NODIGESTS)
+    trans.setProbFilter(rpm.RPMPROB_FILTER_REPLACEPKG |
+                        rpm.RPMPROB_FILTER_OLDPACKAGE)
+
+    for rpm_path in rpm_paths:
+        try:
+            with open(rpm_path, "rb") as fobj:
+                hdr = trans.hdrFromFdno(fobj.fileno())
+            trans.addInstall(hdr, rpm_path, "i")
+        except (EnvironmentError, rpm.error) as err:
+            trans.closeDB()
+            msg = "Failed to add RPM '%s' to the transaction: %s" % (rpm_path,
+                                                                     err)
             raise ExtractionError(msg)
 
+    # files opened for the transaction by their paths (keys)
+    open_files = dict()
+    # errors of the callback that must not raise exceptions into rpm
+    errors = []
+
+    def callback(what, _amount, _total, key, _data):
+        if what == rpm.RPMCALLBACK_INST_OPEN_FILE:
+            try:
+                open_files[key] = open(key, "rb")
+            except IOError as err:
+                # rpm fails to install the package
+                errors.append("Failed to open RPM '%s': %s" % (key, err))
+                return None
+            return open_files[key].fileno()
+        elif what == rpm.RPMCALLBACK_INST_CLOSE_FILE:
+            open_files.pop(key).close()
+
+    # no trans.check() call, dependencies are not resolved
+    trans.order()
     try:
-        for entry in entries:
-            dirname = os.path.dirname(entry.name.lstrip("."))
-            out_dir = os.path.normpath(root + dirname)
-            utils.ensure_dir_exists(out_dir)
-
-            out_fpath = os.path.normpath(root + entry.name.lstrip("."))
-            if os.path.exists(out_fpath):
-                continue
-            with open(out_fpath, "wb") as out_file:
-                buf = entry.read(IO_BUF_SIZE)
-                while buf:
-                    out_file.write(buf)
-                    buf = entry.read(IO_BUF_SIZE)
-    except (IOError, cpioarchive.CpioError) as e:
-        raise ExtractionError(e)
-
-    # cleanup
-    archive.close()
-    os.unlink(temp_path)
-
-    return [os.path.normpath(root + name) for name in entry_names]
+        problems = trans.run(callback, None) or []
+    except rpm.error as err:
+        problems = [err]
+    finally:
+        for fobj in open_files.values():
+            fobj.close()
+        trans.closeDB()
+
+    problems = errors + [str(prob) for prob in problems]
+    if problems:
+        msg = "Failed to install RPM(s) %s: %s" % (", ".join(rpm_paths),
+                                                   "; ".join(problems))
+        raise ExtractionError(msg)
 
 
 def strip_content_dir(fpaths, phase="preinst"):
@@ -24,15 +24,61 @@ it.
 
 """
 
+import os
 import os.path
+import re
+import threading
+import hashlib
+import json
+import logging
+import tempfile
 
 from collections import namedtuple, OrderedDict
+from itertools import izip
+from multiprocessing.pool import ThreadPool
 from openscap_api import OSCAP
 from pyanaconda.iutil import execReadlines
+from org_fedora_oscap import utils
 try:
     from html.parser import HTMLParser
 except ImportError:
     from HTMLParser import HTMLParser
+try:
+    import xml.etree.cElementTree as ElementTree
+except ImportError:
+    import xml.etree.ElementTree as ElementTree
+
+XCCDF_NAMESPACES = ("http://checklists.nist.gov/xccdf/1.1",
+                    "http://checklists.nist.gov/xccdf/1.2",
+                    )
+DS_NAMESPACE = "http://scap.nist.gov/schema/scap/source/1.2"
+XLINK_NAMESPACE = "http://www.w3.org/1999/xlink"
+CPE_DICT_NAMESPACE = "http://cpe.mitre.org/dictionary/2.0"
+
+# (namespace, root element) -> document type as reported by 'oscap info'
+DOC_TYPES = {(DS_NAMESPACE, "data-stream-collection"): "Source Data Stream",
+             (CPE_DICT_NAMESPACE, "cpe-list"): "CPE Dictionary",
+             }
+for _namespace in XCCDF_NAMESPACES:
+    DOC_TYPES[(_namespace, "Benchmark")] = "XCCDF Checklist"
+    DOC_TYPES[(_namespace, "Tailoring")] = "XCCDF Tailoring"
+
+# how many bytes of a file are read to find out its document type
+SNIFF_SIZE = 8192
+
+# how many files are examined at the same time
+SNIFF_WORKERS = 4
+
+# default number of loaded sessions kept by the DataStreamHandler
+SESSION_POOL_SIZE = 3
+
+# bump when the format of the profiles index files changes
+PROFILES_INDEX_VERSION = 1
+
+# XML comments left in the contents of the fix elements
+XML_COMMENT_RE = re.compile(r"<!--.*?-->", re.DOTALL)
+
+log = logging.getLogger("anaconda")
 
 
 class ContentHandlingError(Exception):
@@ -110,6 +156,15 @@ ProfileInfo = namedtuple("ProfileInfo", ["id", "title", "description"])
 # pylint: disable-msg=C0103
 ContentFiles = namedtuple("ContentFiles", ["xccdf", "cpe", "tailoring"])
 
+# namedtuple classes for the data gathered by the FixesIndex
+#   fixes -- list of fixes, each being a list of strings and (idref,) tuples
+#            standing for the <sub> elements
+# pylint: disable-msg=C0103
+_RuleInfo = namedtuple("_RuleInfo", ["id", "selected", "groups", "fixes"])
+# pylint: disable-msg=C0103
+_ProfileData = namedtuple("_ProfileData", ["id", "extends", "selects",
+                                           "set_values", "refine_values"])
+
 
 def oscap_text_itr_get_text(itr):
     """
@@ -130,6 +185,803 @@ def oscap_text_itr_get_text(itr):
     return ret
 
 
+def _resolve_fix(policy, fix):
+    """
+    Helper function for getting the content of the given fix element with the
+    <sub> elements substituted by the values from the given policy and with
+    the XML comments stripped (just like 'oscap xccdf generate fix' does).
+
+    :param policy: policy (profile) giving the values
+    :type policy: xccdf_policy
+    :param fix: the fix element
+    :type fix: xccdf_fix
+    :return: resolved content of the fix element
+    :rtype: str
+    :raise ContentHandlingError: if the substitutions cannot be resolved
+
+    """
+
+    # the substitution is done in place, the loaded content must stay intact
+    resolved_fix = OSCAP.xccdf_fix_clone(fix)
+    try:
+        ret = OSCAP.xccdf_policy_resolve_fix_substitution(policy, resolved_fix,
+                                                          None, None)
+        if ret != 0:
+            msg = "Failed to resolve the substitutions in a fix: %s" % \
+                  OSCAP.oscap_err_desc()
+            raise ContentHandlingError(msg)
+        content = OSCAP.xccdf_fix_get_content(resolved_fix) or ""
+    finally:
+        OSCAP.xccdf_fix_free(resolved_fix)
+
+    return XML_COMMENT_RE.sub("", content)
+
+
+def _get_fixes(items_itr, policy, template):
+    """
+    Helper function for getting the contents of the fix elements with the
+    given 'system' attribute from the rules selected by the given policy in
+    the document order. Descends into groups. The <sub> elements are resolved
+    with the values from the policy.
+
+    :param items_itr: iterator over XCCDF items (rules, groups, values)
+    :type items_itr: xccdf_item_iterator
+    :param policy: policy (profile) selecting the rules
+    :type policy: xccdf_policy
+    :param template: the value of the 'system' attribute of the fix elements
+    :type template: str
+    :return: contents of the fix elements
+    :rtype: list of strings
+    :raise ContentHandlingError: if the substitutions cannot be resolved
+
+    """
+
+    fixes = []
+    while OSCAP.xccdf_item_iterator_has_more(items_itr):
+        item = OSCAP.xccdf_item_iterator_next(items_itr)
+        item_type = OSCAP.xccdf_item_get_type(item)
+
+        if item_type == OSCAP.XCCDF_GROUP:
+            group = OSCAP.xccdf_item_to_group(item)
+            fixes.extend(_get_fixes(OSCAP.xccdf_group_get_content(group),
+                                    policy, template))
+        elif item_type == OSCAP.XCCDF_RULE:
+            rule = OSCAP.xccdf_item_to_rule(item)
+            if not OSCAP.xccdf_policy_is_item_selected(policy,
+                                                       OSCAP.xccdf_rule_get_id(rule)):
+                continue
+
+            fix_itr = OSCAP.xccdf_rule_get_fixes(rule)
+            try:
+                while OSCAP.xccdf_fix_iterator_has_more(fix_itr):
+                    fix = OSCAP.xccdf_fix_iterator_next(fix_itr)
+                    if OSCAP.xccdf_fix_get_system(fix) == template:
+                        fixes.append(_resolve_fix(policy, fix))
+            finally:
+                OSCAP.xccdf_fix_iterator_free(fix_itr)
+
+    OSCAP.xccdf_item_iterator_free(items_itr)
+
+    return fixes
+
+
+def generate_fix_rules(policy_model, profile_id, template):
+    """
+    Get the contents of the fix elements with the given 'system' attribute for
+    the given profile from an already loaded policy model. Gives the same rules
+    as 'oscap xccdf generate fix --template' without running the oscap tool.
+
+    :param policy_model: loaded policy model
+    :type policy_model: xccdf_policy_model
+    :param profile_id: ID of the profile or "default" for the default one
+    :type profile_id: str
+    :param template: the value of the 'system' attribute of the fix elements
+    :type template: str
+    :return: fix rules (one fix per line or block of lines)
+    :rtype: str
+    :raise ContentHandlingError: if the profile is not found
+
+    """
+
+    if profile_id.lower() == "default":
+        profile_id = None
+
+    policy = OSCAP.xccdf_policy_model_get_policy_by_id(policy_model, profile_id)
+    if not policy:
+        msg = "Profile '%s' not found in the content" % profile_id
+        raise ContentHandlingError(msg)
+
+    benchmark = OSCAP.xccdf_policy_model_get_benchmark(policy_model)
+    fixes = _get_fixes(OSCAP.xccdf_benchmark_get_content(benchmark), policy,
+                       template)
+
+    return "".join(fix.strip() + "\n" for fix in fixes)
+
+
+def _split_tag(tag):
+    """
+    Split an ElementTree tag into the namespace and the local name.
+
+    :param tag: tag in the "{namespace}name" format
+    :type tag: str
+    :return: namespace ("" if none) and local name
+    :rtype: (str, str)
+
+    """
+
+    if tag.startswith("{"):
+        namespace, _sep, name = tag[1:].partition("}")
+        return (namespace, name)
+
+    return ("", tag)
+
+
+def _xccdf_bool(value, default=True):
+    """Convert an XCCDF boolean attribute value to bool."""
+
+    if value is None:
+        return default
+
+    return value.strip() in ("true", "1")
+
+
+def _parse_profile(elem):
+    """
+    Parse an XCCDF Profile element.
+
+    :return: data of the profile relevant for the selection of rules
+    :rtype: _ProfileData
+
+    """
+
+    selects = []
+    set_values = dict()
+    refine_values = dict()
+    for child in elem:
+        name = _split_tag(child.tag)[1]
+        if name == "select":
+            selects.append((child.get("idref"),
+                            _xccdf_bool(child.get("selected"))))
+        elif name == "set-value":
+            set_values[child.get("idref")] = child.text or ""
+        elif name == "refine-value" and child.get("selector") is not None:
+            refine_values[child.get("idref")] = child.get("selector")
+
+    return _ProfileData(elem.get("id"), elem.get("extends"), selects,
+                        set_values, refine_values)
+
+
+class _ContentWalker(object):
+    """
+    Base class for gathering data from a data stream collection or an XCCDF
+    benchmark with an incremental parser walking the file only once and
+    dropping the processed elements, so that the memory used doesn't grow with
+    the size of the file (OVAL definitions,...).
+
+    Data streams and their checklists are gathered here, subclasses gather data
+    from the benchmarks by implementing the _new_benchmark and _process
+    methods.
+
+    """
+
+    # local names of the XCCDF elements that are processed as a whole once
+    # they end (their children cannot be dropped before that)
+    _records = ()
+
+    def __init__(self):
+        # data stream ID -> list of (checklist ID, component ID or None)
+        self._data_streams = OrderedDict()
+
+        # component ID (None for a standalone benchmark) -> benchmark data
+        self._benchmarks = OrderedDict()
+
+    def _new_benchmark(self):
+        """
+        Create an object for the data gathered from a new benchmark.
+
+        :return: object passed to the _process method for the elements of the
+                 benchmark
+
+        """
+
+        raise NotImplementedError()
+
+    def _process(self, benchmark, name, elem, groups):
+        """
+        Process an XCCDF element from a benchmark once it ends.
+
+        :param benchmark: data gathered from the benchmark so far
+        :param name: local name of the element
+        :type name: str
+        :param elem: the element (children of elements not listed in _records
+                     are already dropped)
+        :type elem: ElementTree.Element
+        :param groups: Group elements the element is in (including the
+                       element itself if it is a group)
+        :type groups: list of ElementTree.Element instances
+
+        """
+
+        raise NotImplementedError()
+
+    def _walk(self, fpath):
+        """
+        Walk the given file and gather data from it.
+
+        :raise IOError: if the file cannot be read
+        :raise SyntaxError: if the file cannot be parsed
+
+        """
+
+        # elements from the root to the current one
+        stack = []
+        record_depth = 0
+        groups = []
+
+        checklists = None
+        component_id = None
+        benchmark = None
+
+        for event, elem in ElementTree.iterparse(fpath, events=("start", "end")):
+            namespace, name = _split_tag(elem.tag)
+
+            if event == "start":
+                stack.append(elem)
+                if namespace == DS_NAMESPACE:
+                    if name == "data-stream":
+                        checklists = []
+                        self._data_streams[elem.get("id")] = checklists
+                    elif name == "component":
+                        component_id = elem.get("id")
+                    elif name == "component-ref" and checklists is not None and \
+                            _split_tag(stack[-2].tag)[1] == "checklists":
+                        href = elem.get("{%s}href" % XLINK_NAMESPACE, "")
+                        if href.startswith("#"):
+                            checklists.append((elem.get("id"), href[1:]))
+                        else:
+                            # not a part of the collection
+                            checklists.append((elem.get("id"), None))
+                elif namespace in XCCDF_NAMESPACES:
+                    if name == "Benchmark":
+                        benchmark = self._new_benchmark()
+                        self._benchmarks[component_id] = benchmark
+                    elif benchmark is not None and name == "Group":
+                        groups.append(elem)
+                    if benchmark is not None and name in self._records:
+                        record_depth += 1
+                continue
+
+            stack.pop()
+            if namespace == DS_NAMESPACE:
+                if name == "data-stream":
+                    checklists = None
+                elif name == "component":
+                    component_id = None
+            elif namespace in XCCDF_NAMESPACES and benchmark is not None:
+                if name in self._records:
+                    record_depth -= 1
+                if name == "Benchmark":
+                    benchmark = None
+                else:
+                    self._process(benchmark, name, elem, groups)
+                    if name == "Group":
+                        groups.pop()
+
+            if record_depth == 0:
+                # processed, drop it
+                elem.clear()
+                if stack:
+                    stack[-1].remove(elem)
+
+    def _get_benchmark(self, data_stream_id="", checklist_id=""):
+        """
+        Get data gathered from the benchmark of the given checklist in the
+        given data stream or from the standalone benchmark.
+
+        :param data_stream_id: ID of the data stream (the first one if not
+                               given)
+        :type data_stream_id: str
+        :param checklist_id: ID of the checklist (the first one in the data
+                             stream if not given)
+        :type checklist_id: str
+        :raise ContentHandlingError: if no such benchmark was found
+
+        """
+
+        if None in self._benchmarks:
+            # standalone benchmark
+            return self._benchmarks[None]
+
+        if not self._data_streams:
+            raise ContentHandlingError("No benchmark found in the content")
+
+        if not data_stream_id:
+            data_stream_id = list(self._data_streams.keys())[0]
+        if data_stream_id not in self._data_streams:
+            msg = "Invalid data stream id given: '%s'" % data_stream_id
+            raise DataStreamHandlingError(msg)
+
+        checklists = self._data_streams[data_stream_id]
+        if not checklists:
+            msg = "No checklist found in the data stream '%s'" % data_stream_id
+            raise DataStreamHandlingError(msg)
+
+        if not checklist_id:
+            checklist_id = checklists[0][0]
+        component_ids = [component_id for (chk_id, component_id) in checklists
+                         if chk_id == checklist_id]
+        if not component_ids or component_ids[0] not in self._benchmarks:
+            msg = "Invalid or unsupported checklist: '%s'" % checklist_id
+            raise DataStreamHandlingError(msg)
+
+        return self._benchmarks[component_ids[0]]
+
+
+class _FixesData(object):
+    """Data gathered from a single XCCDF benchmark by the FixesIndex."""
+
+    def __init__(self):
+        # rules having some fix of the indexed type in the document order
+        self.rules = []
+
+        # group ID -> selected by default
+        self.groups = dict()
+
+        # value ID -> {selector ("" for the default) -> value}
+        self.values = dict()
+
+        # profile ID -> _ProfileData
+        self.profiles = dict()
+
+
+class FixesIndex(_ContentWalker):
+    """
+    Class for getting fixes of a given type (e.g. the pre-installation ones)
+    from a data stream collection or an XCCDF benchmark without the oscap
+    tool. The file is walked only once and only rules having some fix of the
+    given type are remembered.
+
+    The file is parsed when fix rules are requested for the first time.
+
+    """
+
+    _records = ("Rule", "Value", "Profile")
+
+    def __init__(self, content_file_path, template, tailoring_file_path=""):
+        """
+        Constructor for the FixesIndex class.
+
+        :param content_file_path: path to a file with a data stream collection
+                                  or an XCCDF benchmark
+        :type content_file_path: str
+        :param template: the value of the 'system' attribute of the fix
+                         elements that should be indexed
+        :type template: str
+        :param tailoring_file_path: path to a tailoring file
+        :type tailoring_file_path: str
+
+        """
+
+        _ContentWalker.__init__(self)
+
+        self._content_file_path = content_file_path
+        self._tailoring_file_path = tailoring_file_path
+        self._template = template
+
+        self._lock = threading.Lock()
+        self._parsed = False
+
+        # profile ID -> _ProfileData for the profiles from the tailoring file
+        self._tailoring_profiles = dict()
+
+    def _parse(self):
+        try:
+            self._walk(self._content_file_path)
+            if self._tailoring_file_path:
+                self._parse_tailoring()
+        except (IOError, SyntaxError) as err:
+            # ElementTree's ParseError is a subclass of SyntaxError
+            msg = "Failed to index fixes in '%s': %s" % (self._content_file_path,
+                                                         err)
+            raise ContentHandlingError(msg)
+
+    def _new_benchmark(self):
+        return _FixesData()
+
+    def _process(self, benchmark, name, elem, groups):
+        if name == "Group":
+            benchmark.groups[elem.get("id")] = _xccdf_bool(elem.get("selected"))
+        elif name == "Rule":
+            self._add_rule(benchmark, elem, groups)
+        elif name == "Value":
+            values = dict((child.get("selector", ""), child.text or "")
+                          for child in elem
+                          if _split_tag(child.tag)[1] == "value")
+            benchmark.values[elem.get("id")] = values
+        elif name == "Profile":
+            profile = _parse_profile(elem)
+            benchmark.profiles[profile.id] = profile
+
+    def _add_rule(self, benchmark, elem, groups):
+        fixes = []
+        for child in elem:
+            if _split_tag(child.tag)[1] != "fix" or \
+                    child.get("system") != self._template:
+                continue
+
+            parts = [child.text or ""]
+            for fix_child in child:
+                if _split_tag(fix_child.tag)[1] == "sub":
+                    parts.append((fix_child.get("idref"),))
+                parts.append(fix_child.tail or "")
+            fixes.append(parts)
+
+        if fixes:
+            group_ids = tuple(group.get("id") for group in groups)
+            benchmark.rules.append(_RuleInfo(elem.get("id"),
+                                             _xccdf_bool(elem.get("selected")),
+                                             group_ids, fixes))
+
+    def _parse_tailoring(self):
+        root = ElementTree.parse(self._tailoring_file_path).getroot()
+        for elem in root:
+            if _split_tag(elem.tag)[1] == "Profile":
+                profile = _parse_profile(elem)
+                self._tailoring_profiles[profile.id] = profile
+
+    def _get_profile_chain(self, benchmark, profile_id):
+        """Get the profile and the profiles it extends (base ones first)."""
+
+        chain = []
+        seen = set()
+        while profile_id:
+            # tailoring profiles take precedence, but may extend a benchmark
+            # profile with the same ID
+            if profile_id in self._tailoring_profiles and profile_id not in seen:
+                profile = self._tailoring_profiles[profile_id]
+            elif profile_id in benchmark.profiles and \
+                    benchmark.profiles[profile_id] not in chain:
+                profile = benchmark.profiles[profile_id]
+            else:
+                msg = "Profile '%s' not found in the content" % profile_id
+                raise ContentHandlingError(msg)
+
+            seen.add(profile_id)
+            chain.append(profile)
+            profile_id = profile.extends
+
+        chain.reverse()
+        return chain
+
+    def get_fix_rules(self, profile_id, template, data_stream_id="",
+                      checklist_id=""):
+        """
+        Method to get the contents of the fix elements with the given 'system'
+        attribute for the given profile.
+
+        :param profile_id: ID of the profile or "default" for the default one
+        :type profile_id: str
+        :param template: the value of the 'system' attribute of the fix
+                         elements (has to be the one the index was created
+                         for)
+        :type template: str
+        :param data_stream_id: ID of the data stream (the first one if not
+                               given)
+        :type data_stream_id: str
+        :param checklist_id: ID of the checklist (the first one in the data
+                             stream if not given)
+        :type checklist_id: str
+        :return: fix rules
+        :rtype: str
+        :raise ContentHandlingError: if the content cannot be parsed or
+                                     doesn't contain the profile or if a
+                                     different template is requested
+
+        """
+
+        if template != self._template:
+            msg = "Fixes for the '%s' system not indexed" % template
+            raise ContentHandlingError(msg)
+
+        with self._lock:
+            if not self._parsed:
+                self._parse()
+                self._parsed = True
+
+        benchmark = self._get_benchmark(data_stream_id, checklist_id)
+
+        chain = []
+        if profile_id.lower() != "default":
+            chain = self._get_profile_chain(benchmark, profile_id)
+
+        selections = dict(benchmark.groups)
+        set_values = dict()
+        selectors = dict()
+        for profile in chain:
+            selections.update(profile.selects)
+            set_values.update(profile.set_values)
+            selectors.update(profile.refine_values)
+
+        def get_value(value_id):
+            if value_id in set_values:
+                return set_values[value_id]
+            values = benchmark.values.get(value_id, dict())
+            return values.get(selectors.get(value_id, ""), values.get("", ""))
+
+        ret = ""
+        for rule in benchmark.rules:
+            # a rule is only selected if all the groups it is in are selected
+            if not selections.get(rule.id, rule.selected) or \
+                    not all(selections[group] for group in rule.groups):
+                continue
+
+            for parts in rule.fixes:
+                fix = "".join(part if not isinstance(part, tuple)
+                              else get_value(part[0])
+                              for part in parts)
+                ret += fix.strip() + "\n"
+
+        return ret
+
+
+def _markup_to_text(elem):
+    """
+    Get text from an XCCDF text element possibly containing XHTML markup the
+    same way parse_HTML_from_content gets it from the markup.
+
+    :type elem: ElementTree.Element
+    :rtype: str
+
+    """
+
+    ret = (elem.text or "").strip()
+    for child in elem:
+        name = _split_tag(child.tag)[1]
+        if name in ("ul", "li", "br"):
+            ret += "\n"
+        ret += _markup_to_text(child)
+        if name in ("ul", "li"):
+            ret += "\n"
+        ret += (child.tail or "").strip()
+
+    return ret
+
+
+def _get_profile_info(elem):
+    """
+    Get ProfileInfo for an XCCDF Profile element.
+
+    :type elem: ElementTree.Element
+    :rtype: ProfileInfo
+
+    """
+
+    title = ""
+    desc = ""
+    for child in elem:
+        name = _split_tag(child.tag)[1]
+        # all the (localized) texts are joined just like oscap_text_itr_get_text
+        # does it
+        if name == "title":
+            title += _markup_to_text(child)
+        elif name == "description":
+            desc += _markup_to_text(child)
+
+    return ProfileInfo(elem.get("id"), title, desc)
+
+
+class _ProfilesData(object):
+    """Data gathered from a single XCCDF benchmark by the _ProfilesIndex."""
+
+    def __init__(self):
+        # profiles in the document order
+        self.profiles = []
+
+        # whether some rules are selected without any profile
+        self.default_rules = False
+
+
+class _ProfilesIndex(_ContentWalker):
+    """
+    Class gathering data streams, checklists and profiles from a data stream
+    collection or an XCCDF benchmark without loading the whole content.
+
+    """
+
+    _records = ("Profile",)
+
+    def __init__(self, content_file_path):
+        _ContentWalker.__init__(self)
+
+        try:
+            self._walk(content_file_path)
+        except (IOError, SyntaxError) as err:
+            # ElementTree's ParseError is a subclass of SyntaxError
+            msg = "'%s' is not a valid SCAP content file: %s" % (content_file_path,
+                                                                  err)
+            raise ContentHandlingError(msg)
+
+    def _new_benchmark(self):
+        return _ProfilesData()
+
+    def _process(self, benchmark, name, elem, groups):
+        if name == "Rule":
+            if _xccdf_bool(elem.get("selected")) and \
+                    all(_xccdf_bool(group.get("selected")) for group in groups):
+                benchmark.default_rules = True
+        elif name == "Profile":
+            benchmark.profiles.append(_get_profile_info(elem))
+
+    @property
+    def data_streams(self):
+        """Data stream ID -> list of checklist IDs"""
+
+        return OrderedDict((ds_id, [chk_id for (chk_id, _comp) in checklists])
+                           for (ds_id, checklists) in self._data_streams.items())
+
+    def get_profiles(self, data_stream_id="", checklist_id=""):
+        """
+        Get profiles of the given checklist in the given data stream (or of the
+        standalone benchmark) in the same form as the OSCAP session based
+        handlers.
+
+        :rtype: list of ProfileInfo instances
+        :see: DataStreamHandler.get_profiles
+
+        """
+
+        benchmark = self._get_benchmark(data_stream_id, checklist_id)
+
+        profiles = []
+        if benchmark.default_rules:
+            profiles.append(ProfileInfo("default", "Default",
+                            "The implicit XCCDF profile. Usually, the default contains no rules."))
+        profiles.extend(benchmark.profiles)
+
+        return profiles
+
+
+_PROLOG_ITEMS = (("<?", "?>"), ("<!--", "-->"), ("<!DOCTYPE", ">"))
+_ROOT_TAG_RE = re.compile(r"<([^\s/>!?]+)((?:\s+[^\s=/>]+\s*=\s*"
+                          r"(?:\"[^\"]*\"|'[^']*'))*)\s*/?>")
+_ATTR_RE = re.compile(r"([^\s=]+)\s*=\s*(?:\"([^\"]*)\"|'([^']*)')")
+
+
+def _sniff_doc_type(file_path):
+    """
+    Find out the type of the document in the given file from the root element
+    and its namespace found in the first few KB of the file.
+
+    :return: a tuple of a flag telling if the type could be determined and the
+             document type as reported by 'oscap info' (None if not an
+             interesting type or not a content file at all)
+    :rtype: (bool, str or None)
+
+    """
+
+    try:
+        with open(file_path, "rb") as fobj:
+            head = fobj.read(SNIFF_SIZE)
+    except IOError:
+        return (True, None)
+
+    if head.startswith("\xef\xbb\xbf"):
+        # UTF-8 BOM
+        head = head[3:]
+
+    head = head.lstrip()
+    if not head.startswith("<"):
+        # not an XML file, but may be a compressed one 'oscap' can handle
+        return (not head.startswith("BZh"), None)
+
+    # skip the XML declaration, processing instructions, comments and the
+    # document type declaration
+    while True:
+        for (start, end) in _PROLOG_ITEMS:
+            if head.startswith(start):
+                if start == "<!DOCTYPE" and "[" in head.partition(">")[0]:
+                    # internal DTD subset
+                    return (False, None)
+                end_idx = head.find(end)
+                if end_idx == -1:
+                    # the prolog doesn't fit into the head
+                    return (False, None)
+                head = head[end_idx + len(end):].lstrip()
+                break
+        else:
+            break
+
+    match = _ROOT_TAG_RE.match(head)
+    if not match:
+        # the root element's start tag doesn't fit into the head
+        return (False, None)
+
+    prefix, _sep, name = match.group(1).rpartition(":")
+    ns_attr = "xmlns:" + prefix if prefix else "xmlns"
+    namespace = ""
+    for (attr, value1, value2) in _ATTR_RE.findall(match.group(2)):
+        if attr == ns_attr:
+            namespace = value1 or value2
+            break
+
+    return (True, DOC_TYPES.get((namespace, name)))
+
+
+def _get_doc_type(file_path):
+    """
+    Get the type of the document in the given file as reported by 'oscap
+    info', running it only if the type cannot be determined by sniffing.
+
+    :rtype: str or None
+
+    """
+
+    determined, doc_type = _sniff_doc_type(file_path)
+    if determined:
+        return doc_type
+
+    try:
+        for line in execReadlines("oscap", ["info", file_path]):
+            if line.startswith("Document type:"):
+                _prefix, _sep, type_info = line.partition(":")
+                return type_info.strip()
+    except OSError:
+        # 'oscap info' exitted with a non-zero exit code -> unknown doc type
+        return None
+
+
+def summarize_results(results_file_path):
+    """
+    Count the rule results in the given XCCDF or ARF results file by their
+    types and collect the IDs of the rules that failed. The file is streamed,
+    not loaded as a whole.
+
+    :param results_file_path: path to the results file
+    :type results_file_path: str
+    :return: result type -> number of rules and the IDs of the failed rules
+    :rtype: (dict, list of strings)
+    :raise ContentHandlingError: if the file cannot be read or parsed
+
+    """
+
+    counts = dict()
+    failed_rules = []
+
+    # open elements, the parent of the processed one is the last one
+    parents = []
+    result = None
+    try:
+        for (event, elem) in ElementTree.iterparse(results_file_path,
+                                                   events=("start", "end")):
+            if event == "start":
+                parents.append(elem)
+                continue
+
+            parents.pop()
+            name = _split_tag(elem.tag)[1]
+            if name == "result" and parents and \
+               _split_tag(parents[-1].tag)[1] == "rule-result":
+                result = (elem.text or "").strip()
+            elif name == "rule-result":
+                if result:
+                    counts[result] = counts.get(result, 0) + 1
+                    if result == "fail":
+                        failed_rules.append(elem.get("idref"))
+                result = None
+
+            # free the memory taken by every processed element (ARF files
+            # contain much more than the rule results), only the counters are
+            # kept
+            elem.clear()
+            if parents:
+                parents[-1].remove(elem)
+    except (IOError, SyntaxError) as err:
+        msg = "Failed to read results from '%s': %s" % (results_file_path, err)
+        raise ContentHandlingError(msg)
+
+    return (counts, failed_rules)
+
+
 def explore_content_files(fpaths):
     """
     Function for finding content files in a list of file paths. SIMPLY PICKS
@@ -146,39 +998,41 @@ def explore_content_files(fpaths):
 
     """
 
-    def get_doc_type(file_path):
-        try:
-            for line in execReadlines("oscap", ["info", file_path]):
-                if line.startswith("Document type:"):
-                    _prefix, _sep, type_info = line.partition(":")
-                    return type_info.strip()
-        except OSError:
-            # 'oscap info' exitted with a non-zero exit code -> unknown doc type
-            return None
-
     xccdf_file = ""
     cpe_file = ""
     tailoring_file = ""
     found_ds = False
     content_class = None
 
-    for fpath in fpaths:
-        doc_type = get_doc_type(fpath)
-        if not doc_type:
-            continue
-
-        # prefer DS over standalone XCCDF
-        if doc_type == "Source Data Stream" and (not xccdf_file or not found_ds):
-            xccdf_file = fpath
-            content_class = DataStreamHandler
-            found_ds = True
-        elif doc_type == "XCCDF Checklist" and not xccdf_file:
-            xccdf_file = fpath
-            content_class = BenchmarkHandler
-        elif doc_type == "CPE Dictionary" and not cpe_file:
-            cpe_file = fpath
-        elif doc_type == "XCCDF Tailoring" and not tailoring_file:
-            tailoring_file = fpath
+    if not fpaths:
+        return (content_class, ContentFiles(xccdf_file, cpe_file, tailoring_file))
+
+    # the files are examined in parallel, but processed in the given order
+    pool = ThreadPool(min(SNIFF_WORKERS, len(fpaths)))
+    try:
+        for (fpath, doc_type) in izip(fpaths, pool.imap(_get_doc_type, fpaths)):
+            if not doc_type:
+                continue
+
+            # prefer DS over standalone XCCDF
+            if doc_type == "Source Data Stream" and (not xccdf_file or not found_ds):
+                xccdf_file = fpath
+                content_class = DataStreamHandler
+                found_ds = True
+            elif doc_type == "XCCDF Checklist" and not xccdf_file:
+                xccdf_file = fpath
+                content_class = BenchmarkHandler
+            elif doc_type == "CPE Dictionary" and not cpe_file:
+                cpe_file = fpath
+            elif doc_type == "XCCDF Tailoring" and not tailoring_file:
+                tailoring_file = fpath
+
+            if found_ds and cpe_file and tailoring_file:
+                # nothing more could change the result
+                break
+    finally:
+        # don't wait for the files that are not needed anymore
+        pool.terminate()
 
     # TODO: raise exception if no xccdf_file is found?
     files = ContentFiles(xccdf_file, cpe_file, tailoring_file)
@@ -193,7 +1047,8 @@ class DataStreamHandler(object):
 
     """
 
-    def __init__(self, dsc_file_path, tailoring_file_path=""):
+    def __init__(self, dsc_file_path, tailoring_file_path="",
+                 session_pool_size=SESSION_POOL_SIZE):
         """
         Constructor for the DataStreamHandler class.
 
@@ -201,19 +1056,35 @@ class DataStreamHandler(object):
         :type dsc_file_path: str
         :param tailoring_file_path: path to a tailoring file
         :type tailoring_file_path: str
+        :param session_pool_size: maximum number of sessions loaded for
+                                  different (data stream, checklist) pairs
+                                  kept at the same time
+        :type session_pool_size: int
 
         """
 
         # is used to speed up getting lists of profiles
         self._profiles_cache = dict()
 
+        # the sessions may be used from multiple threads
+        self._lock = threading.RLock()
+
+        # (data stream ID, checklist ID) -> loaded session, the least recently
+        # used first
+        self._sessions = OrderedDict()
+        self._session_pool_size = max(session_pool_size, 1)
+        self._session_hits = 0
+        self._session_misses = 0
+
         if not os.path.exists(dsc_file_path):
             msg = "Invalid file path: '%s'" % dsc_file_path
             raise DataStreamHandlingError(msg)
 
         self._dsc_file_path = dsc_file_path
+        self._tailoring_file_path = tailoring_file_path
 
-        # create an XCCDF session for the file
+        # create an XCCDF session for the file (only used to get the data
+        # streams and checklists)
         self._session = OSCAP.xccdf_session_new(dsc_file_path)
         if not self._session:
             msg = "'%s' is not a valid SCAP content file" % dsc_file_path
@@ -232,11 +1103,12 @@ class DataStreamHandler(object):
         # dictionary holding the items gathered from DSC processing
         self._items = OrderedDict()
 
-        # create an sds index for the content
-        self._sds_idx = OSCAP.xccdf_session_get_sds_idx(self._session)
+        # get the sds index of the content (owned by the session that is
+        # freed once the first checklist is loaded, so not kept)
+        sds_idx = OSCAP.xccdf_session_get_sds_idx(self._session)
 
         # iterate over streams and get checklists from each stream
-        streams_itr = OSCAP.ds_sds_index_get_streams(self._sds_idx)
+        streams_itr = OSCAP.ds_sds_index_get_streams(sds_idx)
         while OSCAP.ds_stream_index_iterator_has_more(streams_itr):
             stream_idx = OSCAP.ds_stream_index_iterator_next(streams_itr)
 
@@ -259,9 +1131,30 @@ class DataStreamHandler(object):
     def __del__(self):
         """Destructor for the DataStreamHandler class."""
 
-        if '_session' in locals():
-            # we should free the session
+        # we should free the sessions
+        if getattr(self, "_session", None):
             OSCAP.xccdf_session_free(self._session)
+        for session in getattr(self, "_sessions", dict()).values():
+            OSCAP.xccdf_session_free(session)
+
+    @property
+    def session_pool_stats(self):
+        """
+        Statistics of the pool of loaded sessions for diagnostics.
+
+        :return: a dictionary with the number of times a loaded session was
+                 reused ("hits"), the number of times a session had to be
+                 loaded ("misses") and the number of loaded sessions
+                 ("sessions")
+        :rtype: dict(str -> int)
+
+        """
+
+        with self._lock:
+            return {"hits": self._session_hits,
+                    "misses": self._session_misses,
+                    "sessions": len(self._sessions),
+                    }
 
     def get_data_streams(self):
         """
@@ -329,22 +1222,66 @@ class DataStreamHandler(object):
             return self._profiles_cache[cache_id]
 
         # not found in the cache, needs to be gathered
+        with self._lock:
+            return self._gather_profiles(data_stream_id, checklist_id)
 
-        # set the data stream and component (checklist) for the session
-        OSCAP.xccdf_session_free(self._session)
+    def _load_session(self, data_stream_id, checklist_id):
+        """
+        Get a session loaded for the given data stream and checklist from the
+        pool of sessions, loading it (and evicting the least recently used
+        one if the pool is full) if needed. Needs to be called with the lock
+        held.
 
-        self._session = OSCAP.xccdf_session_new(self._dsc_file_path)
-        if not self._session:
+        :return: policy model of the checklist
+        :rtype: xccdf_policy_model
+
+        """
+
+        key = (data_stream_id, checklist_id)
+        session = self._sessions.pop(key, None)
+        if session:
+            self._session_hits += 1
+            self._sessions[key] = session
+            return OSCAP.xccdf_session_get_policy_model(session)
+
+        self._session_misses += 1
+
+        # the session used for the data streams and checklists is not needed
+        # anymore
+        if self._session:
+            OSCAP.xccdf_session_free(self._session)
+            self._session = None
+
+        while len(self._sessions) >= self._session_pool_size:
+            _evicted_key, evicted = self._sessions.popitem(last=False)
+            OSCAP.xccdf_session_free(evicted)
+
+        # set the data stream and component (checklist) for the session
+        session = OSCAP.xccdf_session_new(self._dsc_file_path)
+        if not session:
             msg = "'%s' is not a valid SCAP content file" % self._dsc_file_path
             raise DataStreamHandlingError(msg)
 
-        OSCAP.xccdf_session_set_datastream_id(self._session, data_stream_id)
-        OSCAP.xccdf_session_set_component_id(self._session, checklist_id)
-        if OSCAP.xccdf_session_load(self._session) != 0:
+        OSCAP.xccdf_session_set_datastream_id(session, data_stream_id)
+        OSCAP.xccdf_session_set_component_id(session, checklist_id)
+        if self._tailoring_file_path:
+            OSCAP.xccdf_session_set_user_tailoring_file(session,
+                                                        self._tailoring_file_path)
+        if OSCAP.xccdf_session_load(session) != 0:
+            OSCAP.xccdf_session_free(session)
             raise DataStreamHandlingError(OSCAP.oscap_err_desc())
 
+        self._sessions[key] = session
+
+        return OSCAP.xccdf_session_get_policy_model(session)
+
+    def _gather_profiles(self, data_stream_id, checklist_id):
+        """Gather (and cache) profiles for the get_profiles method."""
+
+        cache_id = "%s;%s" % (data_stream_id, checklist_id)
+
         # get the benchmark (checklist)
-        policy_model = OSCAP.xccdf_session_get_policy_model(self._session)
+        policy_model = self._load_session(data_stream_id, checklist_id)
 
         default_policy = OSCAP.xccdf_policy_new(policy_model, None)
         default_rules_count = OSCAP.xccdf_policy_get_selected_rules_count(default_policy)
@@ -377,6 +1314,38 @@ class DataStreamHandler(object):
 
         return profiles
 
+    def get_fix_rules(self, profile_id, template, data_stream_id="",
+                      checklist_id=""):
+        """
+        Method to get the contents of the fix elements with the given 'system'
+        attribute for the given profile without running the oscap tool.
+
+        :param profile_id: ID of the profile
+        :type profile_id: str
+        :param template: the value of the 'system' attribute of the fix
+                         elements
+        :type template: str
+        :param data_stream_id: ID of the data stream (the first one if not
+                               given)
+        :type data_stream_id: str
+        :param checklist_id: ID of the checklist (the first one in the data
+                             stream if not given)
+        :type checklist_id: str
+        :return: fix rules
+        :rtype: str
+        :see: generate_fix_rules
+
+        """
+
+        if not data_stream_id:
+            data_stream_id = self.get_data_streams()[0]
+        if not checklist_id:
+            checklist_id = self.get_checklists(data_stream_id)[0]
+
+        with self._lock:
+            policy_model = self._load_session(data_stream_id, checklist_id)
+            return generate_fix_rules(policy_model, profile_id, template)
+
 
 class BenchmarkHandler(object):
     """
@@ -395,11 +1364,15 @@ class BenchmarkHandler(object):
         :type tailoring_file_path: str
         """
 
+        # the session may be used from multiple threads
+        self._lock = threading.RLock()
+
         if not os.path.exists(xccdf_file_path):
             msg = "Invalid file path: '%s'" % xccdf_file_path
             raise BenchmarkHandlingError(msg)
 
-        session = OSCAP.xccdf_session_new(xccdf_file_path)
+        # kept loaded for getting fix rules
+        self._session = session = OSCAP.xccdf_session_new(xccdf_file_path)
         if not session:
             msg = "'%s' is not a valid SCAP content file" % xccdf_file_path
             raise BenchmarkHandlingError(msg)
@@ -454,10 +1427,399 @@ class BenchmarkHandler(object):
                 self._profiles.append(info)
 
         OSCAP.xccdf_profile_iterator_free(profile_itr)
-        OSCAP.xccdf_session_free(session)
+
+    def __del__(self):
+        """Destructor for the BenchmarkHandler class."""
+
+        if getattr(self, "_session", None):
+            OSCAP.xccdf_session_free(self._session)
 
     @property
     def profiles(self):
         """Property for the list of profiles defined in the benchmark."""
 
         return self._profiles
+
+    def get_fix_rules(self, profile_id, template, data_stream_id="",
+                      checklist_id=""):
+        """
+        Method to get the contents of the fix elements with the given 'system'
+        attribute for the given profile without running the oscap tool.
+
+        :param profile_id: ID of the profile
+        :type profile_id: str
+        :param template: the value of the 'system' attribute of the fix
+                         elements
+        :type template: str
+        :param data_stream_id: ignored, for compatibility with the
+                               DataStreamHandler class
+        :param checklist_id: ignored, for compatibility with the
+                             DataStreamHandler class
+        :return: fix rules
+        :rtype: str
+        :see: generate_fix_rules
+
+        """
+
+        with self._lock:
+            policy_model = OSCAP.xccdf_session_get_policy_model(self._session)
+            return generate_fix_rules(policy_model, profile_id, template)
+
+
+class _IndexHandler(object):
+    """
+    Base class for the content handlers getting data from the content by
+    streaming it instead of loading it into an OSCAP session.
+
+    """
+
+    def __init__(self, content_file_path, tailoring_file_path=""):
+        self._content_file_path = content_file_path
+        self._tailoring_file_path = tailoring_file_path
+
+        # template -> FixesIndex
+        self._fixes_indices = dict()
+        self._lock = threading.Lock()
+
+    def get_fix_rules(self, profile_id, template, data_stream_id="",
+                      checklist_id=""):
+        """
+        Method to get the contents of the fix elements with the given 'system'
+        attribute for the given profile without running the oscap tool.
+
+        :see: FixesIndex.get_fix_rules
+
+        """
+
+        with self._lock:
+            if template not in self._fixes_indices:
+                self._fixes_indices[template] = FixesIndex(self._content_file_path,
+                                                           template,
+                                                           self._tailoring_file_path)
+            fixes_index = self._fixes_indices[template]
+
+        return fixes_index.get_fix_rules(profile_id, template, data_stream_id,
+                                         checklist_id)
+
+
+class DataStreamIndexHandler(_IndexHandler):
+    """
+    Lightweight alternative to the DataStreamHandler class. Gets the data
+    streams, checklists and profiles by streaming the file once, recording
+    only the relevant elements, instead of loading the whole content (OVAL
+    definitions included) into an OSCAP session.
+
+    :see: DataStreamHandler
+
+    """
+
+    def __init__(self, dsc_file_path, tailoring_file_path=""):
+        """
+        Constructor for the DataStreamIndexHandler class.
+
+        :param dsc_file_path: path to a file with a data stream collection
+        :type dsc_file_path: str
+        :param tailoring_file_path: path to a tailoring file
+        :type tailoring_file_path: str
+
+        """
+
+        _IndexHandler.__init__(self, dsc_file_path, tailoring_file_path)
+
+        if not os.path.exists(dsc_file_path):
+            msg = "Invalid file path: '%s'" % dsc_file_path
+            raise DataStreamHandlingError(msg)
+
+        try:
+            self._index = _ProfilesIndex(dsc_file_path)
+        except ContentHandlingError as err:
+            raise DataStreamHandlingError(str(err))
+
+        # dictionary holding the items gathered from DSC processing
+        self._items = self._index.data_streams
+        if not self._items:
+            msg = "'%s' is not a data stream collection" % dsc_file_path
+            raise DataStreamHandlingError(msg)
+
+    def get_data_streams(self):
+        """:see: DataStreamHandler.get_data_streams"""
+
+        return list(self._items.keys())
+
+    def get_data_streams_checklists(self):
+        """:see: DataStreamHandler.get_data_streams_checklists"""
+
+        return dict(self._items)
+
+    def get_checklists(self, data_stream_id):
+        """:see: DataStreamHandler.get_checklists"""
+
+        if data_stream_id not in self._items:
+            msg = "Invalid data stream id given: '%s'" % data_stream_id
+            raise DataStreamHandlingError(msg)
+
+        return self._items[data_stream_id]
+
+    def get_profiles(self, data_stream_id, checklist_id):
+        """:see: DataStreamHandler.get_profiles"""
+
+        return self._index.get_profiles(data_stream_id, checklist_id)
+
+
+class BenchmarkIndexHandler(_IndexHandler):
+    """
+    Lightweight alternative to the BenchmarkHandler class. Gets the list of
+    profiles by streaming the file instead of loading the whole content into
+    an OSCAP session.
+
+    :see: BenchmarkHandler
+
+    """
+
+    def __init__(self, xccdf_file_path, tailoring_file_path=""):
+        """
+        Constructor for the BenchmarkIndexHandler class.
+
+        :param xccdf_file_path: path to a file with an XCCDF benchmark
+        :type xccdf_file_path: str
+        :param tailoring_file_path: path to a tailoring file
+        :type tailoring_file_path: str
+
+        """
+
+        _IndexHandler.__init__(self, xccdf_file_path, tailoring_file_path)
+
+        if not os.path.exists(xccdf_file_path):
+            msg = "Invalid file path: '%s'" % xccdf_file_path
+            raise BenchmarkHandlingError(msg)
+
+        try:
+            # the first benchmark is used for data stream collections
+            self._profiles = _ProfilesIndex(xccdf_file_path).get_profiles()
+        except ContentHandlingError:
+            msg = "Not a valid benchmark file: '%s'" % xccdf_file_path
+            raise BenchmarkHandlingError(msg)
+
+        if tailoring_file_path:
+            try:
+                root = ElementTree.parse(tailoring_file_path).getroot()
+            except (IOError, SyntaxError) as err:
+                msg = "Failed to load the tailoring file: %s" % err
+                raise BenchmarkHandlingError(msg)
+
+            for elem in root:
+                if _split_tag(elem.tag)[1] == "Profile":
+                    self._profiles.append(_get_profile_info(elem))
+
+    @property
+    def profiles(self):
+        """Property for the list of profiles defined in the benchmark."""
+
+        return self._profiles
+
+
+class CachedContentHandler(object):
+    """
+    Content handler serving the data streams, checklists and profiles from an
+    index file stored in a cache directory. The index file is keyed by the
+    digests of the content and tailoring files and if there is no such file
+    yet, it is created from the data provided by the wrapped content handler.
+    That way a content loaded once doesn't need to be processed again just to
+    list its profiles. Fix rules are generated by the wrapped content handler
+    (loaded on demand).
+
+    Provides the API of both the DataStreamHandler and BenchmarkHandler
+    classes, but only the one of the handler_cls is meaningful.
+
+    """
+
+    def __init__(self, handler_cls, content_file_path, tailoring_file_path="",
+                 cache_dir="", create_handler=None):
+        """
+        Constructor for the CachedContentHandler class.
+
+        :param handler_cls: class of the content handler the index is created
+                            with (DataStreamHandler or BenchmarkHandler)
+        :type handler_cls: type
+        :param content_file_path: path to a file with the content
+        :type content_file_path: str
+        :param tailoring_file_path: path to a tailoring file
+        :type tailoring_file_path: str
+        :param cache_dir: directory to store the index files in, no index
+                          files are stored if empty
+        :type cache_dir: str
+        :param create_handler: function creating the content handler for the
+                               content if there is no index file yet
+                               (handler_cls(content_file_path,
+                               tailoring_file_path) by default)
+        :type create_handler: () -> content handler
+        :raise ContentHandlingError: if the content handler fails to process
+                                     the content
+
+        """
+
+        self._content_file_path = content_file_path
+        self._tailoring_file_path = tailoring_file_path
+
+        if create_handler is None:
+            create_handler = lambda: handler_cls(content_file_path,
+                                                 tailoring_file_path)
+        self._create_handler = create_handler
+        self._handler = None
+        self._lock = threading.Lock()
+
+        # data stream ID -> [checklist IDs] (empty for benchmarks)
+        self._items = OrderedDict()
+        # (data stream ID, checklist ID) -> [ProfileInfo]
+        self._profiles = dict()
+
+        index_path = None
+        if cache_dir:
+            index_path = self._get_index_path(handler_cls, cache_dir)
+
+        if index_path and self._load_index(index_path):
+            log.debug("OSCAP addon: profiles loaded from the index file %s",
+                      index_path)
+            return
+
+        self._build_index(handler_cls)
+        if index_path:
+            self._store_index(index_path)
+
+    def _get_index_path(self, handler_cls, cache_dir):
+        try:
+            digests = [utils.get_file_digest(self._content_file_path)]
+            if self._tailoring_file_path:
+                digests.append(utils.get_file_digest(self._tailoring_file_path))
+        except OSError:
+            # the content handler will report the problem
+            return None
+
+        key = hashlib.sha256("\0".join(digests)).hexdigest()
+        fname = "%s-%s.json" % (handler_cls.__name__, key)
+
+        return utils.join_paths(cache_dir, fname)
+
+    def _load_index(self, index_path):
+        try:
+            with open(index_path, "r") as fobj:
+                data = json.load(fobj)
+
+            if data["version"] != PROFILES_INDEX_VERSION:
+                return False
+
+            items = OrderedDict((ds_id, checklists)
+                                for (ds_id, checklists) in data["data_streams"])
+            profiles = dict(((ds_id, chk_id),
+                             [ProfileInfo(*info) for info in infos])
+                            for (ds_id, chk_id, infos) in data["profiles"])
+        except (IOError, ValueError, KeyError, TypeError) as err:
+            if not isinstance(err, IOError):
+                log.debug("OSCAP addon: ignoring invalid index file %s: %s",
+                          index_path, err)
+            return False
+
+        self._items = items
+        self._profiles = profiles
+
+        return True
+
+    def _get_handler(self):
+        """
+        Get the wrapped content handler, loading it if needed.
+
+        :raise ContentHandlingError: if the content handler fails to process
+                                     the content
+
+        """
+
+        with self._lock:
+            if self._handler is None:
+                self._handler = self._create_handler()
+
+            return self._handler
+
+    def _build_index(self, handler_cls):
+        self._handler = self._create_handler()
+
+        if issubclass(handler_cls, DataStreamHandler):
+            for ds_id in self._handler.get_data_streams():
+                self._items[ds_id] = list(self._handler.get_checklists(ds_id))
+                for chk_id in self._items[ds_id]:
+                    try:
+                        profiles = self._handler.get_profiles(ds_id, chk_id)
+                    except ContentHandlingError:
+                        # left for the handler to report when asked for
+                        continue
+                    self._profiles[(ds_id, chk_id)] = list(profiles)
+        else:
+            self._profiles[("", "")] = list(self._handler.profiles)
+
+    def _store_index(self, index_path):
+        data = {"version": PROFILES_INDEX_VERSION,
+                "data_streams": list(self._items.items()),
+                "profiles": [[ds_id, chk_id, [list(info) for info in infos]]
+                             for ((ds_id, chk_id), infos)
+                             in self._profiles.items()],
+                }
+
+        # write to a temporary file and rename it so that nobody can see
+        # a partially written index
+        cache_dir = os.path.dirname(index_path)
+        try:
+            utils.ensure_dir_exists(cache_dir)
+            temp_fd, temp_path = tempfile.mkstemp(dir=cache_dir)
+            with os.fdopen(temp_fd, "w") as fobj:
+                json.dump(data, fobj)
+            os.rename(temp_path, index_path)
+        except (IOError, OSError) as err:
+            log.debug("OSCAP addon: failed to store the profiles index: %s",
+                      err)
+
+    def get_data_streams(self):
+        """:see: DataStreamHandler.get_data_streams"""
+
+        return list(self._items.keys())
+
+    def get_data_streams_checklists(self):
+        """:see: DataStreamHandler.get_data_streams_checklists"""
+
+        return dict(self._items)
+
+    def get_checklists(self, data_stream_id):
+        """:see: DataStreamHandler.get_checklists"""
+
+        if data_stream_id not in self._items:
+            msg = "Invalid data stream id given: '%s'" % data_stream_id
+            raise DataStreamHandlingError(msg)
+
+        return self._items[data_stream_id]
+
+    def get_profiles(self, data_stream_id, checklist_id):
+        """:see: DataStreamHandler.get_profiles"""
+
+        key = (data_stream_id, checklist_id)
+        if key in self._profiles:
+            return self._profiles[key]
+
+        # not in the index, ask the content handler
+        return self._get_handler().get_profiles(data_stream_id, checklist_id)
+
+    @property
+    def profiles(self):
+        """:see: BenchmarkHandler.profiles"""
+
+        return self._profiles.get(("", ""), [])
+
+    def get_fix_rules(self, profile_id, template, data_stream_id="",
+                      checklist_id=""):
+        """:see: DataStreamHandler.get_fix_rules"""
+
+        return self._get_handler().get_fix_rules(profile_id, template,
+                                                 data_stream_id, checklist_id)
+
+
+# lightweight alternatives to the OSCAP session based content handlers
+INDEX_HANDLERS = {DataStreamHandler: DataStreamIndexHandler,
+                  BenchmarkHandler: BenchmarkIndexHandler,
+                  }
@@ -7,6 +7,9 @@ server certificate validation.
 import re
 import os
 import os.path
+import time
+import random
+import hashlib
 import pycurl
 
 from pyanaconda.flags import flags as ana_flags
@@ -36,6 +39,33 @@ FTP_URL_RE = re.compile(FTP_URL_RE_STR)
 FILE_URL_RE_STR = r"(file)://(.*)"
 FILE_URL_RE = re.compile(FILE_URL_RE_STR)
 
+# protocols transfers of which can be resumed (using HTTP Range or FTP REST)
+RESUMABLE_PROTOCOLS = ("http", "https", "ftp")
+
+# how many times a failed transfer is retried and the limits of the
+# (exponentially growing) delays between the attempts in seconds
+FETCH_RETRIES = 5
+RETRY_BASE_DELAY = 1
+RETRY_MAX_DELAY = 30
+
+# seconds to wait for the connection to be established
+CONNECT_TIMEOUT = 30
+
+# transfers slower than LOW_SPEED_LIMIT bytes per second for LOW_SPEED_TIME
+# seconds are aborted (and retried)
+LOW_SPEED_LIMIT = 1024
+LOW_SPEED_TIME = 60
+
+# errors worth retrying the transfer for
+RETRY_ERRORS = (pycurl.E_COULDNT_RESOLVE_HOST, pycurl.E_COULDNT_CONNECT,
+                pycurl.E_PARTIAL_FILE, pycurl.E_OPERATION_TIMEDOUT,
+                pycurl.E_GOT_NOTHING, pycurl.E_SEND_ERROR,
+                pycurl.E_RECV_ERROR,
+                )
+
+# errors caused by the server not supporting resumed transfers
+RESUME_ERRORS = (pycurl.E_RANGE_ERROR, pycurl.E_FTP_COULDNT_USE_REST)
+
 
 class DataFetchError(Exception):
     """Parent class for the exception classes defined in this module."""
@@ -70,6 +100,12 @@ class FetchError(DataFetchError):
     pass
 
 
+class IntegrityCheckError(DataFetchError):
+    """Class for the fetched data not matching the expected fingerprint."""
+
+    pass
+
+
 def can_fetch_from(url):
     """
     Function telling whether the fetch_data function understands the type of
@@ -85,11 +121,16 @@ def can_fetch_from(url):
     return any(url.startswith(prefix) for prefix in resources)
 
 
-def fetch_data(url, out_file, ca_certs=None):
+def fetch_data(url, out_file, ca_certs=None, fingerprint="",
+               connect_timeout=None, low_speed_limit=None,
+               low_speed_time=None):
     """
     Fetch data from a given URL. If the URL starts with https://, ca_certs can
     be a path to PEM file with CA certificate chain to validate server
-    certificate.
+    certificate. If a fingerprint is given, the data is hashed as it arrives
+    and checked against the fingerprint once the transfer ends. The digest is
+    recorded so that utils.get_file_digest doesn't need to read the file
+    again.
 
     :param url: URL of the data
     :type url: str
@@ -97,11 +138,23 @@ def fetch_data(url, out_file, ca_certs=None):
     :type out_file: str
     :param ca_certs: path to a PEM file with CA certificate chain
     :type ca_certs: str
+    :param fingerprint: expected fingerprint of the data
+    :type fingerprint: hexadecimal str
+    :param connect_timeout: seconds to wait for the connection to be
+                            established (CONNECT_TIMEOUT by default)
+    :type connect_timeout: int
+    :param low_speed_limit: bytes per second a transfer slower than for
+                            low_speed_time seconds is aborted and retried
+                            (LOW_SPEED_LIMIT by default)
+    :type low_speed_limit: int
+    :param low_speed_time: see low_speed_limit (LOW_SPEED_TIME by default)
+    :type low_speed_time: int
     :raise WrongRequestError: if a wrong combination of arguments is passed
                               (ca_certs file path given and url starting with
                               http://) or arguments don't have required format
     :raise CertificateValidationError: if server certificate validation fails
     :raise FetchError: if data fetching fails (usually due to I/O errors)
+    :raise IntegrityCheckError: if the data doesn't match the fingerprint
 
     """
 
@@ -110,17 +163,21 @@ def fetch_data(url, out_file, ca_certs=None):
     utils.ensure_dir_exists(out_dir)
 
     if can_fetch_from(url):
-        _curl_fetch(url, out_file, ca_certs)
+        _curl_fetch(url, out_file, ca_certs, fingerprint, connect_timeout,
+                    low_speed_limit, low_speed_time)
     else:
         msg = "Cannot fetch data from '%s': unknown URL format" % url
         raise UnknownURLformatError(msg)
 
 
-def _curl_fetch(url, out_file, ca_certs=None):
+def _curl_fetch(url, out_file, ca_certs=None, fingerprint="",
+                connect_timeout=None, low_speed_limit=None,
+                low_speed_time=None):
     """
     Function that fetches data and writes it out to the given file path. If a
     path to the file with CA certificates is given and the url starts with
-    'https', the server certificate is validated.
+    'https', the server certificate is validated. If a fingerprint is given,
+    the data is hashed while being written out and checked against it.
 
     :param url: url of the data that has to start with 'http://' or "https://"
     :type url: str
@@ -129,14 +186,30 @@ def _curl_fetch(url, out_file, ca_certs=None):
     :param ca_certs: path to the file with CA certificates for server
                      certificate validation
     :type ca_certs: str
+    :param fingerprint: expected fingerprint of the data
+    :type fingerprint: hexadecimal str
+    :param connect_timeout: see fetch_data
+    :type connect_timeout: int
+    :param low_speed_limit: see fetch_data
+    :type low_speed_limit: int
+    :param low_speed_time: see fetch_data
+    :type low_speed_time: int
     :raise WrongRequestError: if a wrong combination of arguments is passed
                               (ca_certs file path given and url starting with
                               http://) or arguments don't have required format
     :raise CertificateValidationError: if server certificate validation fails
     :raise FetchError: if data fetching fails (usually due to I/O errors)
+    :raise IntegrityCheckError: if the data doesn't match the fingerprint
 
     """
 
+    if connect_timeout is None:
+        connect_timeout = CONNECT_TIMEOUT
+    if low_speed_limit is None:
+        low_speed_limit = LOW_SPEED_LIMIT
+    if low_speed_time is None:
+        low_speed_time = LOW_SPEED_TIME
+
     if url.startswith("ftp"):
         match = FTP_URL_RE.match(url)
         if not match:
@@ -168,6 +241,12 @@ def _curl_fetch(url, out_file, ca_certs=None):
         msg = "Cannot verify server certificate when using plain HTTP"
         raise WrongRequestError(msg)
 
+    hash_obj = None
+    if fingerprint:
+        hash_obj = utils.get_hashing_algorithm(fingerprint)
+        if hash_obj is None:
+            raise WrongRequestError("Unsupported fingerprint: '%s'" % fingerprint)
+
     curl = pycurl.Curl()
     curl.setopt(pycurl.URL, url)
 
@@ -183,16 +262,148 @@ def _curl_fetch(url, out_file, ca_certs=None):
         curl.setopt(pycurl.SSL_VERIFYHOST, 0)
         curl.setopt(pycurl.SSL_VERIFYPEER, 0)
 
+    curl.setopt(pycurl.CONNECTTIMEOUT, connect_timeout)
+    curl.setopt(pycurl.LOW_SPEED_LIMIT, low_speed_limit)
+    curl.setopt(pycurl.LOW_SPEED_TIME, low_speed_time)
+
+    hash_name = hash_obj.name if hash_obj else None
+
+    # the data is fetched to a (hidden) partial file so that a failed transfer
+    # can be resumed by the next attempt, a partial file left behind by a
+    # previous call is removed because the data may have changed since then
+    part_file = os.path.join(os.path.dirname(out_file),
+                             ".%s.part" % os.path.basename(out_file))
     try:
-        with open(out_file, "w") as fobj:
-            curl.setopt(pycurl.WRITEDATA, fobj)
-            curl.perform()
-    except pycurl.error as err:
-        # first arg is the error code
-        if err.args[0] == pycurl.E_SSL_CACERT:
-            msg = "Failed to connect to server and validate its "\
-                  "certificate: %s" % err
-            raise CertificateValidationError(msg)
-        else:
+        if os.path.exists(part_file):
+            os.remove(part_file)
+    except OSError as err:
+        msg = "Failed to remove stale partial data: %s" % err
+        raise FetchError(msg)
+    resumable = protocol in RESUMABLE_PROTOCOLS
+
+    delays = _get_retry_delays()
+    while True:
+        try:
+            digest = _curl_transfer(curl, protocol, part_file, resumable,
+                                    hash_name)
+            break
+        except pycurl.error as err:
+            # first arg is the error code
+            if err.args[0] == pycurl.E_SSL_CACERT:
+                msg = "Failed to connect to server and validate its "\
+                      "certificate: %s" % err
+                raise CertificateValidationError(msg)
+
+            if resumable and err.args[0] in RESUME_ERRORS:
+                log.info("Cannot resume the transfer, starting over")
+                resumable = False
+                continue
+
+            delay = next(delays, None)
+            if err.args[0] not in RETRY_ERRORS or delay is None:
+                msg = "Failed to fetch data: %s" % err
+                raise FetchError(msg)
+
+            log.warning("Failed to fetch data from '%s' (%s), retrying in "
+                        "%.1f seconds", url, err, delay)
+            time.sleep(delay)
+        except (IOError, OSError) as err:
             msg = "Failed to fetch data: %s" % err
             raise FetchError(msg)
+
+    os.rename(part_file, out_file)
+
+    if hash_obj:
+        utils.record_file_digest(out_file, hash_name, digest)
+        if digest != fingerprint:
+            msg = "Integrity check of the data fetched from '%s' failed: " \
+                  "expected fingerprint '%s', got '%s'" % (url, fingerprint,
+                                                          digest)
+            raise IntegrityCheckError(msg)
+
+
+def _get_retry_delays(retries=None, base_delay=None, max_delay=None):
+    """
+    Generator of the delays between the attempts to fetch data. The delays
+    grow exponentially and are randomized (jittered) so that many machines
+    failing at the same time don't retry at the same time.
+
+    :param retries: number of delays to generate (FETCH_RETRIES by default)
+    :type retries: int
+    :param base_delay: the first (maximum) delay (RETRY_BASE_DELAY by default)
+    :type base_delay: float
+    :param max_delay: maximum delay (RETRY_MAX_DELAY by default)
+    :type max_delay: float
+    :return: generator of delays in seconds
+    :rtype: generator of floats
+
+    """
+
+    if retries is None:
+        retries = FETCH_RETRIES
+    if base_delay is None:
+        base_delay = RETRY_BASE_DELAY
+    if max_delay is None:
+        max_delay = RETRY_MAX_DELAY
+
+    for attempt in range(retries):
+        delay = min(max_delay, base_delay * 2 ** attempt)
+        yield random.uniform(delay / 2.0, delay)
+
+
+def _curl_transfer(curl, protocol, part_file, resume, hash_name=None):
+    """
+    Run the transfer set up in the given curl object, writing the data to the
+    given partial file (resuming the transfer if the file exists and resume is
+    True).
+
+    :param curl: curl object with the transfer set up
+    :type curl: pycurl.Curl
+    :param protocol: protocol of the transfer
+    :type protocol: str
+    :param part_file: path to the partial file to write the data to
+    :type part_file: str
+    :param resume: whether to resume the transfer if possible
+    :type resume: bool
+    :param hash_name: name of the hashing algorithm to compute the digest of
+                      the whole data with (None to compute no digest)
+    :type hash_name: str or None
+    :return: digest of the whole data (or None if hash_name not given)
+    :rtype: hexadecimal str or None
+    :raise pycurl.error: if the transfer fails
+
+    """
+
+    offset = 0
+    if resume and os.path.exists(part_file):
+        offset = os.path.getsize(part_file)
+
+    hash_obj = hashlib.new(hash_name) if hash_name else None
+    if hash_obj and offset:
+        # the beginning of the data is not going to be fetched again
+        utils.get_file_fingerprint(part_file, hash_obj)
+
+    # a server not supporting ranges makes libcurl fail with
+    # E_RANGE_ERROR (see RESUME_ERRORS) before any data is written
+    with open(part_file, "ab" if offset else "wb") as fobj:
+        def write_data(data):
+            fobj.write(data)
+            if hash_obj:
+                hash_obj.update(data)
+
+        curl.setopt(pycurl.RESUME_FROM_LARGE, offset)
+        curl.setopt(pycurl.WRITEFUNCTION, write_data)
+        curl.perform()
+
+    http = protocol.startswith("http")
+    if http and offset and curl.getinfo(pycurl.RESPONSE_CODE) == 416:
+        # the requested range is not satisfiable, the partial file doesn't
+        # belong to the data (anymore), start over
+        log.info("Cannot resume the transfer, starting over")
+        os.remove(part_file)
+        return _curl_transfer(curl, protocol, part_file, False, hash_name)
+
+    if hash_obj:
+        return hash_obj.hexdigest()
+    else:
+        return None
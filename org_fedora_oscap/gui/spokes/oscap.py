@@ -212,6 +212,9 @@ class OSCAPSpoke(NormalSpoke):
         # used to check if the profile was changed or not
         self._active_profile = None
 
+        # IDs of the profiles currently listed in the profiles store
+        self._listed_profiles = []
+
         # prevent multiple simultaneous data fetches
         self._fetching = False
         self._fetch_flag_lock = threading.Lock()
@@ -328,7 +331,8 @@ class OSCAPSpoke(NormalSpoke):
                 thread_name = common.wait_and_fetch_net_data(
                                      self._addon_data.content_url,
                                      self._addon_data.raw_preinst_content_path,
-                                     self._addon_data.certificates)
+                                     self._addon_data.certificates,
+                                     self._addon_data.fingerprint)
             except common.OSCAPaddonNetworkError:
                 self._network_problem()
                 with self._fetch_flag_lock:
@@ -363,6 +367,11 @@ class OSCAPSpoke(NormalSpoke):
 
         try:
             threadMgr.wait(wait_for)
+        except data_fetch.IntegrityCheckError:
+            self._integrity_check_failed()
+            with self._fetch_flag_lock:
+                self._fetching = False
+            return
         except data_fetch.DataFetchError:
             self._data_fetch_failed()
             with self._fetch_flag_lock:
@@ -373,9 +382,10 @@ class OSCAPSpoke(NormalSpoke):
             fire_gtk_action(self._progress_spinner.stop)
 
         if self._addon_data.fingerprint:
+            # no extra reading if the digest was computed when fetching
             hash_obj = utils.get_hashing_algorithm(self._addon_data.fingerprint)
-            digest = utils.get_file_fingerprint(self._addon_data.raw_preinst_content_path,
-                                                hash_obj)
+            digest = utils.get_file_digest(self._addon_data.raw_preinst_content_path,
+                                           hash_obj.name)
             if digest != self._addon_data.fingerprint:
                 self._integrity_check_failed()
                 # fetching done
@@ -389,7 +399,8 @@ class OSCAPSpoke(NormalSpoke):
             try:
                 fpaths = common.extract_data(self._addon_data.raw_preinst_content_path,
                                              common.INSTALLATION_CONTENT_DIR,
-                                             [self._addon_data.content_path])
+                                             [self._addon_data.content_path],
+                                             content_only=True)
             except common.ExtractionError as err:
                 self._extraction_failed(err.message)
                 # fetching done
@@ -414,8 +425,7 @@ class OSCAPSpoke(NormalSpoke):
             raise common.OSCAPaddonError("Unsupported content type")
 
         try:
-            self._content_handler = self._content_handling_cls(self._addon_data.preinst_content_path,
-                                                               self._addon_data.preinst_tailoring_path)
+            self._content_handler = self._create_content_handler()
         except content_handling.ContentHandlingError:
             self._invalid_content()
             # fetching done
@@ -424,6 +434,11 @@ class OSCAPSpoke(NormalSpoke):
 
             return
 
+        # fix rules are generated by a worker process keeping the content
+        # loaded, so that it's loaded only once and the UI doesn't freeze
+        common.start_oscap_worker(self._addon_data.preinst_content_path,
+                                  self._addon_data.preinst_tailoring_path)
+
         if self._using_ds:
             # populate the stores from items from the content
             self._ds_checklists = self._content_handler.get_data_streams_checklists()
@@ -474,6 +489,45 @@ class OSCAPSpoke(NormalSpoke):
         # no error
         self._set_error(None)
 
+    def _create_content_handler(self):
+        """
+        Create a content handler for the content, serving the profiles from
+        the index file created for the same content before (if any).
+
+        :raise content_handling.ContentHandlingError: if the content is invalid
+
+        """
+
+        content_path = self._addon_data.preinst_content_path
+        tailoring_path = self._addon_data.preinst_tailoring_path
+
+        create_handler = lambda: self._load_content_handler(content_path,
+                                                            tailoring_path)
+        return content_handling.CachedContentHandler(self._content_handling_cls,
+                                                     content_path,
+                                                     tailoring_path,
+                                                     common.PROFILES_CACHE_DIR,
+                                                     create_handler)
+
+    def _load_content_handler(self, content_path, tailoring_path):
+        """
+        Load a content handler for the content, preferably the lightweight
+        one that doesn't load the whole content into an OSCAP session.
+
+        :raise content_handling.ContentHandlingError: if the content is invalid
+
+        """
+
+        index_cls = content_handling.INDEX_HANDLERS.get(self._content_handling_cls)
+        if index_cls:
+            try:
+                return index_cls(content_path, tailoring_path)
+            except content_handling.ContentHandlingError as err:
+                log.info("OSCAP addon: failed to index the content, loading "
+                         "it instead: %s", err)
+
+        return self._content_handling_cls(content_path, tailoring_path)
+
     @property
     def _using_ds(self):
         return self._content_handling_cls == content_handling.DataStreamHandler
@@ -572,6 +626,38 @@ class OSCAPSpoke(NormalSpoke):
                                          profile_markup,
                                          profile.id == self._active_profile])
 
+        # get the fix rules ready for the listed profiles
+        self._listed_profiles = [profile.id for profile in profiles]
+        self._precompute_fix_rules(self._active_profile or
+                                   self._addon_data.profile_id)
+
+    def _precompute_fix_rules(self, first=None):
+        """
+        Start generating fix rules for the listed profiles in the background
+        so that choosing a profile doesn't need to wait for the oscap tool.
+
+        :param first: ID of the profile whose fix rules should be generated
+                      first (followed by its neighbours)
+        :type first: str or None
+
+        """
+
+        if not self._listed_profiles:
+            return
+
+        if self._using_ds:
+            ds = self._current_ds_id
+            xccdf = self._current_xccdf_id
+        else:
+            ds = None
+            xccdf = None
+
+        common.precompute_fix_rules_pre(self._listed_profiles,
+                                        self._addon_data.preinst_content_path,
+                                        ds, xccdf,
+                                        self._addon_data.preinst_tailoring_path,
+                                        first, self._content_handler)
+
     def _add_message(self, message):
         """
         Add message to the store.
@@ -694,7 +780,8 @@ class OSCAPSpoke(NormalSpoke):
             rules = common.get_fix_rules_pre(profile_id,
                                              self._addon_data.preinst_content_path,
                                              ds, xccdf,
-                                             self._addon_data.preinst_tailoring_path)
+                                             self._addon_data.preinst_tailoring_path,
+                                             self._content_handler)
         except common.OSCAPaddonError:
             self._set_error("Failed to get rules for the profile '%s'" % profile_id)
             return False
@@ -800,6 +887,9 @@ class OSCAPSpoke(NormalSpoke):
 
     @gtk_action_wait
     def _wrong_content(self, msg):
+        common.cancel_fix_rules_precomputation()
+        common.stop_oscap_worker()
+        self._listed_profiles = []
         self._addon_data.clear_all()
         really_hide(self._progress_spinner)
         self._fetch_button.set_sensitive(True)
@@ -1052,6 +1142,9 @@ class OSCAPSpoke(NormalSpoke):
 
         cur_profile = self._current_profile_id
         if cur_profile:
+            # the highlighted profile is likely to be chosen, prefer it
+            self._precompute_fix_rules(cur_profile)
+
             if cur_profile != self._active_profile:
                 # new profile selected, make the selection button sensitive
                 self._choose_button.set_sensitive(True)
@@ -1126,11 +1219,17 @@ class OSCAPSpoke(NormalSpoke):
         self._switch_dry_run(dry_run)
 
     def on_change_content_clicked(self, *args):
+        common.cancel_fix_rules_precomputation()
+        common.stop_oscap_worker()
+        self._listed_profiles = []
         self._unselect_profile(self._active_profile)
         self._addon_data.clear_all()
         self.refresh()
 
     def on_use_ssg_clicked(self, *args):
+        common.cancel_fix_rules_precomputation()
+        common.stop_oscap_worker()
+        self._listed_profiles = []
         self._addon_data.clear_all()
         self._addon_data.content_type = "scap-security-guide"
         self._addon_data.content_path = common.SSG_DIR + common.SSG_CONTENT
@@ -36,7 +36,7 @@ from pyanaconda import flags
 from pykickstart.errors import KickstartParseError, KickstartValueError
 from org_fedora_oscap import utils, common, rule_handling, data_fetch
 from org_fedora_oscap.common import SUPPORTED_ARCHIVES
-from org_fedora_oscap.content_handling import ContentCheckError
+from org_fedora_oscap.content_handling import ContentCheckError, FixesIndex
 
 log = logging.getLogger("anaconda")
 
@@ -57,8 +57,21 @@ SUPPORTED_URL_PREFIXES = ("http://", "https://", "ftp://"
 
 REQUIRED_PACKAGES = ("openscap", "openscap-scanner", )
 
+# full -- evaluate, remediate and evaluate again with the oscap tool
+# fix-only -- only run the remediation script, evaluate on the first boot
+# script -- only generate the remediation script for the target system
+# none -- no remediation, no evaluation
+REMEDIATION_MODES = ("full", "fix-only", "script", "none")
+
+RESULTS_FORMATS = ("xccdf", "arf")
+RESULTS_COMPRESSIONS = ("none", "gzip", "zstd")
+
 FINGERPRINT_REGEX = re.compile(r'^[a-z0-9]+$')
 
+BOOLEAN_VALUES = {"1": True, "yes": True, "true": True, "on": True,
+                  "0": False, "no": False, "false": False, "off": False,
+                  }
+
 
 class MisconfigurationError(common.OSCAPaddonError):
     """Exception for reporting misconfiguration."""
@@ -101,9 +114,26 @@ class OSCAPdata(AddonData):
         # certificate to verify HTTPS connection or signed data
         self.certificates = ""
 
+        # whether to remove the raw archive once it is extracted
+        self.drop_archive = False
+
+        # how to remediate the installed system, see REMEDIATION_MODES
+        self.remediate = "full"
+
+        # whether to generate the HTML report on the first boot instead of
+        # during the installation
+        self.deferred_report = False
+
+        # format and compression of the results written during the
+        # installation
+        self.results_format = "xccdf"
+        self.results_compression = "none"
+
         # internal values
         self.rule_data = rule_handling.RuleData()
         self.dry_run = False
+        # digest of the raw content file recorded before it was removed
+        self.raw_content_digest = ""
 
     def __str__(self):
         """
@@ -144,6 +174,23 @@ class OSCAPdata(AddonData):
         if self.certificates:
             ret += "\n%s" % key_value_pair("certificates", self.certificates)
 
+        if self.drop_archive:
+            ret += "\n%s" % key_value_pair("drop-archive", "yes")
+
+        if self.remediate != "full":
+            ret += "\n%s" % key_value_pair("remediate", self.remediate)
+
+        if self.deferred_report:
+            ret += "\n%s" % key_value_pair("deferred-report", "yes")
+
+        if self.results_format != "xccdf":
+            ret += "\n%s" % key_value_pair("results-format",
+                                           self.results_format)
+
+        if self.results_compression != "none":
+            ret += "\n%s" % key_value_pair("results-compression",
+                                           self.results_compression)
+
         ret += "\n%end\n\n"
         return ret
 
@@ -202,6 +249,49 @@ class OSCAPdata(AddonData):
     def _parse_certificates(self, value):
         self.certificates = value
 
+    def _parse_drop_archive(self, value):
+        try:
+            self.drop_archive = BOOLEAN_VALUES[value.lower()]
+        except KeyError:
+            msg = "Invalid value '%s' of drop-archive in the %s addon" % \
+                  (value, self.name)
+            raise KickstartValueError(msg)
+
+    def _parse_remediate(self, value):
+        value_low = value.lower()
+        if value_low in REMEDIATION_MODES:
+            self.remediate = value_low
+        else:
+            msg = "Unsupported remediation mode '%s' in the %s addon" % \
+                  (value, self.name)
+            raise KickstartValueError(msg)
+
+    def _parse_deferred_report(self, value):
+        try:
+            self.deferred_report = BOOLEAN_VALUES[value.lower()]
+        except KeyError:
+            msg = "Invalid value '%s' of deferred-report in the %s addon" % \
+                  (value, self.name)
+            raise KickstartValueError(msg)
+
+    def _parse_results_format(self, value):
+        value_low = value.lower()
+        if value_low in RESULTS_FORMATS:
+            self.results_format = value_low
+        else:
+            msg = "Unsupported results format '%s' in the %s addon" % \
+                  (value, self.name)
+            raise KickstartValueError(msg)
+
+    def _parse_results_compression(self, value):
+        value_low = value.lower()
+        if value_low in RESULTS_COMPRESSIONS:
+            self.results_compression = value_low
+        else:
+            msg = "Unsupported results compression '%s' in the %s addon" % \
+                  (value, self.name)
+            raise KickstartValueError(msg)
+
     def handle_line(self, line):
         """
         The handle_line method that is called with every line from this addon's
@@ -223,6 +313,11 @@ class OSCAPdata(AddonData):
                    "tailoring-path": self._parse_tailoring_path,
                    "fingerprint": self._parse_fingerprint,
                    "certificates": self._parse_certificates,
+                   "drop-archive": self._parse_drop_archive,
+                   "remediate": self._parse_remediate,
+                   "deferred-report": self._parse_deferred_report,
+                   "results-format": self._parse_results_format,
+                   "results-compression": self._parse_results_compression,
                    }
 
         line = line.strip()
@@ -274,6 +369,24 @@ class OSCAPdata(AddonData):
                       "file '%s'" % self.content_url
                 raise KickstartValueError(msg)
 
+        if self.results_compression != "none" and self.deferred_report:
+            # the report is generated from the uncompressed results
+            msg = "Results compression cannot be used with deferred report"
+            raise KickstartValueError(msg)
+
+        if self.remediate != "full":
+            # only the full remediation writes the results and the report
+            results_opts = [opt for (opt, used) in
+                            (("results-format", self.results_format != "xccdf"),
+                             ("results-compression",
+                              self.results_compression != "none"),
+                             ("deferred-report", self.deferred_report))
+                            if used]
+            if results_opts:
+                msg = "%s cannot be used with the '%s' remediation mode" % \
+                    (", ".join(results_opts), self.remediate)
+                raise KickstartValueError(msg)
+
         # do some initialization magic in case of SSG
         if self.content_type == "scap-security-guide":
             if not common.ssg_available():
@@ -371,22 +484,80 @@ class OSCAPdata(AddonData):
         return utils.join_paths(common.TARGET_CONTENT_DIR,
                                 self.tailoring_path)
 
+    @property
+    def raw_content_droppable(self):
+        """Whether the raw content file can be removed once extracted"""
+
+        # the RPM is needed for the installation on the target system and the
+        # datastream is not extracted at all
+        return self.drop_archive and self.content_type == "archive"
+
+    def _log_content_usage(self, phase):
+        """
+        Log how much (RAM-backed) space the content takes in the given phase.
+
+        :param phase: name of the phase to log the usage for
+        :type phase: str
+
+        """
+
+        if os.path.exists(self.raw_preinst_content_path):
+            raw_size = os.path.getsize(self.raw_preinst_content_path)
+        else:
+            raw_size = 0
+
+        total_size = utils.get_dir_size(common.INSTALLATION_CONTENT_DIR)
+        log.debug("OSCAP addon: content usage after %s: %d bytes total, %d "
+                  "bytes raw content, %d bytes extracted", phase, total_size,
+                  raw_size, total_size - raw_size)
+
+    def _drop_raw_content(self):
+        """
+        Extract everything from the raw content file, remember its digest and
+        remove it so that it doesn't take space next to the extracted files.
+
+        """
+
+        # cheap if the digest was computed when fetching the data
+        if self.fingerprint:
+            hash_name = utils.get_hashing_algorithm(self.fingerprint).name
+        else:
+            hash_name = "sha256"
+        self.raw_content_digest = utils.get_file_digest(
+            self.raw_preinst_content_path, hash_name)
+
+        common.extract_data(self.raw_preinst_content_path,
+                            common.INSTALLATION_CONTENT_DIR,
+                            [self.content_path])
+        os.remove(self.raw_preinst_content_path)
+        self._log_content_usage("dropping the raw content")
+
     def _fetch_content_and_initialize(self):
         """Fetch content and initialize from it"""
 
         data_fetch.fetch_data(self.content_url, self.raw_preinst_content_path,
-                              self.certificates)
+                              self.certificates, self.fingerprint)
+        self._log_content_usage("fetching")
         # RPM is an archive at this phase
         if self.content_type in ("archive", "rpm"):
-            # extract the content
+            # extract the content (everything if the archive is going to be
+            # dropped anyway)
             common.extract_data(self.raw_preinst_content_path,
                                 common.INSTALLATION_CONTENT_DIR,
-                                [self.content_path])
-
+                                [self.content_path],
+                                content_only=not self.raw_content_droppable)
+            self._log_content_usage("extraction")
+
+        # no content loaded here, get the rules with a streaming parser
+        # instead of loading the whole content with the oscap tool
+        fixes_index = FixesIndex(self.preinst_content_path,
+                                 common.PRE_INSTALL_FIX_SYSTEM_ATTR,
+                                 self.preinst_tailoring_path)
         rules = common.get_fix_rules_pre(self.profile_id,
                                          self.preinst_content_path,
                                          self.datastream_id, self.xccdf_id,
-                                         self.preinst_tailoring_path)
+                                         self.preinst_tailoring_path,
+                                         fixes_index)
 
         # parse and store rules with a clean RuleData instance
         self.rule_data = rule_handling.RuleData()
@@ -418,6 +589,9 @@ class OSCAPdata(AddonData):
             # content not available/fetched yet
             try:
                 self._fetch_content_and_initialize()
+            except data_fetch.IntegrityCheckError:
+                # reported by the fingerprint check below
+                pass
             except (common.OSCAPaddonError, data_fetch.DataFetchError) as e:
                 log.error("Failed to fetch and initialize SCAP content!")
                 msg = _("There was an error fetching and loading the security content:\n" +
@@ -444,9 +618,14 @@ class OSCAPdata(AddonData):
 
         # check fingerprint if given
         if self.fingerprint:
+            # no extra reading if the digest was computed when fetching
             hash_obj = utils.get_hashing_algorithm(self.fingerprint)
-            digest = utils.get_file_fingerprint(self.raw_preinst_content_path,
-                                                hash_obj)
+            if self.raw_content_digest and \
+               not os.path.exists(self.raw_preinst_content_path):
+                digest = self.raw_content_digest
+            else:
+                digest = utils.get_file_digest(self.raw_preinst_content_path,
+                                               hash_obj.name)
             if digest != self.fingerprint:
                 log.error("Failed to fetch and initialize SCAP content!")
                 msg = _("The integrity check of the security content failed.\n" +
@@ -470,6 +649,11 @@ class OSCAPdata(AddonData):
                     while True:
                         time.sleep(100000)
 
+        if self.raw_content_droppable and \
+           os.path.exists(self.raw_preinst_content_path):
+            # not needed anymore, only takes RAM-backed space
+            self._drop_raw_content()
+
         # evaluate rules, do automatic fixes and stop if something that cannot
         # be fixed automatically is wrong
         fatal_messages = [message for message in self.rule_data.eval_rules(ksdata, storage)
@@ -530,26 +714,91 @@ class OSCAPdata(AddonData):
             # copy the RPM to the target system
             shutil.copy2(self.raw_preinst_content_path, target_content_dir)
 
-            # and install it with yum
-            ret = iutil.execInSysroot("yum", ["-y", "--nogpg", "install",
-                                              self.raw_postinst_content_path])
-            if ret != 0:
-                raise common.ExtractionError("Failed to install content "
-                                             "RPM to the target system")
+            # and install it directly with rpm, no need for yum to load the
+            # repository metadata for a single local package
+            try:
+                common.install_rpms([self.raw_preinst_content_path],
+                                    getSysroot())
+            except common.ExtractionError as err:
+                log.warning("Failed to install content RPM with rpm, "
+                            "trying yum: %s", err)
+
+                ret = iutil.execInSysroot("yum", ["-y", "--nogpg", "install",
+                                                  self.raw_postinst_content_path])
+                if ret != 0:
+                    raise common.ExtractionError("Failed to install content "
+                                                 "RPM to the target system")
         elif self.content_type == "scap-security-guide":
             # nothing needed
             pass
         else:
-            utils.universal_copy(utils.join_paths(common.INSTALLATION_CONTENT_DIR,
-                                                  "*"),
-                                 target_content_dir)
+            if os.path.exists(self.raw_preinst_content_path):
+                # only the content was extracted in the setup phase, get the
+                # rest (e.g. check scripts) now
+                common.extract_data(self.raw_preinst_content_path,
+                                    common.INSTALLATION_CONTENT_DIR)
+            # else everything was extracted when dropping the raw content
+            self._log_content_usage("preparing the content for the copy")
+            # the extracted files are not needed anymore if the raw content
+            # was dropped to save RAM-backed space
+            utils.bulk_copy(common.INSTALLATION_CONTENT_DIR,
+                            target_content_dir,
+                            move=self.raw_content_droppable)
         if os.path.exists(self.preinst_tailoring_path):
             shutil.copy2(self.preinst_tailoring_path, target_content_dir)
 
-        common.run_oscap_remediate(self.profile_id, self.postinst_content_path,
-                                   self.datastream_id, self.xccdf_id,
-                                   self.postinst_tailoring_path,
-                                   chroot=getSysroot())
+        content_args = (self.profile_id, self.postinst_content_path,
+                        self.datastream_id, self.xccdf_id,
+                        self.postinst_tailoring_path)
+        if self.remediate == "full":
+            common.run_oscap_remediate(*content_args, chroot=getSysroot(),
+                                       progress_cb=self._report_remediation_progress,
+                                       report=not self.deferred_report,
+                                       results_format=self.results_format)
+            results_path = common.RESULTS_PATHS[self.results_format]
+            if self.deferred_report:
+                # only the results written, render the report later
+                common.schedule_first_boot_report(chroot=getSysroot(),
+                                                  results_path=results_path)
+
+            compression = self.results_compression
+            if compression == "none":
+                compression = ""
+            try:
+                common.postprocess_results(self.profile_id,
+                                           self.results_format, compression,
+                                           chroot=getSysroot())
+            except common.OSCAPaddonError as err:
+                # the results are still there
+                log.warning("Failed to process the results: %s", err)
+        elif self.remediate in ("fix-only", "script"):
+            # no evaluation passes, just the fixes
+            progressQ.send_message(_("Generating the remediation script"))
+            common.generate_remediation_script(*content_args,
+                                               chroot=getSysroot())
+            if self.remediate == "fix-only":
+                progressQ.send_message(_("Remediating the system"))
+                common.run_remediation_script(chroot=getSysroot())
+                common.schedule_first_boot_evaluation(*content_args,
+                                                      chroot=getSysroot())
+        # else no remediation requested
+
+    @staticmethod
+    def _report_remediation_progress(parser):
+        """
+        Report the progress of the evaluation and remediation.
+
+        :type parser: common.RemediationOutputParser
+
+        """
+
+        if parser.remediating:
+            msg = _("Remediating the system: %d fixes applied (%d rules "
+                    "evaluated)") % (parser.remediated, parser.evaluated)
+        else:
+            msg = _("Evaluating the system: %d rules evaluated") % \
+                parser.evaluated
+        progressQ.send_message(msg)
 
     def clear_all(self):
         """Clear all the stored values."""
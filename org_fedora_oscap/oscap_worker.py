@@ -0,0 +1,414 @@
+#
+# Copyright (C) 2013  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+"""
+Module with a long-lived worker process keeping SCAP content loaded and
+generating fix rules from it on request, so that the content doesn't have to
+be loaded again (by a new oscap process) for every profile.
+
+The worker and its client talk over a pipe, every message is a JSON object
+prefixed with its length (4 bytes, big endian).
+
+"""
+
+import os
+import sys
+import select
+import struct
+import json
+import threading
+import logging
+import subprocess
+
+from org_fedora_oscap import content_handling
+
+log = logging.getLogger("anaconda")
+
+# struct format of the length prefix of the messages
+MESSAGE_LENGTH_FORMAT = ">I"
+MESSAGE_LENGTH_SIZE = struct.calcsize(MESSAGE_LENGTH_FORMAT)
+
+# maximum length of a message (fix rules for a huge profile fit easily)
+MAX_MESSAGE_LENGTH = 256 * 1024 * 1024
+
+# how many seconds the worker waits for a request before it quits
+WORKER_IDLE_TIMEOUT = 300
+
+# how many times the worker is restarted for a single request if it crashes
+WORKER_RESTARTS = 1
+
+
+class OSCAPWorkerError(content_handling.ContentHandlingError):
+    """Exception for the errors of the worker process."""
+
+    pass
+
+
+class WorkerProtocolError(OSCAPWorkerError):
+    """Exception for the invalid or incomplete messages."""
+
+    pass
+
+
+def write_message(fobj, message):
+    """
+    Write the given message prefixed with its length to the given file
+    object.
+
+    :param message: JSON-serializable message
+    :type message: dict
+    :raise IOError: if the message cannot be written
+
+    """
+
+    data = json.dumps(message)
+    fobj.write(struct.pack(MESSAGE_LENGTH_FORMAT, len(data)) + data)
+    fobj.flush()
+
+
+def _read_exactly(fobj, size):
+    """
+    Read exactly the given number of bytes from the given file object (that
+    may return less data than requested) unless the end of file is reached.
+
+    :rtype: str
+
+    """
+
+    chunks = []
+    remaining = size
+    while remaining:
+        chunk = fobj.read(remaining)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+
+    return "".join(chunks)
+
+
+def read_message(fobj):
+    """
+    Read a message prefixed with its length from the given file object.
+
+    :return: the message or None if the end of file was reached before it
+    :rtype: dict or None
+    :raise WorkerProtocolError: if the message is truncated or invalid
+    :raise IOError: if the message cannot be read
+
+    """
+
+    prefix = _read_exactly(fobj, MESSAGE_LENGTH_SIZE)
+    if not prefix:
+        return None
+    if len(prefix) != MESSAGE_LENGTH_SIZE:
+        raise WorkerProtocolError("Truncated message length")
+
+    (length,) = struct.unpack(MESSAGE_LENGTH_FORMAT, prefix)
+    if length > MAX_MESSAGE_LENGTH:
+        raise WorkerProtocolError("Message too long (%d bytes)" % length)
+
+    data = _read_exactly(fobj, length)
+    if len(data) != length:
+        raise WorkerProtocolError("Truncated message")
+
+    try:
+        message = json.loads(data)
+    except ValueError as err:
+        raise WorkerProtocolError("Invalid message: %s" % err)
+    if not isinstance(message, dict):
+        raise WorkerProtocolError("Invalid message: not an object")
+
+    return message
+
+
+def _load_content_handler(content_path, tailoring_path=""):
+    """
+    Load the given content into a content handler that keeps it loaded.
+
+    :rtype: content_handling.DataStreamHandler or
+            content_handling.BenchmarkHandler
+    :raise content_handling.ContentHandlingError: if the content is invalid
+
+    """
+
+    try:
+        return content_handling.DataStreamHandler(content_path, tailoring_path)
+    except content_handling.DataStreamHandlingError:
+        # may be a plain XCCDF benchmark
+        return content_handling.BenchmarkHandler(content_path, tailoring_path)
+
+
+def serve(content_path, tailoring_path, in_obj, out_obj,
+          idle_timeout=WORKER_IDLE_TIMEOUT):
+    """
+    Load the given content and answer the requests for fix rules coming from
+    the given input file object until its end is reached or no request comes
+    in the given time.
+
+    A request is an object with the "profile", "template", "ds_id" and
+    "xccdf_id" items (see content_handling.DataStreamHandler.get_fix_rules),
+    the response is an object with either the "rules" or the "error" item.
+
+    :param in_obj: unbuffered file object to read the requests from
+    :type in_obj: file
+    :param out_obj: file object to write the responses to
+    :type out_obj: file
+    :param idle_timeout: number of seconds to wait for a request (None to
+                         wait forever)
+    :type idle_timeout: int or None
+
+    """
+
+    try:
+        handler = _load_content_handler(content_path, tailoring_path)
+        load_error = None
+    except content_handling.ContentHandlingError as err:
+        # reported to the client with every request
+        handler = None
+        load_error = "Failed to load the content: %s" % err
+
+    while True:
+        if not select.select([in_obj], [], [], idle_timeout)[0]:
+            log.debug("OSCAP addon: fix rules worker idle, quitting")
+            break
+
+        request = read_message(in_obj)
+        if request is None:
+            # the client went away
+            break
+
+        if handler is None:
+            write_message(out_obj, {"error": load_error})
+            continue
+
+        try:
+            # JSON strings are unicode
+            args = [request[key].encode("utf-8") for key in
+                    ("profile", "template", "ds_id", "xccdf_id")]
+            response = {"rules": handler.get_fix_rules(*args)}
+        except (content_handling.ContentHandlingError, KeyError,
+                IndexError, AttributeError) as err:
+            response = {"error": "Failed to get fix rules: %s" % err}
+
+        write_message(out_obj, response)
+
+    if hasattr(handler, "session_pool_stats"):
+        log.debug("OSCAP addon: fix rules worker session pool: %s",
+                  handler.session_pool_stats)
+
+
+class OSCAPWorker(object):
+    """
+    Client of the worker process generating fix rules for a given content.
+    The process is started on demand and restarted if it crashes or quits
+    because of being idle.
+
+    Provides the get_fix_rules method just like the content handlers.
+
+    """
+
+    def __init__(self, content_path, tailoring_path=""):
+        """
+        :param content_path: path to the SCAP content file
+        :type content_path: str
+        :param tailoring_path: path to the tailoring file (if any)
+        :type tailoring_path: str
+
+        """
+
+        self.content_path = content_path
+        self.tailoring_path = tailoring_path
+
+        self._proc = None
+
+        # guards self._proc, never held while talking to the process so that
+        # the worker can be stopped in the middle of a request
+        self._proc_lock = threading.Lock()
+
+        # only one request can be processed by the worker at a time
+        self._lock = threading.Lock()
+
+    def _get_command(self):
+        return [sys.executable, "-m", "org_fedora_oscap.oscap_worker",
+                self.content_path, self.tailoring_path]
+
+    def _ensure_running(self):
+        """
+        Start the worker process if it is not running.
+
+        :return: the running process
+        :rtype: subprocess.Popen
+        :raise OSCAPWorkerError: if the process cannot be started
+
+        """
+
+        with self._proc_lock:
+            if self._proc and self._proc.poll() is None:
+                return self._proc
+
+            # make sure the worker can import this package
+            env = dict(os.environ)
+            package_parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            env["PYTHONPATH"] = os.pathsep.join(path for path in
+                                                (package_parent,
+                                                 env.get("PYTHONPATH"))
+                                                if path)
+            try:
+                self._proc = subprocess.Popen(self._get_command(),
+                                              stdin=subprocess.PIPE,
+                                              stdout=subprocess.PIPE,
+                                              env=env, close_fds=True)
+            except OSError as err:
+                self._proc = None
+                raise OSCAPWorkerError("Failed to start the worker: %s" % err)
+
+            return self._proc
+
+    def _kill(self, proc):
+        """
+        Kill the given worker process (if still running) and forget it (if
+        it is the current one).
+
+        :type proc: subprocess.Popen
+
+        """
+
+        try:
+            proc.stdin.close()
+        except IOError:
+            # a request is being written in another thread
+            pass
+
+        if proc.poll() is None:
+            try:
+                proc.kill()
+            except OSError:
+                # exited in the meantime
+                pass
+        proc.wait()
+
+        with self._proc_lock:
+            if self._proc is proc:
+                self._proc = None
+
+    def start(self):
+        """
+        Start the worker process so that it loads the content in the
+        background.
+
+        :raise OSCAPWorkerError: if the process cannot be started
+
+        """
+
+        self._ensure_running()
+
+    def stop(self):
+        """
+        Stop the worker process (if running). Doesn't wait for the request
+        being processed (if any), it fails instead.
+
+        """
+
+        with self._proc_lock:
+            proc = self._proc
+            self._proc = None
+
+        if proc:
+            # the worker holds no state worth a graceful exit
+            self._kill(proc)
+
+    def get_fix_rules(self, profile_id, template, data_stream_id="",
+                      checklist_id=""):
+        """
+        Get the contents of the fix elements with the given 'system' attribute
+        for the given profile from the worker.
+
+        :see: content_handling.DataStreamHandler.get_fix_rules
+        :raise OSCAPWorkerError: if the worker fails to get the rules
+
+        """
+
+        request = {"profile": profile_id, "template": template,
+                   "ds_id": data_stream_id or "",
+                   "xccdf_id": checklist_id or "",
+                   }
+
+        with self._lock:
+            for attempt in range(WORKER_RESTARTS + 1):
+                proc = self._ensure_running()
+                try:
+                    write_message(proc.stdin, request)
+                    response = read_message(proc.stdout)
+                except (EnvironmentError, ValueError,
+                        WorkerProtocolError) as err:
+                    # ValueError -- stdin closed by stop()
+                    log.debug("OSCAP addon: communication with the fix rules "
+                              "worker failed: %s", err)
+                    response = None
+
+                if response is not None:
+                    break
+
+                with self._proc_lock:
+                    stopped = self._proc is not proc
+                if stopped:
+                    raise OSCAPWorkerError("The worker was stopped")
+
+                # crashed or quit because of being idle
+                log.info("OSCAP addon: fix rules worker exited, restarting "
+                         "it (attempt %d)", attempt + 1)
+                self._kill(proc)
+            else:
+                raise OSCAPWorkerError("The worker keeps crashing")
+
+        if "error" in response:
+            raise OSCAPWorkerError(unicode(response["error"]).encode("utf-8"))
+
+        rules = response.get("rules")
+        if not isinstance(rules, basestring):
+            raise WorkerProtocolError("Invalid response: no rules")
+
+        return rules.encode("utf-8")
+
+
+def main(argv):
+    if len(argv) < 2:
+        sys.stderr.write("Usage: %s CONTENT_FILE [TAILORING_FILE]\n" % argv[0])
+        return 1
+
+    content_path = argv[1]
+    tailoring_path = argv[2] if len(argv) > 2 else ""
+
+    # the responses get their own copy of stdout, anything printed by the
+    # libraries goes to stderr so that it cannot break the protocol
+    out_obj = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    in_obj = os.fdopen(os.dup(sys.stdin.fileno()), "rb", 0)
+
+    try:
+        serve(content_path, tailoring_path, in_obj, out_obj)
+    except (EnvironmentError, WorkerProtocolError) as err:
+        sys.stderr.write("Fix rules worker failed: %s\n" % err)
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
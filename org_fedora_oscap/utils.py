@@ -22,9 +22,38 @@
 
 import os
 import os.path
+import errno
+import fcntl
+import ctypes
+import ctypes.util
 import shutil
 import glob
 import hashlib
+import threading
+import time
+import logging
+from multiprocessing.pool import ThreadPool
+
+log = logging.getLogger("anaconda")
+
+# digests of the files computed so far, see get_file_digest
+_digests = dict()
+_digests_lock = threading.Lock()
+
+# number of threads copying files in bulk_copy
+COPY_WORKERS = 4
+
+# maximum number of bytes copied by a single call when copying files
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
+
+# ioctl request cloning a whole file on filesystems with reflink support
+# (FICLONE from linux/fs.h)
+FICLONE = 0x40049409
+
+# errors meaning that a way of copying a file is not supported for the given
+# files and another way has to be used
+COPY_UNSUPPORTED_ERRORS = (errno.EXDEV, errno.EINVAL, errno.ENOSYS,
+                           errno.EOPNOTSUPP, errno.ENOTTY, errno.EBADF)
 
 
 def ensure_dir_exists(dirpath):
@@ -184,3 +213,345 @@ def get_file_fingerprint(fpath, hash_obj):
             buf = fobj.read(bsize)
 
     return hash_obj.hexdigest()
+
+
+def get_file_digest(fpath, hash_name="sha256"):
+    """
+    Get digest of the given file computed with the given hashing algorithm.
+    The digest is remembered together with the size and modification time of
+    the file so that subsequent calls for an unchanged file don't need to read
+    it again.
+
+    :param fpath: path to the file to get digest for
+    :type fpath: str
+    :param hash_name: name of the hashing algorithm (as understood by
+                      hashlib.new)
+    :type hash_name: str
+    :return: digest of the given file
+    :rtype: hexadecimal str
+    :raise OSError: if the file cannot be accessed
+
+    """
+
+    fpath = os.path.abspath(fpath)
+    stat = os.stat(fpath)
+    file_id = (stat.st_size, stat.st_mtime)
+    # hash objects may report their names in upper case
+    hash_name = hash_name.lower()
+
+    with _digests_lock:
+        known = _digests.get((fpath, hash_name))
+    if known and known[0] == file_id:
+        return known[1]
+
+    digest = get_file_fingerprint(fpath, hashlib.new(hash_name))
+    with _digests_lock:
+        _digests[(fpath, hash_name)] = (file_id, digest)
+
+    return digest
+
+
+def record_file_digest(fpath, hash_name, digest):
+    """
+    Remember the digest of the given file computed while the file was being
+    written so that get_file_digest doesn't need to read the file again.
+    Needs to be called after the file is closed.
+
+    :param fpath: path to the file the digest was computed for
+    :type fpath: str
+    :param hash_name: name of the hashing algorithm (as understood by
+                      hashlib.new)
+    :type hash_name: str
+    :param digest: digest of the file
+    :type digest: hexadecimal str
+    :raise OSError: if the file cannot be accessed
+
+    """
+
+    fpath = os.path.abspath(fpath)
+    stat = os.stat(fpath)
+    file_id = (stat.st_size, stat.st_mtime)
+    # hash objects may report their names in upper case
+    hash_name = hash_name.lower()
+
+    with _digests_lock:
+        _digests[(fpath, hash_name)] = (file_id, digest)
+
+
+def get_dir_size(dirpath):
+    """
+    Get the total size of the files in the given directory (recursively). Does
+    not follow symlinks and ignores files removed while being walked through.
+
+    :param dirpath: path to the directory to get size of
+    :type dirpath: str
+    :return: total size of the files in bytes (0 if the directory doesn't
+             exist)
+    :rtype: int
+
+    """
+
+    total = 0
+    for (root, _dirs, files) in os.walk(dirpath):
+        for fname in files:
+            try:
+                total += os.lstat(os.path.join(root, fname)).st_size
+            except OSError:
+                # removed in the meantime
+                continue
+
+    return total
+
+
+def bulk_copy(src_dir, dst_dir, move=False, workers=COPY_WORKERS):
+    """
+    Copy the contents of the given source directory (except for hidden files
+    and directories at its top level, just like 'cp src_dir/* dst_dir' would
+    do) to the given destination directory. Files are copied by multiple
+    threads using the fastest way supported by the filesystems (renaming if
+    moving, cloning, in-kernel copying) and permissions and times are
+    preserved.
+
+    :param src_dir: directory to copy the contents of
+    :type src_dir: str
+    :param dst_dir: directory to copy the contents to (created if it doesn't
+                    exist)
+    :type dst_dir: str
+    :param move: whether the files should be moved instead of copied (i.e.
+                 removed from the source directory once copied)
+    :type move: bool
+    :param workers: maximum number of threads copying files
+    :type workers: int
+    :return: number of files and bytes copied and the time it took in seconds
+    :rtype: (int, int, float)
+
+    """
+
+    start = time.time()
+    ensure_dir_exists(dst_dir)
+
+    # create the directory tree and symlinks first so that the files can be
+    # copied in parallel
+    dirs = []
+    files = []
+    for item in sorted(os.listdir(src_dir)):
+        if item.startswith("."):
+            continue
+
+        src_item = os.path.join(src_dir, item)
+        if os.path.isdir(src_item) and not os.path.islink(src_item):
+            dirs.append((src_item, os.path.join(dst_dir, item)))
+            for (root, dnames, fnames) in os.walk(src_item):
+                rel_root = os.path.relpath(root, src_dir)
+                for name in sorted(dnames):
+                    src_path = os.path.join(root, name)
+                    dst_path = os.path.join(dst_dir, rel_root, name)
+                    if os.path.islink(src_path):
+                        # not walked into, recreated as a symlink
+                        files.append((src_path, dst_path))
+                    else:
+                        dirs.append((src_path, dst_path))
+                for name in fnames:
+                    files.append((os.path.join(root, name),
+                                  os.path.join(dst_dir, rel_root, name)))
+        else:
+            files.append((src_item, os.path.join(dst_dir, item)))
+
+    for (_src, dst) in dirs:
+        ensure_dir_exists(dst)
+
+    num_bytes = 0
+    if files:
+        pool = ThreadPool(min(workers, len(files)))
+        try:
+            # the biggest files first to spread the work evenly
+            files.sort(key=lambda item: os.lstat(item[0]).st_size,
+                       reverse=True)
+            num_bytes = sum(pool.map(lambda item: _copy_file(item[0], item[1],
+                                                             move),
+                                     files))
+        finally:
+            pool.close()
+            pool.join()
+
+    # after the files so that the modification times are not changed by them
+    for (src, dst) in reversed(dirs):
+        shutil.copystat(src, dst)
+        if move:
+            os.rmdir(src)
+
+    duration = time.time() - start
+    log.info("Copied %d files (%d bytes) from %s to %s in %.2f s (%.0f B/s)",
+             len(files), num_bytes, src_dir, dst_dir, duration,
+             num_bytes / max(duration, 1e-6))
+
+    return (len(files), num_bytes, duration)
+
+
+def _copy_file(src, dst, move=False):
+    """
+    Copy (or move) a single file or symlink preserving its permissions and
+    times.
+
+    :see: bulk_copy
+    :return: number of bytes copied
+    :rtype: int
+
+    """
+
+    if move:
+        try:
+            os.rename(src, dst)
+            return os.lstat(dst).st_size
+        except OSError as err:
+            if err.errno != errno.EXDEV:
+                raise
+            # different filesystems, needs to be copied
+
+    if os.path.islink(src):
+        if os.path.lexists(dst):
+            os.unlink(dst)
+        os.symlink(os.readlink(src), dst)
+        size = 0
+    else:
+        with open(src, "rb") as src_obj:
+            with open(dst, "wb") as dst_obj:
+                size = _copy_file_data(src_obj, dst_obj)
+        shutil.copystat(src, dst)
+
+    if move:
+        os.unlink(src)
+
+    return size
+
+
+def _copy_file_data(src_obj, dst_obj):
+    """
+    Copy data of the given open file to the other given open (empty) file in
+    the fastest way supported by the filesystems and the kernel.
+
+    :return: number of bytes copied
+    :rtype: int
+
+    """
+
+    size = os.fstat(src_obj.fileno()).st_size
+    src_fd = src_obj.fileno()
+    dst_fd = dst_obj.fileno()
+
+    # clone (reflink) the whole file sharing the data blocks
+    try:
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+        return size
+    except (IOError, OSError) as err:
+        if err.errno not in COPY_UNSUPPORTED_ERRORS:
+            raise
+
+    # copy the data in kernel without passing it through the user space
+    for kernel_copy in _KERNEL_COPY_FUNCS:
+        copied = 0
+        try:
+            while copied < size:
+                done = kernel_copy(src_fd, dst_fd, copied)
+                if not done:
+                    # the file got shorter in the meantime
+                    break
+                copied += done
+            if copied or not size:
+                return copied
+            # nothing copied (e.g. a virtual file reporting a wrong size),
+            # try the next way
+        except OSError as err:
+            if copied or err.errno not in COPY_UNSUPPORTED_ERRORS:
+                raise
+
+    copied = 0
+    while True:
+        data = src_obj.read(COPY_CHUNK_SIZE)
+        if not data:
+            break
+        dst_obj.write(data)
+        copied += len(data)
+
+    return copied
+
+
+def _get_libc_func(name, restype, argtypes):
+    """
+    Get the given function from the C library.
+
+    :return: the function or None if not available
+    :rtype: ctypes function or None
+
+    """
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6",
+                           use_errno=True)
+        func = getattr(libc, name)
+    except (OSError, AttributeError):
+        return None
+
+    func.restype = restype
+    func.argtypes = argtypes
+    return func
+
+
+# the os module of Python 2 has neither of these, call them directly
+_libc_copy_file_range = _get_libc_func("copy_file_range", ctypes.c_ssize_t,
+                                       [ctypes.c_int,
+                                        ctypes.POINTER(ctypes.c_int64),
+                                        ctypes.c_int,
+                                        ctypes.POINTER(ctypes.c_int64),
+                                        ctypes.c_size_t, ctypes.c_uint])
+_libc_sendfile = _get_libc_func("sendfile64", ctypes.c_ssize_t,
+                                [ctypes.c_int, ctypes.c_int,
+                                 ctypes.POINTER(ctypes.c_int64),
+                                 ctypes.c_size_t])
+
+
+def _check_libc_result(ret):
+    """
+    Check the result of a function from the C library.
+
+    :return: the result
+    :rtype: int
+    :raise OSError: if the function failed
+
+    """
+
+    if ret < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+
+    return ret
+
+
+def _copy_file_range(src_fd, dst_fd, offset):
+    """Copy a chunk of data at the given offset with copy_file_range."""
+
+    src_offset = ctypes.c_int64(offset)
+    dst_offset = ctypes.c_int64(offset)
+    return _check_libc_result(_libc_copy_file_range(src_fd,
+                                                    ctypes.byref(src_offset),
+                                                    dst_fd,
+                                                    ctypes.byref(dst_offset),
+                                                    COPY_CHUNK_SIZE, 0))
+
+
+def _sendfile(src_fd, dst_fd, offset):
+    """Copy a chunk of data at the given offset with sendfile."""
+
+    # writes to the current position of dst_fd which is right after the data
+    # copied so far
+    src_offset = ctypes.c_int64(offset)
+    return _check_libc_result(_libc_sendfile(dst_fd, src_fd,
+                                             ctypes.byref(src_offset),
+                                             COPY_CHUNK_SIZE))
+
+
+# ways of copying data in kernel available in the C library
+_KERNEL_COPY_FUNCS = [func for (func, libc_func) in
+                      ((_copy_file_range, _libc_copy_file_range),
+                       (_sendfile, _libc_sendfile))
+                      if libc_func is not None]
@@ -35,11 +35,9 @@ BuildRequires:  pykickstart
 %endif
 BuildRequires:  %{_py}-nose
 BuildRequires:  openscap openscap-utils openscap-%{_py}
-BuildRequires:  %{_py}-cpio
 BuildRequires:  anaconda >= 21.48.22.99
 Requires:       anaconda >= 21.48.22.99
 Requires:       openscap openscap-utils openscap-%{_py}
-Requires:       %{_py}-cpio
 
 %description
 This is an addon that integrates OpenSCAP utilities with the Anaconda installer
@@ -22,8 +22,24 @@
 
 import unittest
 import os
+import shutil
+import tempfile
+import threading
+import time
+import tarfile
+import zipfile
+import stat
+import struct
+import zlib
+import subprocess
+import gzip
+import bz2
+import itertools
+import json
 import mock
-from org_fedora_oscap import common
+from StringIO import StringIO
+from distutils.spawn import find_executable
+from org_fedora_oscap import common, utils
 
 
 class OSCAPtoolRunningTest(unittest.TestCase):
@@ -31,11 +47,9 @@ class OSCAPtoolRunningTest(unittest.TestCase):
         self.mock_subprocess = mock.Mock()
         self.mock_subprocess.Popen = mock.Mock()
         self.mock_popen = mock.Mock()
-        self.mock_communicate = mock.Mock()
 
-        self.mock_communicate.return_value = ("", "")
-
-        self.mock_popen.communicate = self.mock_communicate
+        self.mock_popen.stdout = StringIO("")
+        self.mock_popen.stderr = StringIO("")
         self.mock_popen.returncode = 0
 
         self.mock_subprocess.Popen.return_value = self.mock_popen
@@ -140,6 +154,21 @@ class OSCAPtoolRunningTest(unittest.TestCase):
         # plus the preexec_fn kwarg should have been passed
         self.assertIn("preexec_fn", self.mock_subprocess.Popen.call_args[1])
 
+    def run_oscap_remediate_no_report_test(self):
+        self.run_oscap_remediate("myprofile", "my_ds.xml", report=False)
+
+        args = self.mock_subprocess.Popen.call_args[0][0]
+        self.assertIn("--results=%s" % common.RESULTS_PATH, args)
+        self.assertNotIn("--report=%s" % common.REPORT_PATH, args)
+
+    def run_oscap_remediate_arf_test(self):
+        self.run_oscap_remediate("myprofile", "my_ds.xml",
+                                 results_format="arf")
+
+        args = self.mock_subprocess.Popen.call_args[0][0]
+        self.assertIn("--results-arf=%s" % common.ARF_RESULTS_PATH, args)
+        self.assertNotIn("--results=%s" % common.RESULTS_PATH, args)
+
     def run_oscap_remediate_create_dir_test(self):
         self.run_oscap_remediate("myprofile", "my_ds.xml")
 
@@ -153,5 +182,1028 @@ class OSCAPtoolRunningTest(unittest.TestCase):
         self.mock_utils.ensure_dir_exists.assert_called_with(chroot_dir)
 
 
+# output of 'oscap xccdf eval --remediate' (shortened)
+REMEDIATION_STDOUT = """--- Starting Evaluation ---
+
+Title\r\tEnsure /tmp Located On Separate Partition
+Rule\r\txccdf_com.example_rule_tmp_part
+Result\r\tfail
+
+Title\r\tSet Password Minimum Length
+Rule\r\txccdf_com.example_rule_passwd_min_len
+Result\r\tfail
+
+Title\r\tUninstall telnet
+Rule\r\txccdf_com.example_rule_telnet_not_installed
+Result\r\tpass
+
+--- Starting Remediation ---
+
+Title\r\tEnsure /tmp Located On Separate Partition
+Rule\r\txccdf_com.example_rule_tmp_part
+Result\r\terror
+
+Title\r\tSet Password Minimum Length
+Rule\r\txccdf_com.example_rule_passwd_min_len
+Result\r\tfixed
+"""
+
+
+# results of an evaluation (shortened)
+RESULTS = """<?xml version="1.0" encoding="UTF-8"?>
+<Benchmark xmlns="http://checklists.nist.gov/xccdf/1.2" id="xccdf_b_benchmark">
+  <TestResult id="xccdf_org.open-scap_testresult_default">
+    <rule-result idref="xccdf_rule_first"><result>fail</result></rule-result>
+    <rule-result idref="xccdf_rule_second"><result>pass</result></rule-result>
+  </TestResult>
+</Benchmark>
+"""
+
+
+class RemediationOutputTest(unittest.TestCase):
+    """Tests for processing the output of the remediation."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.tmp_dir, "eval_remediate.log")
+
+        self.popen = mock.Mock()
+        self.popen.stdout = StringIO(REMEDIATION_STDOUT)
+        self.popen.stderr = StringIO("OpenSCAP Error: something wrong\n")
+        self.popen.returncode = 2
+
+        patchers = [mock.patch.object(common, "subprocess"),
+                    mock.patch.object(common, "REMEDIATION_LOG_PATH",
+                                      self.log_path),
+                    mock.patch.object(common, "REMEDIATION_PROGRESS_STEP", 2)]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        common.subprocess.Popen.return_value = self.popen
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def counts_test(self):
+        progress = []
+        report = lambda parser: progress.append((parser.remediating,
+                                                 parser.evaluated,
+                                                 parser.remediated))
+
+        parser = common.run_oscap_remediate("myprofile", "my_ds.xml",
+                                            progress_cb=report)
+
+        self.assertEqual(parser.evaluated, 3)
+        self.assertEqual(parser.eval_results, {"pass": 1, "fail": 2})
+        self.assertEqual(parser.remediated, 2)
+        self.assertEqual(parser.fix_results, {"fixed": 1, "error": 1})
+        self.assertEqual(parser.errors, ["OpenSCAP Error: something wrong"])
+        self.assertEqual(progress, [(False, 2, 0), (True, 3, 0),
+                                    (True, 3, 2)])
+
+    def log_test(self):
+        common.run_oscap_remediate("myprofile", "my_ds.xml")
+
+        with open(self.log_path) as fobj:
+            log_data = fobj.read()
+
+        # stderr is read in a separate thread, its lines may be anywhere
+        # between the lines of stdout
+        self.assertIn("OpenSCAP Error: something wrong\n", log_data)
+        log_data = log_data.replace("OpenSCAP Error: something wrong\n", "")
+        self.assertEqual(log_data, REMEDIATION_STDOUT)
+
+    def failure_test(self):
+        self.popen.returncode = 1
+
+        with self.assertRaisesRegexp(common.OSCAPaddonError,
+                                     "something wrong"):
+            common.run_oscap_remediate("myprofile", "my_ds.xml")
+
+
+class RemediationScriptTest(unittest.TestCase):
+    """Tests for the remediation without the evaluation passes."""
+
+    def setUp(self):
+        self.chroot = tempfile.mkdtemp()
+
+        # OSCAPtoolRunningTest replaces these in the module
+        patchers = [mock.patch.object(common, "subprocess", subprocess),
+                    mock.patch.object(common, "utils", utils)]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.chroot)
+
+    def _chroot_path(self, path):
+        return os.path.normpath(self.chroot + "/" + path)
+
+    def generate_script_test(self):
+        popen = mock.Mock(returncode=0)
+        popen.communicate.return_value = ("", "")
+        with mock.patch.object(subprocess, "Popen",
+                               return_value=popen) as mock_popen:
+            path = common.generate_remediation_script("myprofile",
+                                                      "my_ds.xml",
+                                                      "my_ds_id",
+                                                      chroot=self.chroot)
+
+        self.assertEqual(path, common.REMEDIATION_SCRIPT_PATH)
+        self.assertEqual(mock_popen.call_args[0][0],
+                         ["oscap", "xccdf", "generate", "fix",
+                          "--template=urn:xccdf:fix:script:sh",
+                          "--output=%s" % common.REMEDIATION_SCRIPT_PATH,
+                          "--profile=myprofile", "--datastream-id=my_ds_id",
+                          "my_ds.xml"])
+        self.assertTrue(os.path.isdir(self._chroot_path(
+            os.path.dirname(common.REMEDIATION_SCRIPT_PATH))))
+
+    def generate_script_failure_test(self):
+        popen = mock.Mock(returncode=1)
+        popen.communicate.return_value = ("", "No such profile")
+        with mock.patch.object(subprocess, "Popen", return_value=popen):
+            with self.assertRaisesRegexp(common.OSCAPaddonError,
+                                         "No such profile"):
+                common.generate_remediation_script("myprofile", "my_ds.xml",
+                                                   chroot=self.chroot)
+
+    def run_script_test(self):
+        script_path = os.path.join(self.chroot, "remediation.sh")
+        log_path = os.path.join(self.chroot, "remediation.log")
+        with open(script_path, "w") as fobj:
+            fobj.write("echo fixing\necho failed >&2\nexit 1\n")
+
+        # not run in chroot (needs root), paths outside of it
+        with mock.patch.object(common, "REMEDIATION_SCRIPT_PATH",
+                               script_path), \
+                mock.patch.object(common, "REMEDIATION_LOG_PATH", log_path):
+            common.run_remediation_script()
+
+        with open(log_path) as fobj:
+            self.assertEqual(fobj.read(), "fixing\nfailed\n")
+
+    def first_boot_evaluation_test(self):
+        common.schedule_first_boot_evaluation("my profile", "my_ds.xml",
+                                              chroot=self.chroot)
+
+        units_dir = self._chroot_path(common.SYSTEMD_UNITS_DIR)
+        unit_path = os.path.join(units_dir, common.FIRST_BOOT_EVAL_UNIT)
+        link_path = os.path.join(units_dir, "multi-user.target.wants",
+                                 common.FIRST_BOOT_EVAL_UNIT)
+
+        with open(unit_path) as fobj:
+            unit_data = fobj.read()
+        self.assertIn("ExecStart=/usr/bin/oscap xccdf eval "
+                      "--results=%s --report=%s \"--profile=my profile\" "
+                      "my_ds.xml\n" % (common.RESULTS_PATH,
+                                       common.REPORT_PATH), unit_data)
+        self.assertIn("SuccessExitStatus=0 2\n", unit_data)
+        self.assertIn("ExecStartPost=/usr/bin/systemctl disable %s\n" %
+                      common.FIRST_BOOT_EVAL_UNIT, unit_data)
+        self.assertEqual(os.readlink(link_path),
+                         os.path.join(common.SYSTEMD_UNITS_DIR,
+                                      common.FIRST_BOOT_EVAL_UNIT))
+
+        # can be installed again
+        common.schedule_first_boot_evaluation("my profile", "my_ds.xml",
+                                              chroot=self.chroot)
+
+    def first_boot_report_test(self):
+        common.schedule_first_boot_report(chroot=self.chroot)
+
+        unit_path = os.path.join(self._chroot_path(common.SYSTEMD_UNITS_DIR),
+                                 common.FIRST_BOOT_REPORT_UNIT)
+        with open(unit_path) as fobj:
+            self.assertIn("ExecStart=/usr/bin/oscap xccdf generate report "
+                          "--output=%s %s\n" % (common.REPORT_PATH,
+                                                common.RESULTS_PATH),
+                          fobj.read())
+
+
+class PostprocessResultsTest(unittest.TestCase):
+    """Tests for the summary and compression of the results."""
+
+    def setUp(self):
+        self.chroot = tempfile.mkdtemp()
+        self.results_path = self._chroot_path(common.RESULTS_PATH)
+        self.report_path = self._chroot_path(common.REPORT_PATH)
+        os.makedirs(os.path.dirname(self.results_path))
+        with open(self.results_path, "w") as fobj:
+            fobj.write(RESULTS)
+        with open(self.report_path, "w") as fobj:
+            fobj.write("<html/>")
+
+        # OSCAPtoolRunningTest replaces these in the module
+        patchers = [mock.patch.object(common, "subprocess", subprocess),
+                    mock.patch.object(common, "utils", utils)]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.chroot)
+
+    def _chroot_path(self, path):
+        return os.path.normpath(self.chroot + "/" + path)
+
+    def _read_summary(self):
+        with open(self._chroot_path(common.RESULTS_SUMMARY_PATH)) as fobj:
+            return json.load(fobj)
+
+    def summary_test(self):
+        summary = common.postprocess_results("myprofile", chroot=self.chroot)
+
+        self.assertEqual(summary, self._read_summary())
+        self.assertEqual(summary["profile"], "myprofile")
+        self.assertEqual(summary["results"], {"fail": 1, "pass": 1})
+        self.assertEqual(summary["failed_rules"], ["xccdf_rule_first"])
+        self.assertEqual(summary["results_file"], common.RESULTS_PATH)
+        self.assertEqual(summary["report_file"], common.REPORT_PATH)
+
+    def gzip_test(self):
+        summary = common.postprocess_results("myprofile", compression="gzip",
+                                             chroot=self.chroot)
+
+        self.assertEqual(summary["results_file"], common.RESULTS_PATH + ".gz")
+        self.assertEqual(summary["report_file"], common.REPORT_PATH + ".gz")
+        self.assertFalse(os.path.exists(self.results_path))
+        self.assertFalse(os.path.exists(self.report_path))
+
+        results = gzip.open(self.results_path + ".gz")
+        self.assertEqual(results.read(), RESULTS)
+        results.close()
+
+    @unittest.skipUnless(common.zstandard or find_executable("zstd"),
+                         "zstd not available")
+    def zstd_test(self):
+        summary = common.postprocess_results("myprofile", compression="zstd",
+                                             chroot=self.chroot)
+
+        self.assertEqual(summary["results_file"], common.RESULTS_PATH + ".zst")
+        self.assertFalse(os.path.exists(self.results_path))
+        self.assertTrue(os.path.exists(self.results_path + ".zst"))
+
+    def no_report_test(self):
+        os.unlink(self.report_path)
+
+        summary = common.postprocess_results("myprofile", compression="gzip",
+                                             chroot=self.chroot)
+        self.assertIsNone(summary["report_file"])
+
+    def arf_test(self):
+        os.rename(self.results_path,
+                  self._chroot_path(common.ARF_RESULTS_PATH))
+
+        summary = common.postprocess_results("myprofile", "arf",
+                                             chroot=self.chroot)
+        self.assertEqual(summary["results_file"], common.ARF_RESULTS_PATH)
+        self.assertEqual(summary["results"], {"fail": 1, "pass": 1})
+
+    def missing_results_test(self):
+        os.unlink(self.results_path)
+
+        with self.assertRaises(common.OSCAPaddonError):
+            common.postprocess_results("myprofile", chroot=self.chroot)
+
+
+class FixRulesCacheTest(unittest.TestCase):
+    """Tests for the FixRulesCache class and its use in get_fix_rules_pre."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.tmp_dir, "cache")
+        self.content_path = os.path.join(self.tmp_dir, "ds.xml")
+        with open(self.content_path, "w") as fobj:
+            fobj.write("<content/>")
+
+        self.cache = common.FixRulesCache(self.cache_dir)
+        self.key = common.FixRulesCache.make_key("myprofile",
+                                                 self.content_path,
+                                                 "mytemplate")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def miss_test(self):
+        self.assertIsNone(self.cache.get(self.key))
+
+    def store_get_test(self):
+        self.cache.store(self.key, "part /tmp\n")
+        self.assertEqual(self.cache.get(self.key), "part /tmp\n")
+
+    def persistent_test(self):
+        self.cache.store(self.key, "part /tmp\n")
+
+        new_cache = common.FixRulesCache(self.cache_dir)
+        self.assertEqual(new_cache.get(self.key), "part /tmp\n")
+
+    def key_depends_on_content_test(self):
+        with open(self.content_path, "w") as fobj:
+            fobj.write("<different_content/>")
+
+        key = common.FixRulesCache.make_key("myprofile", self.content_path,
+                                            "mytemplate")
+        self.assertNotEqual(key, self.key)
+
+    def key_depends_on_ids_test(self):
+        key = common.FixRulesCache.make_key("myprofile", self.content_path,
+                                            "mytemplate", "my_ds_id")
+        self.assertNotEqual(key, self.key)
+
+    def get_fix_rules_pre_cached_test(self):
+        gen_fix = mock.Mock(return_value="part /tmp\n")
+        with mock.patch.object(common, "_fix_rules_cache", self.cache), \
+                mock.patch.object(common, "_run_oscap_gen_fix", gen_fix):
+            rules = common.get_fix_rules_pre("myprofile", self.content_path)
+            rules2 = common.get_fix_rules_pre("myprofile", self.content_path)
+
+        self.assertEqual(rules, "part /tmp\n")
+        self.assertEqual(rules2, "part /tmp\n")
+        self.assertEqual(gen_fix.call_count, 1)
+
+    def get_fix_rules_pre_content_handler_test(self):
+        handler = mock.Mock()
+        handler.get_fix_rules.return_value = "part /tmp\n"
+        gen_fix = mock.Mock()
+        with mock.patch.object(common, "_fix_rules_cache", self.cache), \
+                mock.patch.object(common, "_run_oscap_gen_fix", gen_fix):
+            rules = common.get_fix_rules_pre("myprofile", self.content_path,
+                                             "my_ds_id", "my_xccdf_id",
+                                             content_handler=handler)
+
+        self.assertEqual(rules, "part /tmp\n")
+        handler.get_fix_rules.assert_called_once_with(
+            "myprofile", common.PRE_INSTALL_FIX_SYSTEM_ATTR,
+            "my_ds_id", "my_xccdf_id")
+        self.assertFalse(gen_fix.called)
+
+    def get_fix_rules_pre_content_handler_fallback_test(self):
+        handler = mock.Mock()
+        handler.get_fix_rules.side_effect = common.ContentHandlingError()
+        gen_fix = mock.Mock(return_value="part /tmp\n")
+        with mock.patch.object(common, "_fix_rules_cache", self.cache), \
+                mock.patch.object(common, "_run_oscap_gen_fix", gen_fix):
+            rules = common.get_fix_rules_pre("myprofile", self.content_path,
+                                             content_handler=handler)
+
+        self.assertEqual(rules, "part /tmp\n")
+        self.assertEqual(gen_fix.call_count, 1)
+
+    def get_fix_rules_pre_worker_test(self):
+        handler = mock.Mock()
+        worker = mock.Mock(content_path=self.content_path, tailoring_path="")
+        worker.get_fix_rules.return_value = "part /tmp\n"
+        gen_fix = mock.Mock()
+        with mock.patch.object(common, "_fix_rules_cache", self.cache), \
+                mock.patch.object(common, "_oscap_worker", worker), \
+                mock.patch.object(common, "_run_oscap_gen_fix", gen_fix):
+            rules = common.get_fix_rules_pre("myprofile", self.content_path,
+                                             content_handler=handler)
+
+        # the worker keeping the content loaded is preferred
+        self.assertEqual(rules, "part /tmp\n")
+        self.assertFalse(handler.get_fix_rules.called)
+        self.assertFalse(gen_fix.called)
+
+    def get_fix_rules_pre_worker_fallback_test(self):
+        handler = mock.Mock()
+        worker = mock.Mock(content_path=self.content_path, tailoring_path="")
+        worker.get_fix_rules.side_effect = common.ContentHandlingError()
+        gen_fix = mock.Mock(return_value="part /tmp\n")
+        with mock.patch.object(common, "_fix_rules_cache", self.cache), \
+                mock.patch.object(common, "_oscap_worker", worker), \
+                mock.patch.object(common, "_run_oscap_gen_fix", gen_fix):
+            rules = common.get_fix_rules_pre("myprofile", self.content_path,
+                                             content_handler=handler)
+
+        self.assertEqual(rules, "part /tmp\n")
+        self.assertFalse(handler.get_fix_rules.called)
+        self.assertEqual(gen_fix.call_count, 1)
+
+    def get_fix_rules_pre_other_content_worker_test(self):
+        handler = mock.Mock()
+        handler.get_fix_rules.return_value = "part /tmp\n"
+        worker = mock.Mock(content_path="other.xml", tailoring_path="")
+        with mock.patch.object(common, "_fix_rules_cache", self.cache), \
+                mock.patch.object(common, "_oscap_worker", worker):
+            rules = common.get_fix_rules_pre("myprofile", self.content_path,
+                                             content_handler=handler)
+
+        self.assertEqual(rules, "part /tmp\n")
+        self.assertFalse(worker.get_fix_rules.called)
+
+    def start_oscap_worker_test(self):
+        old_worker = mock.Mock()
+        worker_class = mock.Mock()
+        with mock.patch.object(common, "_oscap_worker", old_worker), \
+                mock.patch.object(common, "OSCAPWorker", worker_class):
+            common.start_oscap_worker(self.content_path)
+            self.assertIs(common._oscap_worker, worker_class.return_value)
+
+        old_worker.stop.assert_called_once_with()
+        worker_class.assert_called_once_with(self.content_path, "")
+        worker_class.return_value.start.assert_called_once_with()
+
+    def get_fix_rules_pre_no_profile_test(self):
+        self.assertEqual(common.get_fix_rules_pre("", self.content_path), "")
+
+    def get_or_generate_once_test(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def generate():
+            started.set()
+            release.wait()
+            return "part /tmp\n"
+
+        generate_mock = mock.Mock(side_effect=generate)
+        results = []
+        run = lambda: results.append(self.cache.get_or_generate(self.key,
+                                                                generate_mock))
+
+        first = threading.Thread(target=run)
+        first.start()
+        started.wait()
+        second = threading.Thread(target=run)
+        second.start()
+        release.set()
+        first.join()
+        second.join()
+
+        self.assertEqual(results, ["part /tmp\n", "part /tmp\n"])
+        self.assertEqual(generate_mock.call_count, 1)
+
+
+class OrderByProximityTest(unittest.TestCase):
+    """Tests for the _order_by_proximity function."""
+
+    def middle_test(self):
+        self.assertEqual(common._order_by_proximity([1, 2, 3, 4, 5], 3),
+                         [3, 4, 2, 5, 1])
+
+    def edge_test(self):
+        self.assertEqual(common._order_by_proximity([1, 2, 3, 4], 1),
+                         [1, 2, 3, 4])
+        self.assertEqual(common._order_by_proximity([1, 2, 3, 4], 4),
+                         [4, 3, 2, 1])
+
+    def no_center_test(self):
+        self.assertEqual(common._order_by_proximity([1, 2, 3], None),
+                         [1, 2, 3])
+
+
+class FixRulesPrecomputerTest(unittest.TestCase):
+    """Tests for the FixRulesPrecomputer class."""
+
+    def all_profiles_test(self):
+        done = threading.Semaphore(0)
+
+        def get_rules(profile, *args):
+            done.release()
+            return ""
+
+        precomputer = common.FixRulesPrecomputer(workers=1)
+        get_rules_mock = mock.Mock(side_effect=get_rules)
+        with mock.patch.object(common, "get_fix_rules_pre", get_rules_mock), \
+                mock.patch.object(common, "PRECOMPUTE_IDLE_TIMEOUT", 0.01):
+            precomputer.schedule(["p1", "p2", "p3"], "ds.xml", first="p2")
+            for _i in range(3):
+                done.acquire()
+
+            # let the idle worker quit
+            while precomputer._workers:
+                time.sleep(0.01)
+
+        profiles = [call[0][0] for call in get_rules_mock.call_args_list]
+        self.assertEqual(profiles, ["p2", "p3", "p1"])
+
+    def unexpected_error_test(self):
+        done = threading.Semaphore(0)
+
+        def get_rules(profile, *args):
+            done.release()
+            if profile == "p1":
+                raise RuntimeError("unexpected")
+            return ""
+
+        precomputer = common.FixRulesPrecomputer(workers=1)
+        get_rules_mock = mock.Mock(side_effect=get_rules)
+        with mock.patch.object(common, "get_fix_rules_pre", get_rules_mock), \
+                mock.patch.object(common, "PRECOMPUTE_IDLE_TIMEOUT", 0.01):
+            precomputer.schedule(["p1", "p2"], "ds.xml")
+            for _i in range(2):
+                done.acquire()
+
+            while precomputer._workers:
+                time.sleep(0.01)
+
+        # the worker went on with the next profile
+        profiles = [call[0][0] for call in get_rules_mock.call_args_list]
+        self.assertEqual(profiles, ["p1", "p2"])
+
+    @mock.patch("org_fedora_oscap.common.AnacondaThread")
+    @mock.patch("org_fedora_oscap.common.threadMgr")
+    def thread_manager_test(self, thread_mgr, anaconda_thread):
+        precomputer = common.FixRulesPrecomputer(workers=2)
+        precomputer.schedule(["p1", "p2", "p3"], "ds.xml")
+
+        # registered with the thread manager under unique names, failures
+        # don't abort the installation
+        self.assertEqual(thread_mgr.add.call_count, 2)
+        names = [call[1]["name"] for call in anaconda_thread.call_args_list]
+        self.assertEqual(len(set(names)), 2)
+        for call in anaconda_thread.call_args_list:
+            self.assertTrue(call[1]["name"].startswith(
+                common.THREAD_PRECOMPUTE_FIX_RULES))
+            self.assertFalse(call[1]["fatal"])
+
+
+class ExtractDataTest(unittest.TestCase):
+    """Tests for the extract_data function."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.out_dir = os.path.join(self.tmp_dir, "out")
+        self.src_dir = os.path.join(self.tmp_dir, "src")
+
+        os.makedirs(os.path.join(self.src_dir, "content"))
+        for (fname, data) in (("content/ds.xml", "<ds/>"),
+                              ("content/tailoring.xml", "<tailoring/>")):
+            with open(os.path.join(self.src_dir, fname), "w") as fobj:
+                fobj.write(data)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _create_tarball(self, suffix, mode):
+        archive = os.path.join(self.tmp_dir, "content" + suffix)
+        with tarfile.open(archive, mode) as tfile:
+            tfile.add(os.path.join(self.src_dir, "content"), "content")
+
+        return archive
+
+    def _check_extracted(self, result):
+        self.assertEqual(sorted(result),
+                         [os.path.join(self.out_dir, "content"),
+                          os.path.join(self.out_dir, "content/ds.xml"),
+                          os.path.join(self.out_dir, "content/tailoring.xml")])
+        with open(os.path.join(self.out_dir, "content/ds.xml")) as fobj:
+            self.assertEqual(fobj.read(), "<ds/>")
+
+    def tarball_test(self):
+        for (suffix, mode) in ((".tar", "w"), (".tar.gz", "w:gz"),
+                               (".tar.bz2", "w:bz2")):
+            archive = self._create_tarball(suffix, mode)
+            result = common.extract_data(archive, self.out_dir,
+                                         ["content/ds.xml"])
+            self._check_extracted(result)
+            shutil.rmtree(self.out_dir)
+
+    def tarball_existing_output_test(self):
+        os.makedirs(os.path.join(self.out_dir, "content"))
+        with open(os.path.join(self.out_dir, "content/other.xml"), "w") as fobj:
+            fobj.write("<other/>")
+        with open(os.path.join(self.out_dir, "content/ds.xml"), "w") as fobj:
+            fobj.write("<old/>")
+
+        archive = self._create_tarball(".tar.gz", "w:gz")
+        self._check_extracted(common.extract_data(archive, self.out_dir, []))
+
+        self.assertEqual([name for name in os.listdir(self.out_dir)
+                          if not name.startswith(".")], ["content"])
+        self.assertEqual(sorted(os.listdir(os.path.join(self.out_dir, "content"))),
+                         ["ds.xml", "other.xml", "tailoring.xml"])
+
+    def tarball_missing_file_test(self):
+        archive = self._create_tarball(".tar.gz", "w:gz")
+        os.makedirs(self.out_dir)
+
+        with self.assertRaises(common.ExtractionError):
+            common.extract_data(archive, self.out_dir, ["content/missing.xml"])
+
+        # nothing extracted
+        self.assertEqual(os.listdir(self.out_dir), [])
+
+    def tarball_content_only_test(self):
+        with open(os.path.join(self.src_dir, "content/README"), "w") as fobj:
+            fobj.write("docs")
+        archive = self._create_tarball(".tar.gz", "w:gz")
+
+        result = common.extract_data(archive, self.out_dir, [],
+                                     content_only=True)
+        self.assertEqual(sorted(result),
+                         [os.path.join(self.out_dir, "content/ds.xml"),
+                          os.path.join(self.out_dir, "content/tailoring.xml")])
+        self.assertFalse(os.path.exists(os.path.join(self.out_dir,
+                                                     "content/README")))
+
+        # the rest extracted later
+        common.extract_data(archive, self.out_dir)
+        self.assertTrue(os.path.exists(os.path.join(self.out_dir,
+                                                    "content/README")))
+
+    def zip_test(self):
+        archive = os.path.join(self.tmp_dir, "content.zip")
+        with zipfile.ZipFile(archive, "w") as zfile:
+            zfile.write(os.path.join(self.src_dir, "content/ds.xml"),
+                        "content/ds.xml")
+            zfile.write(os.path.join(self.src_dir, "content/tailoring.xml"),
+                        "content/tailoring.xml")
+            zfile.writestr("content/check.sh", "exit 0")
+
+        result = common.extract_data(archive, self.out_dir,
+                                     ["content/check.sh"], content_only=True)
+        self.assertEqual(sorted(result),
+                         [os.path.join(self.out_dir, "content/check.sh"),
+                          os.path.join(self.out_dir, "content/ds.xml"),
+                          os.path.join(self.out_dir, "content/tailoring.xml")])
+
+        with self.assertRaises(common.ExtractionError):
+            common.extract_data(archive, self.out_dir, ["content/missing.xml"])
+
+    def zip_parallel_test(self):
+        archive = os.path.join(self.tmp_dir, "content.zip")
+        names = ["content/oval-%d.xml" % i for i in range(20)]
+        names += ["content/sub%d/oval.xml" % i for i in range(5)]
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zfile:
+            for name in names:
+                zfile.writestr(name, name * 100)
+
+        for workers in (1, 4):
+            with mock.patch.object(common, "ZIP_EXTRACT_WORKERS", workers):
+                result = common.extract_data(archive, self.out_dir, [])
+
+            self.assertEqual(result, [os.path.join(self.out_dir, name)
+                                      for name in names])
+            for name in names:
+                with open(os.path.join(self.out_dir, name)) as fobj:
+                    self.assertEqual(fobj.read(), name * 100)
+            shutil.rmtree(self.out_dir)
+
+    def _compress(self, archive, command):
+        with open(archive + command[1], "w") as fobj:
+            subprocess.check_call([command[0], "-c", archive], stdout=fobj)
+
+        return archive + command[1]
+
+    @unittest.skipUnless(find_executable("xz"), "xz not available")
+    def tarball_xz_test(self):
+        archive = self._compress(self._create_tarball(".tar", "w"),
+                                 ("xz", ".xz"))
+
+        result = common.extract_data(archive, self.out_dir, ["content/ds.xml"])
+        self._check_extracted(result)
+
+    @unittest.skipUnless(find_executable("zstd"), "zstd not available")
+    def tarball_zst_test(self):
+        archive = self._compress(self._create_tarball(".tar", "w"),
+                                 ("zstd", ".zst"))
+
+        result = common.extract_data(archive, self.out_dir, ["content/ds.xml"])
+        self._check_extracted(result)
+
+    def tarball_bz2_fallback_test(self):
+        archive = self._create_tarball(".tar.bz2", "w:bz2")
+
+        decompressors = {"bz2": (["non-existing-bzip2", "-dc"],)}
+        with mock.patch.object(common, "TARBALL_DECOMPRESSORS", decompressors):
+            result = common.extract_data(archive, self.out_dir,
+                                         ["content/ds.xml"])
+        self._check_extracted(result)
+
+    def tarball_decompressor_failure_test(self):
+        archive = os.path.join(self.tmp_dir, "content.tar.xz")
+        with open(archive, "w") as fobj:
+            fobj.write("not compressed")
+
+        decompressors = {"xz": (["sh", "-c", "echo failed >&2; exit 1", "sh"],)}
+        with mock.patch.object(common, "TARBALL_DECOMPRESSORS", decompressors):
+            with self.assertRaises(common.ExtractionError):
+                common.extract_data(archive, self.out_dir, [])
+
+    def manifest_test(self):
+        archive = self._create_tarball(".tar.gz", "w:gz")
+        result = common.extract_data(archive, self.out_dir, ["content/ds.xml"])
+
+        with mock.patch("org_fedora_oscap.common._extract_archive") as extract:
+            self.assertEqual(common.extract_data(archive, self.out_dir,
+                                                 ["content/ds.xml"]),
+                             result)
+            self.assertFalse(extract.called)
+
+            # different arguments, different extraction
+            common.extract_data(archive, self.out_dir, [], content_only=True)
+            self.assertTrue(extract.called)
+
+        # the manifest is not copied with the content
+        self.assertTrue(all(name.startswith(".") or name == "content"
+                            for name in os.listdir(self.out_dir)))
+
+    def manifest_changed_file_test(self):
+        archive = self._create_tarball(".tar.gz", "w:gz")
+        common.extract_data(archive, self.out_dir, [])
+
+        ds_path = os.path.join(self.out_dir, "content/ds.xml")
+        with open(ds_path, "w") as fobj:
+            fobj.write("<changed/>")
+
+        common.extract_data(archive, self.out_dir, [])
+        with open(ds_path) as fobj:
+            self.assertEqual(fobj.read(), "<ds/>")
+
+    def tarball_invalid_test(self):
+        archive = os.path.join(self.tmp_dir, "content.tar.gz")
+        with open(archive, "w") as fobj:
+            fobj.write("not a tarball")
+
+        with self.assertRaises(common.ExtractionError):
+            common.extract_data(archive, self.out_dir, [])
+
+
+def make_cpio(entries):
+    """
+    Create a "new" ASCII (SVR4) cpio archive with the given entries.
+
+    :param entries: (name, mode, data) tuples
+    :rtype: str
+
+    """
+
+    pad = lambda size: "\0" * ((4 - size % 4) % 4)
+
+    archive = ""
+    for (name, mode, data) in entries + [("TRAILER!!!", 0, "")]:
+        name += "\0"
+        fields = [0, mode, 0, 0, 1, 0, len(data), 0, 0, 0, 0, len(name), 0]
+        header = "070701" + "".join("%08X" % field for field in fields)
+        archive += header + name + pad(len(header + name))
+        archive += data + pad(len(data))
+
+    return archive
+
+
+def make_rpm_header(tags, pad=False):
+    """
+    Create an RPM header structure with the given string tags.
+
+    :type tags: dict(int -> str)
+    :rtype: str
+
+    """
+
+    index = ""
+    data = ""
+    for (tag, value) in sorted(tags.items()):
+        index += struct.pack(">iiii", tag, 6, len(data), 1)
+        data += value + "\0"
+
+    header = "\x8e\xad\xe8\x01\0\0\0\0"
+    header += struct.pack(">II", len(tags), len(data)) + index + data
+    if pad:
+        header += "\0" * ((8 - len(data) % 8) % 8)
+
+    return header
+
+
+def make_rpm(payload, compressor="gzip"):
+    """Create an RPM with the given (compressed) cpio payload."""
+
+    lead = "\xed\xab\xee\xdb" + "\0" * 92
+    signature = make_rpm_header({1000: "sig"}, pad=True)
+    header = make_rpm_header({1124: "cpio", 1125: compressor})
+
+    return lead + signature + header + payload
+
+
+def gzip_data(data):
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+class DecompressingReaderTest(unittest.TestCase):
+    """Tests for the reader decompressing RPM payloads."""
+
+    def setUp(self):
+        self.data = "".join(chr(i % 251) for i in range(100000))
+
+    @mock.patch("org_fedora_oscap.common.DECOMPRESS_CHUNK_SIZE", 1000)
+    def read_sizes_test(self):
+        reader = common._DecompressingReader(StringIO(gzip_data(self.data)),
+                                             common._get_decompressor("gzip"))
+
+        parts = []
+        for size in itertools.cycle((1, 7, 4096, 333)):
+            part = reader.read(size)
+            if not part:
+                break
+            parts.append(part)
+
+        self.assertEqual("".join(parts), self.data)
+
+    def read_all_test(self):
+        reader = common._DecompressingReader(StringIO(bz2.compress(self.data)),
+                                             common._get_decompressor("bzip2"))
+
+        self.assertEqual(reader.read(len(self.data) + 10), self.data)
+        self.assertEqual(reader.read(10), "")
+
+    def invalid_data_test(self):
+        reader = common._DecompressingReader(StringIO("not gzipped"),
+                                             common._get_decompressor("gzip"))
+
+        with self.assertRaises(common.ExtractionError):
+            reader.read(10)
+
+
+class ExtractRPMTest(unittest.TestCase):
+    """Tests for the extraction of RPMs."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.out_dir = os.path.join(self.tmp_dir, "out")
+        os.makedirs(self.out_dir)
+
+        entries = [("./usr/share/content", stat.S_IFDIR | 0o755, ""),
+                   ("./usr/share/content/ds.xml", stat.S_IFREG | 0o644, "<ds/>"),
+                   ("./usr/share/content/link.xml", stat.S_IFLNK | 0o777, "ds.xml"),
+                   ("./usr/share/doc/README", stat.S_IFREG | 0o644, "docs"),
+                   ]
+        self.cpio = make_cpio(entries)
+        self.rpm_path = os.path.join(self.tmp_dir, "content.rpm")
+        self._write_rpm(make_rpm(gzip_data(self.cpio)))
+
+        self.popen = mock.Mock(side_effect=self._run_rpm2cpio)
+        patcher = mock.patch("org_fedora_oscap.common.subprocess.Popen",
+                             self.popen)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _write_rpm(self, data):
+        with open(self.rpm_path, "w") as fobj:
+            fobj.write(data)
+
+    def _run_rpm2cpio(self, args, stdout):
+        self.assertEqual(args, ["rpm2cpio", self.rpm_path])
+
+        cpio_path = os.path.join(self.tmp_dir, "payload.cpio")
+        with open(cpio_path, "w") as fobj:
+            fobj.write(self.cpio)
+
+        proc = mock.Mock()
+        proc.stdout = open(cpio_path, "r")
+        proc.returncode = 0
+        return proc
+
+    def _check_extracted(self, result, docs=True):
+        content_dir = os.path.join(self.out_dir, "usr/share/content")
+        expected = [content_dir, os.path.join(content_dir, "ds.xml"),
+                    os.path.join(content_dir, "link.xml")]
+        if docs:
+            expected.append(os.path.join(self.out_dir, "usr/share/doc/README"))
+        else:
+            # only the files that may be content
+            expected = expected[1:]
+        self.assertEqual(result, expected)
+
+        with open(os.path.join(content_dir, "link.xml")) as fobj:
+            self.assertEqual(fobj.read(), "<ds/>")
+        self.assertEqual(os.path.exists(os.path.join(self.out_dir,
+                                                     "usr/share/doc")),
+                         docs)
+
+    def extract_test(self):
+        result = common.extract_data(self.rpm_path, self.out_dir,
+                                     ["usr/share/content/ds.xml"])
+
+        # read in-process
+        self.assertFalse(self.popen.called)
+        self._check_extracted(result)
+
+    def extract_content_only_test(self):
+        result = common.extract_data(self.rpm_path, self.out_dir,
+                                     ["usr/share/content/ds.xml"],
+                                     content_only=True)
+
+        self._check_extracted(result, docs=False)
+
+    def extract_rpm2cpio_test(self):
+        self._write_rpm(make_rpm("compressed data", "unknown"))
+        result = common.extract_data(self.rpm_path, self.out_dir,
+                                     ["usr/share/content/ds.xml"])
+
+        self.assertTrue(self.popen.called)
+        self._check_extracted(result)
+
+    def missing_file_test(self):
+        with self.assertRaises(common.ExtractionError):
+            common.extract_data(self.rpm_path, self.out_dir,
+                                ["usr/share/content/missing.xml"])
+
+        # nothing left behind
+        self.assertEqual(os.listdir(self.out_dir), [])
+
+    def truncated_payload_test(self):
+        self._write_rpm(make_rpm(gzip_data(self.cpio[:200])))
+
+        with self.assertRaises(common.ExtractionError):
+            common.extract_data(self.rpm_path, self.out_dir, [])
+
+        self.assertEqual(os.listdir(self.out_dir), [])
+
+    def invalid_payload_test(self):
+        self._write_rpm(make_rpm("not gzipped data"))
+
+        with self.assertRaises(common.ExtractionError):
+            common.extract_data(self.rpm_path, self.out_dir, [])
+
+    def not_rpm_test(self):
+        self._write_rpm("not an RPM")
+
+        with self.assertRaises(common.ExtractionError):
+            common.extract_data(self.rpm_path, self.out_dir, [])
+
+
+class InstallRPMsTest(unittest.TestCase):
+    """Tests for installing RPMs with the rpm Python bindings."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.rpm_path = os.path.join(self.tmp_dir, "content.rpm")
+        with open(self.rpm_path, "w") as fobj:
+            fobj.write("RPM data")
+
+        patcher = mock.patch("org_fedora_oscap.common.rpm")
+        self.rpm = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.rpm.error = RuntimeError
+        self.trans = self.rpm.TransactionSet.return_value
+        self.trans.run.return_value = None
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def install_test(self):
+        def run(callback, data):
+            # rpm opens and closes the package file through the callback
+            fileno = callback(self.rpm.RPMCALLBACK_INST_OPEN_FILE, 0, 0,
+                              self.rpm_path, data)
+            self.assertTrue(os.fstat(fileno))
+            callback(self.rpm.RPMCALLBACK_INST_CLOSE_FILE, 0, 0,
+                     self.rpm_path, data)
+        self.trans.run.side_effect = run
+
+        common.install_rpms([self.rpm_path], "/mnt/sysimage")
+
+        self.rpm.TransactionSet.assert_called_once_with("/mnt/sysimage")
+        self.trans.addInstall.assert_called_once_with(
+            self.trans.hdrFromFdno.return_value, self.rpm_path, "i")
+        # dependencies not checked
+        self.assertFalse(self.trans.check.called)
+        self.assertTrue(self.trans.closeDB.called)
+
+    def problems_test(self):
+        self.trans.run.return_value = ["conflict with something"]
+
+        with self.assertRaisesRegexp(common.ExtractionError,
+                                     "conflict with something"):
+            common.install_rpms([self.rpm_path])
+
+    def invalid_rpm_test(self):
+        self.trans.hdrFromFdno.side_effect = self.rpm.error("bad header")
+
+        with self.assertRaisesRegexp(common.ExtractionError, "bad header"):
+            common.install_rpms([self.rpm_path])
+        self.assertFalse(self.trans.run.called)
+
+    def add_install_failure_test(self):
+        self.trans.addInstall.side_effect = self.rpm.error("bad package")
+
+        with self.assertRaisesRegexp(common.ExtractionError, "bad package"):
+            common.install_rpms([self.rpm_path])
+        self.assertFalse(self.trans.run.called)
+        self.assertTrue(self.trans.closeDB.called)
+
+    def open_failure_test(self):
+        def run(callback, data):
+            os.unlink(self.rpm_path)
+            self.assertIsNone(callback(self.rpm.RPMCALLBACK_INST_OPEN_FILE,
+                                       0, 0, self.rpm_path, data))
+        self.trans.run.side_effect = run
+
+        with self.assertRaisesRegexp(common.ExtractionError,
+                                     "Failed to open RPM"):
+            common.install_rpms([self.rpm_path])
+
+    def no_bindings_test(self):
+        with mock.patch("org_fedora_oscap.common.rpm", None):
+            with self.assertRaises(common.ExtractionError):
+                common.install_rpms([self.rpm_path])
+
+
 if __name__ == "__main__":
     unittest.main()
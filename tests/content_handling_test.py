@@ -21,11 +21,35 @@
 """Module with unit tests for the content_handling.py module"""
 
 import unittest
+import os
+import shutil
+import tempfile
 import mock
 
 from org_fedora_oscap import common
+from org_fedora_oscap import utils
 from org_fedora_oscap import content_handling as ch
 
+# XCCDF results of an evaluation (shortened)
+RESULTS = """<?xml version="1.0" encoding="UTF-8"?>
+<Benchmark xmlns="http://checklists.nist.gov/xccdf/1.2" id="xccdf_b_benchmark_first">
+  <TestResult id="xccdf_org.open-scap_testresult_default">
+    <rule-result idref="xccdf_com.example_rule_tmp_part">
+      <result>fail</result>
+    </rule-result>
+    <rule-result idref="xccdf_com.example_rule_passwd_min_len">
+      <result>fixed</result>
+    </rule-result>
+    <rule-result idref="xccdf_com.example_rule_telnet_not_installed">
+      <result>pass</result>
+    </rule-result>
+    <rule-result idref="xccdf_com.example_rule_iptables_installed">
+      <result>fail</result>
+    </rule-result>
+  </TestResult>
+</Benchmark>
+"""
+
 
 class DataStreamHandlerTest(unittest.TestCase):
     """Test functionality of the DataStreanHandler'."""
@@ -90,6 +114,30 @@ class DataStreamHandlerTest(unittest.TestCase):
         self.assertEqual(self.profile1_id, profile_ids[0].id)
         self.assertEqual(self.profile2_id, profile_ids[1].id)
 
+    def get_fix_rules_test(self):
+        self.ds_handler = ch.DataStreamHandler(self.ds_filepath)
+        rules = self.ds_handler.get_fix_rules(self.profile2_id,
+                                              common.PRE_INSTALL_FIX_SYSTEM_ATTR,
+                                              self.ds_ids, self.chk_first_id)
+
+        self.assertEqual(rules, "package --remove=telnet\n"
+                                "package --add=iptables\n")
+
+    def get_fix_rules_default_ids_test(self):
+        self.ds_handler = ch.DataStreamHandler(self.ds_filepath)
+        rules = self.ds_handler.get_fix_rules(self.profile2_id,
+                                              common.PRE_INSTALL_FIX_SYSTEM_ATTR)
+
+        self.assertEqual(rules, "package --remove=telnet\n"
+                                "package --add=iptables\n")
+
+    def get_fix_rules_invalid_profile_test(self):
+        self.ds_handler = ch.DataStreamHandler(self.ds_filepath)
+        with self.assertRaises(ch.ContentHandlingError):
+            self.ds_handler.get_fix_rules("invalid.id",
+                                          common.PRE_INSTALL_FIX_SYSTEM_ATTR,
+                                          self.ds_ids, self.chk_first_id)
+
     def get_profiles_with_default(self):
         self.ds_handler = ch.DataStreamHandler(self.ds_filepath)
         profile_ids = self.ds_handler.get_profiles(self.ds_ids,
@@ -100,3 +148,636 @@ class DataStreamHandlerTest(unittest.TestCase):
         self.assertEqual(2, len(profile_ids))
         self.assertEqual("default", profile_ids[0].id)
         self.assertEqual(self.profile3_id, profile_ids[1].id)
+
+
+class BenchmarkHandlerTest(unittest.TestCase):
+    """Test functionality of the BenchmarkHandler."""
+
+    def setUp(self):
+        self.xccdf_filepath = "../testing_files/test_report_anaconda_fixes.xccdf.xml"
+        self.profile_id = "xccdf_moc.elpmaxe.www_profile_1"
+
+    def get_fix_rules_subs_and_comments_test(self):
+        handler = ch.BenchmarkHandler(self.xccdf_filepath)
+        rules = handler.get_fix_rules(self.profile_id,
+                                      common.PRE_INSTALL_FIX_SYSTEM_ATTR)
+
+        # <sub> elements resolved with the refined value, comments stripped
+        self.assertEqual(rules, "part /tmp\n"
+                                "part /tmp --mountoptions=nodev\n"
+                                "passwd --minlen=14\n")
+
+
+class FixRulesCallPathTest(unittest.TestCase):
+    """
+    Test getting the fix rules through get_fix_rules_pre with the handlers
+    the spoke uses.
+
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.xccdf_filepath = os.path.abspath(
+            "../testing_files/test_report_anaconda_fixes.xccdf.xml")
+        self.profile_id = "xccdf_moc.elpmaxe.www_profile_1"
+
+        # neither cached rules nor the oscap tool may be used (and the real
+        # utils module, other tests replace it)
+        patchers = [mock.patch.object(common, "utils", utils),
+                    mock.patch.object(common, "_fix_rules_cache",
+                                      common.FixRulesCache(self.tmp_dir)),
+                    mock.patch.object(common, "_run_oscap_gen_fix",
+                                      side_effect=AssertionError("oscap run"))]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        common.stop_oscap_worker()
+        shutil.rmtree(self.tmp_dir)
+
+    def _check_rules(self, rules):
+        # <sub> elements resolved with the refined value, comments stripped
+        self.assertEqual(rules, "part /tmp\n"
+                                "part /tmp --mountoptions=nodev\n"
+                                "passwd --minlen=14\n")
+
+    def cached_content_handler_test(self):
+        handler = ch.CachedContentHandler(ch.BenchmarkHandler,
+                                          self.xccdf_filepath, "",
+                                          self.tmp_dir)
+        rules = common.get_fix_rules_pre(self.profile_id, self.xccdf_filepath,
+                                         content_handler=handler)
+
+        self._check_rules(rules)
+
+    def worker_test(self):
+        common.start_oscap_worker(self.xccdf_filepath)
+        rules = common.get_fix_rules_pre(self.profile_id, self.xccdf_filepath)
+
+        self._check_rules(rules)
+
+
+class ResolveFixTest(unittest.TestCase):
+    """Test resolving of the fix elements through the policy."""
+
+    def setUp(self):
+        self.oscap = mock.Mock()
+        self.oscap.xccdf_policy_resolve_fix_substitution.return_value = 0
+
+        patcher = mock.patch("org_fedora_oscap.content_handling.OSCAP",
+                             self.oscap)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def resolved_clone_test(self):
+        self.oscap.xccdf_fix_get_content.return_value = \
+            "\n<!--effect passwords created\n during installation-->\n" \
+            "passwd --minlen=14\n"
+
+        content = ch._resolve_fix("policy", "fix")
+
+        self.assertEqual(content.strip(), "passwd --minlen=14")
+        clone = self.oscap.xccdf_fix_clone.return_value
+        self.oscap.xccdf_fix_clone.assert_called_once_with("fix")
+        self.oscap.xccdf_policy_resolve_fix_substitution.assert_called_once_with(
+            "policy", clone, None, None)
+        self.oscap.xccdf_fix_get_content.assert_called_once_with(clone)
+        self.oscap.xccdf_fix_free.assert_called_once_with(clone)
+
+    def resolve_failure_test(self):
+        self.oscap.xccdf_policy_resolve_fix_substitution.return_value = 1
+        self.oscap.oscap_err_desc.return_value = "unknown value"
+
+        with self.assertRaises(ch.ContentHandlingError) as e:
+            ch._resolve_fix("policy", "fix")
+        self.assertIn("unknown value", str(e.exception))
+
+        # the clone is freed anyway
+        self.oscap.xccdf_fix_free.assert_called_once_with(
+            self.oscap.xccdf_fix_clone.return_value)
+
+
+class DataStreamHandlerSessionPoolTest(unittest.TestCase):
+    """Test the pool of loaded sessions of the DataStreamHandler."""
+
+    def setUp(self):
+        self.oscap = mock.Mock()
+        self.oscap.xccdf_session_load.return_value = 0
+        self.oscap.ds_stream_index_iterator_has_more.return_value = False
+        self.oscap.xccdf_session_new.side_effect = lambda fpath: mock.Mock()
+
+        patcher = mock.patch("org_fedora_oscap.content_handling.OSCAP",
+                             self.oscap)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.handler = ch.DataStreamHandler("../testing_files/testing_ds.xml",
+                                            session_pool_size=2)
+
+    def _load(self, ds_id, chk_id):
+        with self.handler._lock:
+            self.handler._load_session(ds_id, chk_id)
+
+    def reuse_test(self):
+        self._load("ds1", "chk1")
+        self._load("ds1", "chk1")
+
+        self.assertEqual(self.handler.session_pool_stats,
+                         {"hits": 1, "misses": 1, "sessions": 1})
+        # the initial session and the one for the pair
+        self.assertEqual(self.oscap.xccdf_session_new.call_count, 2)
+
+    def lru_eviction_test(self):
+        self._load("ds1", "chk1")
+        self._load("ds1", "chk2")
+        self._load("ds1", "chk1")
+        # evicts ("ds1", "chk2") as the least recently used one
+        self._load("ds1", "chk3")
+        self._load("ds1", "chk1")
+
+        self.assertEqual(self.handler.session_pool_stats,
+                         {"hits": 2, "misses": 3, "sessions": 2})
+        self.assertEqual(list(self.handler._sessions.keys()),
+                         [("ds1", "chk3"), ("ds1", "chk1")])
+
+        self._load("ds1", "chk2")
+        self.assertEqual(self.handler.session_pool_stats["misses"], 4)
+
+    def no_stale_sds_index_test(self):
+        self._load("ds1", "chk1")
+
+        # the initial session (owning the sds index) is freed
+        self.assertIsNone(self.handler._session)
+        self.assertFalse(hasattr(self.handler, "_sds_idx"))
+
+    def failed_load_test(self):
+        self.oscap.xccdf_session_load.return_value = 1
+        with self.assertRaises(ch.DataStreamHandlingError):
+            self._load("ds1", "chk1")
+
+        self.assertEqual(self.handler.session_pool_stats["sessions"], 0)
+
+
+class FixesIndexTest(unittest.TestCase):
+    """Test functionality of the FixesIndex class."""
+
+    def setUp(self):
+        self.ds_filepath = "../testing_files/testing_ds.xml"
+        self.xccdf_filepath = "../testing_files/xccdf.xml"
+        self.tailoring_filepath = "../testing_files/tailoring.xml"
+        self.ds_id = "scap_org.open-scap_datastream_tst"
+        self.chk_first_id = "scap_org.open-scap_cref_first-xccdf.xml"
+        self.chk_second_id = "scap_org.open-scap_cref_second-xccdf.xml"
+        self.profile1_id = "xccdf_com.example_profile_my_profile"
+        self.profile2_id = "xccdf_com.example_profile_my_profile2"
+        self.template = common.PRE_INSTALL_FIX_SYSTEM_ATTR
+
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def ds_profile_test(self):
+        index = ch.FixesIndex(self.ds_filepath, self.template)
+        rules = index.get_fix_rules(self.profile1_id, self.template,
+                                    self.ds_id, self.chk_first_id)
+
+        self.assertEqual(rules, 'part /tmp --mountoptions="nodev,noauto"\n'
+                                "passwd --minlen=10\n"
+                                "package --remove=telnet\n"
+                                "package --add=iptables\n")
+
+    def ds_default_ids_test(self):
+        index = ch.FixesIndex(self.ds_filepath, self.template)
+        rules = index.get_fix_rules(self.profile2_id, self.template)
+
+        self.assertEqual(rules, "package --remove=telnet\n"
+                                "package --add=iptables\n")
+
+    def ds_default_profile_test(self):
+        index = ch.FixesIndex(self.ds_filepath, self.template)
+        rules = index.get_fix_rules("default", self.template,
+                                    self.ds_id, self.chk_second_id)
+
+        # the selected rule has no pre-installation fix
+        self.assertEqual(rules, "")
+
+    def subs_and_comments_test(self):
+        index = ch.FixesIndex("../testing_files/test_report_anaconda_fixes.xccdf.xml",
+                              self.template)
+        rules = index.get_fix_rules("xccdf_moc.elpmaxe.www_profile_1",
+                                    self.template)
+
+        self.assertEqual(rules, "part /tmp\n"
+                                "part /tmp --mountoptions=nodev\n"
+                                "passwd --minlen=14\n")
+
+    def ds_invalid_checklist_test(self):
+        index = ch.FixesIndex(self.ds_filepath, self.template)
+        with self.assertRaises(ch.DataStreamHandlingError):
+            index.get_fix_rules(self.profile1_id, self.template,
+                                self.ds_id, "invalid.id")
+
+    def benchmark_profile_test(self):
+        index = ch.FixesIndex(self.xccdf_filepath, self.template)
+        rules = index.get_fix_rules(self.profile2_id, self.template)
+
+        self.assertEqual(rules, "package --remove=telnet\n"
+                                "package --add=iptables\n")
+
+    def tailoring_test(self):
+        index = ch.FixesIndex(self.xccdf_filepath, self.template,
+                              self.tailoring_filepath)
+        rules = index.get_fix_rules(self.profile1_id + "_tailored",
+                                    self.template)
+
+        self.assertEqual(rules, 'part /tmp --mountoptions="nodev,noauto"\n'
+                                "passwd --minlen=10\n"
+                                "package --add=iptables\n")
+
+    def invalid_profile_test(self):
+        index = ch.FixesIndex(self.xccdf_filepath, self.template)
+        with self.assertRaises(ch.ContentHandlingError):
+            index.get_fix_rules("invalid.id", self.template)
+
+    def other_template_test(self):
+        index = ch.FixesIndex(self.xccdf_filepath, self.template)
+        with self.assertRaises(ch.ContentHandlingError):
+            index.get_fix_rules(self.profile2_id, "urn:xccdf:fix:script:sh")
+
+    def invalid_file_test(self):
+        index = ch.FixesIndex("../testing_files/testing_ks.cfg", self.template)
+        with self.assertRaises(ch.ContentHandlingError):
+            index.get_fix_rules(self.profile2_id, self.template)
+
+    def groups_and_values_test(self):
+        xccdf_path = os.path.join(self.tmp_dir, "xccdf.xml")
+        with open(xccdf_path, "w") as fobj:
+            fobj.write("""<?xml version="1.0" encoding="utf-8"?>
+<Benchmark xmlns="http://checklists.nist.gov/xccdf/1.2" id="xccdf_b_benchmark_b">
+  <Profile id="xccdf_b_profile_p">
+    <select idref="xccdf_b_group_off" selected="true"/>
+    <refine-value idref="xccdf_b_value_len" selector="long"/>
+  </Profile>
+  <Value id="xccdf_b_value_len">
+    <value>8</value>
+    <value selector="long">14</value>
+  </Value>
+  <Group id="xccdf_b_group_off" selected="false">
+    <Rule id="xccdf_b_rule_passwd" selected="true">
+      <fix system="urn:redhat:anaconda:pre">passwd --minlen=<sub idref="xccdf_b_value_len"/></fix>
+    </Rule>
+  </Group>
+</Benchmark>
+""")
+
+        index = ch.FixesIndex(xccdf_path, self.template)
+        self.assertEqual(index.get_fix_rules("default", self.template), "")
+        self.assertEqual(index.get_fix_rules("xccdf_b_profile_p",
+                                             self.template),
+                         "passwd --minlen=14\n")
+
+
+class DataStreamIndexHandlerTest(unittest.TestCase):
+    """Test functionality of the DataStreamIndexHandler."""
+
+    def setUp(self):
+        self.ds_filepath = "../testing_files/testing_ds.xml"
+        self.ds_ids = "scap_org.open-scap_datastream_tst"
+        self.chk_first_id = "scap_org.open-scap_cref_first-xccdf.xml"
+        self.chk_second_id = "scap_org.open-scap_cref_second-xccdf.xml"
+        self.profile1_id = "xccdf_com.example_profile_my_profile"
+        self.profile2_id = "xccdf_com.example_profile_my_profile2"
+        self.profile3_id = "xccdf_com.example_profile_my_profile3"
+
+    def init_invalid_file_path_test(self):
+        with self.assertRaises(ch.DataStreamHandlingError) as e:
+            ch.DataStreamIndexHandler("testing_ds.xml")
+        self.assertIn("Invalid file path", e.exception.message)
+
+    def init_not_scap_content_test(self):
+        with self.assertRaises(ch.DataStreamHandlingError) as e:
+            ch.DataStreamIndexHandler("../testing_files/testing_ks.cfg")
+        self.assertIn("not a valid SCAP content file", e.exception.message)
+
+    def init_xccdf_content_test(self):
+        with self.assertRaises(ch.DataStreamHandlingError) as e:
+            ch.DataStreamIndexHandler("../testing_files/xccdf.xml")
+        self.assertIn("not a data stream collection", e.exception.message)
+
+    def get_data_streams_checklists_test(self):
+        expected_ids = {self.ds_ids: [self.chk_first_id, self.chk_second_id]}
+
+        ds_handler = ch.DataStreamIndexHandler(self.ds_filepath)
+        self.assertEqual(ds_handler.get_data_streams(), [self.ds_ids])
+        self.assertDictEqual(expected_ids,
+                             ds_handler.get_data_streams_checklists())
+
+    def get_checklists_invalid_test(self):
+        ds_handler = ch.DataStreamIndexHandler(self.ds_filepath)
+        with self.assertRaises(ch.DataStreamHandlingError) as e:
+            ds_handler.get_checklists("invalid.id")
+        self.assertIn("Invalid data stream id given", e.exception.message)
+
+    def get_profiles_test(self):
+        ds_handler = ch.DataStreamIndexHandler(self.ds_filepath)
+        profiles = ds_handler.get_profiles(self.ds_ids, self.chk_first_id)
+
+        # no rules selected by default -> no default profile
+        self.assertEqual([profile.id for profile in profiles],
+                         [self.profile1_id, self.profile2_id])
+        self.assertEqual(profiles[0].title, "My testing profile")
+        self.assertEqual(profiles[0].description,
+                         "A profile for testing purposes.")
+
+    def get_profiles_with_default_test(self):
+        ds_handler = ch.DataStreamIndexHandler(self.ds_filepath)
+        profiles = ds_handler.get_profiles(self.ds_ids, self.chk_second_id)
+
+        self.assertEqual([profile.id for profile in profiles],
+                         ["default", self.profile3_id])
+
+    def get_fix_rules_test(self):
+        ds_handler = ch.DataStreamIndexHandler(self.ds_filepath)
+        rules = ds_handler.get_fix_rules(self.profile2_id,
+                                         common.PRE_INSTALL_FIX_SYSTEM_ATTR,
+                                         self.ds_ids, self.chk_first_id)
+
+        self.assertEqual(rules, "package --remove=telnet\n"
+                                "package --add=iptables\n")
+
+
+class BenchmarkIndexHandlerTest(unittest.TestCase):
+    """Test functionality of the BenchmarkIndexHandler."""
+
+    def profiles_test(self):
+        handler = ch.BenchmarkIndexHandler("../testing_files/xccdf.xml",
+                                           "../testing_files/tailoring.xml")
+
+        self.assertEqual([profile.id for profile in handler.profiles],
+                         ["xccdf_com.example_profile_my_profile",
+                          "xccdf_com.example_profile_my_profile2",
+                          "xccdf_com.example_profile_my_profile2_tailored",
+                          "xccdf_com.example_profile_my_profile_tailored"])
+
+    def data_stream_test(self):
+        # the first benchmark from the data stream is used
+        handler = ch.BenchmarkIndexHandler("../testing_files/testing_ds.xml")
+
+        self.assertEqual([profile.id for profile in handler.profiles],
+                         ["xccdf_com.example_profile_my_profile",
+                          "xccdf_com.example_profile_my_profile2"])
+
+    def invalid_content_test(self):
+        with self.assertRaises(ch.BenchmarkHandlingError):
+            ch.BenchmarkIndexHandler("../testing_files/testing_ks.cfg")
+
+    def markup_test(self):
+        elem = ch.ElementTree.fromstring(
+            '<description xmlns:html="http://www.w3.org/1999/xhtml">'
+            'Items:<html:ul><html:li>one</html:li><html:li>two</html:li>'
+            '</html:ul></description>')
+
+        self.assertEqual(ch._markup_to_text(elem),
+                         ch.parse_HTML_from_content(
+                             "Items:<html:ul><html:li>one</html:li>"
+                             "<html:li>two</html:li></html:ul>"))
+
+
+class CachedContentHandlerTest(unittest.TestCase):
+    """Test functionality of the CachedContentHandler."""
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.create_handler = mock.Mock(
+            side_effect=lambda: ch.DataStreamIndexHandler(
+                "../testing_files/testing_ds.xml"))
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def _get_handler(self, handler_cls=ch.DataStreamHandler,
+                     fpath="../testing_files/testing_ds.xml"):
+        return ch.CachedContentHandler(handler_cls, fpath, "", self.cache_dir,
+                                       self.create_handler)
+
+    def index_created_test(self):
+        handler = self._get_handler()
+
+        self.assertEqual(self.create_handler.call_count, 1)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+        self.assertEqual(handler.get_data_streams(),
+                         ["scap_org.open-scap_datastream_tst"])
+        self.assertEqual(handler.get_checklists(
+                            "scap_org.open-scap_datastream_tst"),
+                         ["scap_org.open-scap_cref_first-xccdf.xml",
+                          "scap_org.open-scap_cref_second-xccdf.xml"])
+
+    def index_loaded_test(self):
+        self._get_handler()
+        handler = self._get_handler()
+
+        # no content handler needed for the second time
+        self.assertEqual(self.create_handler.call_count, 1)
+        self.assertEqual(handler.get_data_streams_checklists(),
+                         {"scap_org.open-scap_datastream_tst":
+                          ["scap_org.open-scap_cref_first-xccdf.xml",
+                           "scap_org.open-scap_cref_second-xccdf.xml"]})
+
+        profiles = handler.get_profiles("scap_org.open-scap_datastream_tst",
+                                        "scap_org.open-scap_cref_second-xccdf.xml")
+        self.assertEqual([profile.id for profile in profiles],
+                         ["default", "xccdf_com.example_profile_my_profile3"])
+        self.assertTrue(all(isinstance(profile, ch.ProfileInfo)
+                            for profile in profiles))
+
+    def invalid_index_test(self):
+        self._get_handler()
+        index_path = os.path.join(self.cache_dir, os.listdir(self.cache_dir)[0])
+        with open(index_path, "w") as fobj:
+            fobj.write("{not json")
+
+        handler = self._get_handler()
+        self.assertEqual(self.create_handler.call_count, 2)
+        self.assertEqual(handler.get_data_streams(),
+                         ["scap_org.open-scap_datastream_tst"])
+
+    def benchmark_test(self):
+        self.create_handler.side_effect = lambda: ch.BenchmarkIndexHandler(
+            "../testing_files/xccdf.xml")
+        self._get_handler(ch.BenchmarkHandler, "../testing_files/xccdf.xml")
+        handler = self._get_handler(ch.BenchmarkHandler,
+                                    "../testing_files/xccdf.xml")
+
+        self.assertEqual(self.create_handler.call_count, 1)
+        self.assertEqual([profile.id for profile in handler.profiles],
+                         ["xccdf_com.example_profile_my_profile",
+                          "xccdf_com.example_profile_my_profile2"])
+
+    def fix_rules_test(self):
+        self._get_handler()
+        handler = self._get_handler()
+
+        rules = handler.get_fix_rules("xccdf_com.example_profile_my_profile2",
+                                      "urn:redhat:anaconda:pre")
+        self.assertEqual(rules, "package --remove=telnet\n"
+                                "package --add=iptables\n")
+
+        # the content handler loaded on demand
+        self.assertEqual(self.create_handler.call_count, 2)
+
+    def fix_rules_delegated_test(self):
+        content_handler = mock.Mock()
+        content_handler.get_profiles.return_value = []
+        content_handler.get_data_streams.return_value = ["ds"]
+        content_handler.get_checklists.return_value = ["chk"]
+        content_handler.get_fix_rules.return_value = "part /tmp\n"
+        self.create_handler.side_effect = lambda: content_handler
+
+        handler = self._get_handler()
+        rules = handler.get_fix_rules("profile", "urn:redhat:anaconda:pre",
+                                      "ds", "chk")
+
+        self.assertEqual(rules, "part /tmp\n")
+        content_handler.get_fix_rules.assert_called_once_with(
+            "profile", "urn:redhat:anaconda:pre", "ds", "chk")
+        # the handler used for the index is reused
+        self.assertEqual(self.create_handler.call_count, 1)
+
+
+class ExploreContentFilesTest(unittest.TestCase):
+    """Test finding content files by their document types."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _write_file(self, name, content):
+        fpath = os.path.join(self.tmp_dir, name)
+        with open(fpath, "w") as fobj:
+            fobj.write(content)
+        return fpath
+
+    def sniff_doc_type_test(self):
+        doc_types = [("../testing_files/testing_ds.xml", "Source Data Stream"),
+                     ("../testing_files/xccdf.xml", "XCCDF Checklist"),
+                     ("../testing_files/testing_xccdf.xml", "XCCDF Checklist"),
+                     ("../testing_files/tailoring.xml", "XCCDF Tailoring"),
+                     ("../testing_files/scap-mycheck-oval.xml", None),
+                     ("../testing_files/testing_ks.cfg", None),
+                     ]
+
+        for (fpath, doc_type) in doc_types:
+            self.assertEqual(ch._sniff_doc_type(fpath), (True, doc_type))
+
+    def sniff_cpe_dictionary_test(self):
+        fpath = self._write_file("cpe-dict.xml",
+                                 '<?xml version="1.0"?>\n'
+                                 '<!-- comment with <tags> -->\n'
+                                 "<cpe:cpe-list xmlns:cpe='%s'/>"
+                                 % ch.CPE_DICT_NAMESPACE)
+
+        self.assertEqual(ch._sniff_doc_type(fpath), (True, "CPE Dictionary"))
+
+    def sniff_ambiguous_test(self):
+        long_comment = self._write_file("comment.xml",
+                                        "<!--" + "x" * ch.SNIFF_SIZE + "-->"
+                                        "<Benchmark/>")
+        compressed = self._write_file("ds.xml.bz2", "BZh91AY&SY")
+
+        self.assertEqual(ch._sniff_doc_type(long_comment), (False, None))
+        self.assertEqual(ch._sniff_doc_type(compressed), (False, None))
+
+    @mock.patch("org_fedora_oscap.content_handling.execReadlines")
+    def explore_content_files_test(self, exec_readlines):
+        exec_readlines.return_value = ["Document type: XCCDF Checklist"]
+        compressed = self._write_file("ds.xml.bz2", "BZh91AY&SY")
+
+        fpaths = ["../testing_files/scap-mycheck-oval.xml",
+                  compressed,
+                  "../testing_files/tailoring.xml",
+                  "../testing_files/testing_ds.xml",
+                  "../testing_files/xccdf.xml",
+                  ]
+        content_class, files = ch.explore_content_files(fpaths)
+
+        # 'oscap info' only run for the ambiguous file
+        exec_readlines.assert_called_once_with("oscap", ["info", compressed])
+        self.assertEqual(content_class, ch.DataStreamHandler)
+        self.assertEqual(files, ch.ContentFiles("../testing_files/testing_ds.xml",
+                                                "",
+                                                "../testing_files/tailoring.xml"))
+
+    def explore_no_files_test(self):
+        self.assertEqual(ch.explore_content_files([]),
+                         (None, ch.ContentFiles("", "", "")))
+
+
+class SummarizeResultsTest(unittest.TestCase):
+    """Tests for the summarize_results function."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.results_path = os.path.join(self.tmp_dir, "results.xml")
+        with open(self.results_path, "w") as fobj:
+            fobj.write(RESULTS)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def summary_test(self):
+        (counts, failed_rules) = ch.summarize_results(self.results_path)
+
+        self.assertEqual(counts, {"fail": 2, "fixed": 1, "pass": 1})
+        self.assertEqual(failed_rules,
+                         ["xccdf_com.example_rule_tmp_part",
+                          "xccdf_com.example_rule_iptables_installed"])
+
+    def arf_results_test(self):
+        with open(self.results_path, "w") as fobj:
+            fobj.write("""<?xml version="1.0" encoding="UTF-8"?>
+<arf:asset-report-collection xmlns:arf="http://scap.nist.gov/schema/asset-reporting-format/1.1">
+  <arf:reports>
+    <arf:report id="oval0">
+      <arf:content>
+        <oval_results xmlns="http://oval.mitre.org/XMLSchema/oval-results-5">
+          <result>true</result>
+        </oval_results>
+      </arf:content>
+    </arf:report>
+    <arf:report id="xccdf1">
+      <arf:content>
+        <TestResult xmlns="http://checklists.nist.gov/xccdf/1.2" id="xccdf_t_testresult_default">
+          <rule-result idref="xccdf_com.example_rule_tmp_part">
+            <result>fail</result>
+            <check><check-content-ref name="oval:x:def:1"/></check>
+          </rule-result>
+          <rule-result idref="xccdf_com.example_rule_telnet_not_installed">
+            <result>pass</result>
+          </rule-result>
+          <rule-result idref="xccdf_com.example_rule_no_result"/>
+        </TestResult>
+      </arf:content>
+    </arf:report>
+  </arf:reports>
+</arf:asset-report-collection>
+""")
+
+        (counts, failed_rules) = ch.summarize_results(self.results_path)
+
+        self.assertEqual(counts, {"fail": 1, "pass": 1})
+        self.assertEqual(failed_rules, ["xccdf_com.example_rule_tmp_part"])
+
+    def invalid_results_test(self):
+        with open(self.results_path, "w") as fobj:
+            fobj.write("<Benchmark><TestResult>")
+
+        with self.assertRaises(ch.ContentHandlingError):
+            ch.summarize_results(self.results_path)
+
+    def missing_results_test(self):
+        with self.assertRaises(ch.ContentHandlingError):
+            ch.summarize_results(os.path.join(self.tmp_dir, "missing.xml"))
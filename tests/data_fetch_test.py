@@ -21,7 +21,14 @@
 """Module with tests for the data_fetch module"""
 
 import unittest
+import os
+import shutil
+import tempfile
+import hashlib
+import mock
+
 from org_fedora_oscap import data_fetch
+from org_fedora_oscap import utils
 
 
 class CanFetchFromTest(unittest.TestCase):
@@ -33,3 +40,195 @@ class CanFetchFromTest(unittest.TestCase):
 
     def unsupported_url_test(self):
         self.assertFalse(data_fetch.can_fetch_from("aaaaa"))
+
+
+class FakeCurl(object):
+    """
+    Fake pycurl.Curl object serving the given data in two chunks, failing the
+    transfers in the given list of failures (after the first chunk). Like
+    libcurl, it fails with E_RANGE_ERROR if a transfer is to be resumed and
+    the server doesn't support ranges.
+
+    """
+
+    def __init__(self, data, failures=None, ranges=True):
+        self.data = data
+        self.failures = failures or []
+        self.ranges = ranges
+        self.offsets = []
+        self._opts = dict()
+        self._code = None
+
+    def __call__(self):
+        return self
+
+    def setopt(self, opt, value):
+        self._opts[opt] = value
+
+    def getinfo(self, info):
+        assert info == data_fetch.pycurl.RESPONSE_CODE
+        return self._code
+
+    def perform(self):
+        offset = self._opts.get(data_fetch.pycurl.RESUME_FROM_LARGE, 0)
+        self.offsets.append(offset)
+
+        data = self.data
+        self._code = 200
+        if offset:
+            if not self.ranges:
+                raise data_fetch.pycurl.error(data_fetch.pycurl.E_RANGE_ERROR,
+                                              "cannot resume")
+            data = data[offset:]
+            self._code = 206
+
+        write = self._opts[data_fetch.pycurl.WRITEFUNCTION]
+        half = len(data) // 2
+        write(data[:half])
+        if self.failures:
+            raise data_fetch.pycurl.error(self.failures.pop(0), "failed")
+        write(data[half:])
+
+
+class FetchDataTest(unittest.TestCase):
+    """Tests for the fetch_data function"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.out_file = os.path.join(self.tmp_dir, "content.xml")
+        self.fingerprint = hashlib.sha256("some content").hexdigest()
+
+        self.curl = FakeCurl("some content")
+        patcher = mock.patch("org_fedora_oscap.data_fetch.pycurl.Curl",
+                             self.curl)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        patcher = mock.patch("org_fedora_oscap.data_fetch.time.sleep")
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def fetch_test(self):
+        data_fetch.fetch_data("http://example.com/content.xml", self.out_file)
+
+        with open(self.out_file, "r") as fobj:
+            self.assertEqual(fobj.read(), "some content")
+
+    @mock.patch("org_fedora_oscap.utils.get_file_fingerprint")
+    def fingerprint_test(self, get_fingerprint):
+        data_fetch.fetch_data("http://example.com/content.xml", self.out_file,
+                              fingerprint=self.fingerprint)
+
+        with open(self.out_file, "r") as fobj:
+            self.assertEqual(fobj.read(), "some content")
+
+        # digest recorded when fetching, no need to read the file again
+        self.assertEqual(utils.get_file_digest(self.out_file, "sha256"),
+                         self.fingerprint)
+        self.assertFalse(get_fingerprint.called)
+
+    def fingerprint_mismatch_test(self):
+        with self.assertRaises(data_fetch.IntegrityCheckError):
+            data_fetch.fetch_data("http://example.com/content.xml",
+                                  self.out_file,
+                                  fingerprint=hashlib.sha256("other").hexdigest())
+
+        self.assertEqual(utils.get_file_digest(self.out_file, "sha256"),
+                         self.fingerprint)
+
+    def _check_content(self):
+        with open(self.out_file, "r") as fobj:
+            self.assertEqual(fobj.read(), "some content")
+
+        # no partial files left behind
+        self.assertEqual(os.listdir(self.tmp_dir), ["content.xml"])
+
+    def resume_test(self):
+        self.curl.failures = [data_fetch.pycurl.E_RECV_ERROR]
+        data_fetch.fetch_data("http://example.com/content.xml", self.out_file,
+                              fingerprint=self.fingerprint)
+
+        self._check_content()
+        self.assertEqual(self.curl.offsets, [0, 6])
+        self.assertEqual(self.sleep.call_count, 1)
+        self.assertEqual(utils.get_file_digest(self.out_file, "sha256"),
+                         self.fingerprint)
+
+    def resume_not_supported_test(self):
+        self.curl.failures = [data_fetch.pycurl.E_RECV_ERROR]
+        self.curl.ranges = False
+        data_fetch.fetch_data("http://example.com/content.xml", self.out_file,
+                              fingerprint=self.fingerprint)
+
+        self._check_content()
+        self.assertEqual(self.curl.offsets, [0, 6, 0])
+        self.assertEqual(utils.get_file_digest(self.out_file, "sha256"),
+                         self.fingerprint)
+
+    def limits_test(self):
+        pycurl = data_fetch.pycurl
+        data_fetch.fetch_data("http://example.com/content.xml", self.out_file)
+        self.assertEqual(self.curl._opts[pycurl.CONNECTTIMEOUT],
+                         data_fetch.CONNECT_TIMEOUT)
+        self.assertEqual(self.curl._opts[pycurl.LOW_SPEED_LIMIT],
+                         data_fetch.LOW_SPEED_LIMIT)
+        self.assertEqual(self.curl._opts[pycurl.LOW_SPEED_TIME],
+                         data_fetch.LOW_SPEED_TIME)
+
+        data_fetch.fetch_data("http://example.com/content.xml", self.out_file,
+                              connect_timeout=5, low_speed_limit=100,
+                              low_speed_time=600)
+        self.assertEqual(self.curl._opts[pycurl.CONNECTTIMEOUT], 5)
+        self.assertEqual(self.curl._opts[pycurl.LOW_SPEED_LIMIT], 100)
+        self.assertEqual(self.curl._opts[pycurl.LOW_SPEED_TIME], 600)
+
+    def stale_part_file_test(self):
+        self.curl.failures = [data_fetch.pycurl.E_RECV_ERROR] * \
+                             (data_fetch.FETCH_RETRIES + 1)
+        with self.assertRaises(data_fetch.FetchError):
+            data_fetch.fetch_data("http://example.com/content.xml",
+                                  self.out_file)
+        self.assertFalse(os.path.exists(self.out_file))
+
+        # the data may have changed in the meantime, the partial data left
+        # behind is not resumed by the next call
+        self.curl.data = "some changed content"
+        self.curl.offsets = []
+        data_fetch.fetch_data("http://example.com/content.xml", self.out_file)
+
+        with open(self.out_file, "r") as fobj:
+            self.assertEqual(fobj.read(), "some changed content")
+        self.assertEqual(os.listdir(self.tmp_dir), ["content.xml"])
+        self.assertEqual(self.curl.offsets, [0])
+
+    def resume_error_test(self):
+        self.curl.failures = [data_fetch.pycurl.E_RECV_ERROR,
+                              data_fetch.pycurl.E_FTP_COULDNT_USE_REST]
+        data_fetch.fetch_data("ftp://example.com/content.xml", self.out_file,
+                              fingerprint=self.fingerprint)
+
+        self._check_content()
+        self.assertEqual(self.curl.offsets, [0, 6, 0])
+        self.assertEqual(self.sleep.call_count, 1)
+
+    def no_retry_test(self):
+        self.curl.failures = [data_fetch.pycurl.E_SSL_CACERT]
+        with self.assertRaises(data_fetch.CertificateValidationError):
+            data_fetch.fetch_data("https://example.com/content.xml",
+                                  self.out_file)
+
+        self.assertFalse(self.sleep.called)
+
+
+class GetRetryDelaysTest(unittest.TestCase):
+    """Tests for the _get_retry_delays function"""
+
+    def delays_test(self):
+        delays = list(data_fetch._get_retry_delays(6, 1, 10))
+
+        self.assertEqual(len(delays), 6)
+        for (delay, max_delay) in zip(delays, [1, 2, 4, 8, 10, 10]):
+            self.assertTrue(max_delay / 2.0 <= delay <= max_delay)
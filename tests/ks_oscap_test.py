@@ -381,3 +381,145 @@ class FingerprintTests(unittest.TestCase):
         with self.assertRaisesRegexp(KickstartValueError,
                                      "Unsupported fingerprint"):
             self.oscap_data.handle_line("fingerprint = %s" % ("a" * 124))
+
+
+class DropArchiveTest(unittest.TestCase):
+    """Tests for the drop-archive option."""
+
+    def setUp(self):
+        self.oscap_data = OSCAPdata("org_fedora_oscap")
+        self.oscap_data.handle_line("content-type = archive")
+        self.oscap_data.handle_line("content-url = http://example.com/t.zip")
+        self.oscap_data.handle_line("content-path = ssg.xml")
+        self.oscap_data.handle_line("profile = default")
+
+    def default_test(self):
+        self.assertFalse(self.oscap_data.drop_archive)
+        self.assertFalse(self.oscap_data.raw_content_droppable)
+        self.assertNotIn("drop-archive", str(self.oscap_data))
+
+    def parsing_test(self):
+        self.oscap_data.handle_line("drop-archive = yes")
+        self.assertTrue(self.oscap_data.drop_archive)
+        self.assertTrue(self.oscap_data.raw_content_droppable)
+        self.assertIn("    drop-archive = yes\n", str(self.oscap_data))
+
+        self.oscap_data.handle_line("drop-archive = False")
+        self.assertFalse(self.oscap_data.drop_archive)
+
+    def invalid_value_test(self):
+        with self.assertRaisesRegexp(KickstartValueError,
+                                     "Invalid value 'maybe' of drop-archive"):
+            self.oscap_data.handle_line("drop-archive = maybe")
+
+    def rpm_not_droppable_test(self):
+        self.oscap_data.handle_line("content-type = rpm")
+        self.oscap_data.handle_line("drop-archive = yes")
+        self.assertFalse(self.oscap_data.raw_content_droppable)
+
+
+class RemediateOptionTest(unittest.TestCase):
+    """Tests for the remediate option."""
+
+    def setUp(self):
+        self.oscap_data = OSCAPdata("org_fedora_oscap")
+        for line in ["content-type = datastream",
+                     "content-url = https://example.com/hardening.xml",
+                     "profile = Web Server"]:
+            self.oscap_data.handle_line(line)
+
+    def default_test(self):
+        self.assertEqual(self.oscap_data.remediate, "full")
+        self.assertNotIn("remediate", str(self.oscap_data))
+
+    def parsing_test(self):
+        for mode in ("fix-only", "script", "none", "full"):
+            self.oscap_data.handle_line("remediate = %s" % mode.upper())
+            self.assertEqual(self.oscap_data.remediate, mode)
+
+        self.oscap_data.handle_line("remediate = fix-only")
+        self.assertIn("    remediate = fix-only\n", str(self.oscap_data))
+
+    def invalid_mode_test(self):
+        with self.assertRaisesRegexp(KickstartValueError,
+                                     "Unsupported remediation mode 'some'"):
+            self.oscap_data.handle_line("remediate = some")
+
+    def results_options_test(self):
+        self.oscap_data.handle_line("remediate = fix-only")
+        self.oscap_data.finalize()
+
+        for line in ["results-format = arf", "results-compression = gzip",
+                     "deferred-report = yes"]:
+            for mode in ("fix-only", "script", "none"):
+                self.setUp()
+                self.oscap_data.handle_line("remediate = %s" % mode)
+                self.oscap_data.handle_line(line)
+                with self.assertRaisesRegexp(KickstartValueError,
+                                             "'%s' remediation mode" % mode):
+                    self.oscap_data.finalize()
+
+
+class DeferredReportTest(unittest.TestCase):
+    """Tests for the deferred-report option."""
+
+    def setUp(self):
+        self.oscap_data = OSCAPdata("org_fedora_oscap")
+        for line in ["content-type = datastream",
+                     "content-url = https://example.com/hardening.xml",
+                     "profile = Web Server"]:
+            self.oscap_data.handle_line(line)
+
+    def parsing_test(self):
+        self.assertFalse(self.oscap_data.deferred_report)
+        self.assertNotIn("deferred-report", str(self.oscap_data))
+
+        self.oscap_data.handle_line("deferred-report = yes")
+        self.assertTrue(self.oscap_data.deferred_report)
+        self.assertIn("    deferred-report = yes\n", str(self.oscap_data))
+
+    def invalid_value_test(self):
+        with self.assertRaises(KickstartValueError):
+            self.oscap_data.handle_line("deferred-report = later")
+
+
+class ResultsOptionsTest(unittest.TestCase):
+    """Tests for the results-format and results-compression options."""
+
+    def setUp(self):
+        self.oscap_data = OSCAPdata("org_fedora_oscap")
+        for line in ["content-type = datastream",
+                     "content-url = https://example.com/hardening.xml",
+                     "profile = Web Server"]:
+            self.oscap_data.handle_line(line)
+
+    def default_test(self):
+        self.assertEqual(self.oscap_data.results_format, "xccdf")
+        self.assertEqual(self.oscap_data.results_compression, "none")
+        self.assertNotIn("results-", str(self.oscap_data))
+
+    def parsing_test(self):
+        self.oscap_data.handle_line("results-format = ARF")
+        self.oscap_data.handle_line("results-compression = zstd")
+        self.oscap_data.finalize()
+
+        self.assertEqual(self.oscap_data.results_format, "arf")
+        self.assertEqual(self.oscap_data.results_compression, "zstd")
+        self.assertIn("    results-format = arf\n"
+                      "    results-compression = zstd\n",
+                      str(self.oscap_data))
+
+    def invalid_values_test(self):
+        with self.assertRaisesRegexp(KickstartValueError,
+                                     "Unsupported results format"):
+            self.oscap_data.handle_line("results-format = html")
+        with self.assertRaisesRegexp(KickstartValueError,
+                                     "Unsupported results compression"):
+            self.oscap_data.handle_line("results-compression = rar")
+
+    def compression_with_deferred_report_test(self):
+        self.oscap_data.handle_line("results-compression = gzip")
+        self.oscap_data.handle_line("deferred-report = yes")
+
+        with self.assertRaisesRegexp(KickstartValueError, "deferred report"):
+            self.oscap_data.finalize()
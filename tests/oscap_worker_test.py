@@ -0,0 +1,271 @@
+#
+# Copyright (C) 2013  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+"""Module with unit tests for the oscap_worker.py module"""
+
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import mock
+from StringIO import StringIO
+
+from org_fedora_oscap import oscap_worker
+
+# worker serving fake fix rules, "crash" profile kills it unless the given
+# marker file exists (it is created before), "hang" profile never gets its
+# rules and "no-rules" profile gets an invalid response
+FAKE_WORKER = """
+import os
+import sys
+import time
+from org_fedora_oscap import oscap_worker
+
+class Handler(object):
+    def get_fix_rules(self, profile, template, ds_id, xccdf_id):
+        if profile == "crash" and not os.path.exists(sys.argv[1]):
+            open(sys.argv[1], "w").close()
+            os._exit(1)
+        if profile == "always-crash":
+            os._exit(1)
+        if profile == "missing":
+            raise oscap_worker.OSCAPWorkerError("No profile 'missing'")
+        if profile == "hang":
+            time.sleep(60)
+        if profile == "no-rules":
+            oscap_worker.write_message(sys.stdout, {"unexpected": True})
+            os._exit(0)
+        return "%s %s %s %s" % (profile, template, ds_id, xccdf_id)
+
+oscap_worker._load_content_handler = lambda content, tailoring: Handler()
+oscap_worker.serve(sys.argv[1], sys.argv[2], os.fdopen(0, "rb", 0),
+                   sys.stdout)
+"""
+
+
+class FakeHandler(object):
+    def get_fix_rules(self, profile, template, ds_id, xccdf_id):
+        if profile == "missing":
+            raise oscap_worker.OSCAPWorkerError("No profile 'missing'")
+        return "rules for %s" % profile
+
+
+class ProtocolTest(unittest.TestCase):
+    """Tests for the message reading and writing."""
+
+    def roundtrip_test(self):
+        fobj = StringIO()
+        oscap_worker.write_message(fobj, {"rules": "package --add=aide"})
+        oscap_worker.write_message(fobj, {"error": "failure"})
+        fobj.seek(0)
+
+        self.assertEqual(oscap_worker.read_message(fobj),
+                         {"rules": "package --add=aide"})
+        self.assertEqual(oscap_worker.read_message(fobj), {"error": "failure"})
+        self.assertIsNone(oscap_worker.read_message(fobj))
+
+    def truncated_test(self):
+        fobj = StringIO()
+        oscap_worker.write_message(fobj, {"rules": "package --add=aide"})
+
+        with self.assertRaises(oscap_worker.WorkerProtocolError):
+            oscap_worker.read_message(StringIO(fobj.getvalue()[:-2]))
+        with self.assertRaises(oscap_worker.WorkerProtocolError):
+            oscap_worker.read_message(StringIO(fobj.getvalue()[:2]))
+
+    def invalid_test(self):
+        with self.assertRaises(oscap_worker.WorkerProtocolError):
+            oscap_worker.read_message(StringIO("\0\0\0\x03abc"))
+        with self.assertRaises(oscap_worker.WorkerProtocolError):
+            oscap_worker.read_message(StringIO("\xff\xff\xff\xff"))
+
+
+class ServeTest(unittest.TestCase):
+    """Tests for the worker side."""
+
+    def setUp(self):
+        (read_fd, write_fd) = os.pipe()
+        self.in_obj = os.fdopen(read_fd, "rb", 0)
+        self.requests = os.fdopen(write_fd, "wb")
+        self.out_obj = StringIO()
+
+    def tearDown(self):
+        self.in_obj.close()
+        if not self.requests.closed:
+            self.requests.close()
+
+    def _serve(self, handler, idle_timeout=None):
+        with mock.patch("org_fedora_oscap.oscap_worker._load_content_handler",
+                        return_value=handler):
+            oscap_worker.serve("content.xml", "", self.in_obj, self.out_obj,
+                               idle_timeout)
+
+        self.out_obj.seek(0)
+        responses = []
+        response = oscap_worker.read_message(self.out_obj)
+        while response is not None:
+            responses.append(response)
+            response = oscap_worker.read_message(self.out_obj)
+
+        return responses
+
+    def requests_test(self):
+        for profile in ("profile1", "missing"):
+            oscap_worker.write_message(self.requests,
+                                       {"profile": profile, "template": "t",
+                                        "ds_id": "", "xccdf_id": ""})
+        self.requests.close()
+
+        responses = self._serve(FakeHandler())
+        self.assertEqual(responses[0], {"rules": "rules for profile1"})
+        self.assertIn("No profile 'missing'", responses[1]["error"])
+
+    def invalid_request_test(self):
+        oscap_worker.write_message(self.requests, {"template": "t"})
+        self.requests.close()
+
+        responses = self._serve(FakeHandler())
+        self.assertIn("error", responses[0])
+
+    @mock.patch("org_fedora_oscap.oscap_worker.log")
+    def session_pool_stats_test(self, log):
+        handler = FakeHandler()
+        handler.session_pool_stats = {"hits": 1, "misses": 1, "sessions": 1}
+        self.requests.close()
+
+        self._serve(handler)
+        self.assertIn(handler.session_pool_stats, log.debug.call_args[0])
+
+    def idle_test(self):
+        # no request comes, the worker quits
+        self.assertEqual(self._serve(FakeHandler(), idle_timeout=0.1), [])
+
+    def invalid_content_test(self):
+        oscap_worker.write_message(self.requests,
+                                   {"profile": "p", "template": "t",
+                                    "ds_id": "", "xccdf_id": ""})
+        self.requests.close()
+
+        handler = mock.Mock(side_effect=oscap_worker.OSCAPWorkerError("bad"))
+        with mock.patch("org_fedora_oscap.oscap_worker._load_content_handler",
+                        handler):
+            oscap_worker.serve("content.xml", "", self.in_obj, self.out_obj,
+                               None)
+
+        self.out_obj.seek(0)
+        self.assertIn("bad", oscap_worker.read_message(self.out_obj)["error"])
+
+
+class FakeWorker(oscap_worker.OSCAPWorker):
+    def _get_command(self):
+        return [sys.executable, "-c", FAKE_WORKER, self.content_path,
+                self.tailoring_path]
+
+
+class OSCAPWorkerTest(unittest.TestCase):
+    """Tests for the client of the worker process."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        # the fake worker uses the content path as the crash marker
+        self.worker = FakeWorker(os.path.join(self.tmp_dir, "crashed"))
+
+    def tearDown(self):
+        self.worker.stop()
+        shutil.rmtree(self.tmp_dir)
+
+    def get_fix_rules_test(self):
+        self.worker.start()
+        self.assertEqual(self.worker.get_fix_rules("p1", "t", "ds", "x"),
+                         "p1 t ds x")
+        self.assertEqual(self.worker.get_fix_rules("p2", "t"), "p2 t  ")
+
+    def error_test(self):
+        with self.assertRaisesRegexp(oscap_worker.OSCAPWorkerError,
+                                     "No profile 'missing'"):
+            self.worker.get_fix_rules("missing", "t")
+
+        # still usable
+        self.assertEqual(self.worker.get_fix_rules("p1", "t"), "p1 t  ")
+
+    def restart_test(self):
+        self.assertEqual(self.worker.get_fix_rules("crash", "t"), "crash t  ")
+
+    def always_crashing_test(self):
+        with self.assertRaisesRegexp(oscap_worker.OSCAPWorkerError,
+                                     "keeps crashing"):
+            self.worker.get_fix_rules("always-crash", "t")
+
+        # restarted for the next request
+        self.assertEqual(self.worker.get_fix_rules("p1", "t"), "p1 t  ")
+
+    def stopped_test(self):
+        self.worker.get_fix_rules("p1", "t")
+        self.worker.stop()
+
+        # started again on demand
+        self.assertEqual(self.worker.get_fix_rules("p2", "t"), "p2 t  ")
+
+    def invalid_response_test(self):
+        with self.assertRaisesRegexp(oscap_worker.OSCAPWorkerError,
+                                     "no rules"):
+            self.worker.get_fix_rules("no-rules", "t")
+
+    def stop_during_request_test(self):
+        errors = []
+
+        def get_rules():
+            try:
+                self.worker.get_fix_rules("hang", "t")
+            except oscap_worker.OSCAPWorkerError as err:
+                errors.append(err)
+
+        thread = threading.Thread(target=get_rules)
+        thread.start()
+        # wait for the request to be sent
+        while not self.worker._lock.locked():
+            time.sleep(0.01)
+        time.sleep(0.2)
+
+        start = time.time()
+        self.worker.stop()
+        thread.join()
+
+        # the request is not waited for and not retried
+        self.assertLess(time.time() - start, 5)
+        self.assertEqual(len(errors), 1)
+        self.assertIn("stopped", str(errors[0]))
+
+    def parallel_requests_test(self):
+        results = dict()
+
+        def get_rules(profile):
+            results[profile] = self.worker.get_fix_rules(profile, "t")
+
+        threads = [threading.Thread(target=get_rules, args=("p%d" % i,))
+                   for i in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, dict(("p%d" % i, "p%d t  " % i)
+                                       for i in range(5)))
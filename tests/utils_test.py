@@ -22,6 +22,10 @@
 
 import unittest
 import os
+import errno
+import shutil
+import tempfile
+import hashlib
 import mock
 from collections import namedtuple
 
@@ -142,3 +146,184 @@ class KeepTypeMapTest(unittest.TestCase):
 
         # any better test for this?
         self.assertIn("next", dir(mapped_gen))
+
+
+class GetFileDigestTest(unittest.TestCase):
+    """Tests for the get_file_digest function."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.fpath = os.path.join(self.tmp_dir, "file")
+        with open(self.fpath, "w") as fobj:
+            fobj.write("content")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def digest_test(self):
+        self.assertEqual(utils.get_file_digest(self.fpath),
+                         hashlib.sha256("content").hexdigest())
+        self.assertEqual(utils.get_file_digest(self.fpath, "md5"),
+                         hashlib.md5("content").hexdigest())
+
+    def changed_file_test(self):
+        utils.get_file_digest(self.fpath)
+        with open(self.fpath, "w") as fobj:
+            fobj.write("changed content")
+
+        self.assertEqual(utils.get_file_digest(self.fpath),
+                         hashlib.sha256("changed content").hexdigest())
+
+    def missing_file_test(self):
+        with self.assertRaises(OSError):
+            utils.get_file_digest(os.path.join(self.tmp_dir, "missing"))
+
+    @mock.patch("org_fedora_oscap.utils.get_file_fingerprint")
+    def recorded_digest_test(self, get_fingerprint):
+        utils.record_file_digest(self.fpath, "sha256", "recorded")
+
+        self.assertEqual(utils.get_file_digest(self.fpath), "recorded")
+        self.assertFalse(get_fingerprint.called)
+
+
+class GetDirSizeTest(unittest.TestCase):
+    """Tests for the get_dir_size function."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def dir_size_test(self):
+        os.mkdir(os.path.join(self.tmp_dir, "sub"))
+        with open(os.path.join(self.tmp_dir, "a"), "w") as fobj:
+            fobj.write("a" * 10)
+        with open(os.path.join(self.tmp_dir, "sub", "b"), "w") as fobj:
+            fobj.write("b" * 5)
+
+        self.assertEqual(utils.get_dir_size(self.tmp_dir), 15)
+
+    def missing_dir_test(self):
+        self.assertEqual(utils.get_dir_size(os.path.join(self.tmp_dir, "x")),
+                         0)
+
+
+class BulkCopyTest(unittest.TestCase):
+    """Tests for the bulk_copy function."""
+
+    def setUp(self):
+        self.src_dir = tempfile.mkdtemp()
+        self.dst_dir = tempfile.mkdtemp()
+
+        os.makedirs(os.path.join(self.src_dir, "sub", "subsub"))
+        for (fpath, content) in (("a.xml", "a" * 100),
+                                 ("sub/b.sh", "b" * 10),
+                                 ("sub/subsub/c", ""),
+                                 (".hidden", "hidden")):
+            with open(os.path.join(self.src_dir, fpath), "w") as fobj:
+                fobj.write(content)
+        os.chmod(os.path.join(self.src_dir, "sub", "b.sh"), 0o755)
+        os.symlink("b.sh", os.path.join(self.src_dir, "sub", "link"))
+
+    def tearDown(self):
+        shutil.rmtree(self.src_dir)
+        shutil.rmtree(self.dst_dir)
+
+    def _check_copied(self):
+        dst = lambda fpath: os.path.join(self.dst_dir, fpath)
+        with open(dst("a.xml")) as fobj:
+            self.assertEqual(fobj.read(), "a" * 100)
+        with open(dst("sub/b.sh")) as fobj:
+            self.assertEqual(fobj.read(), "b" * 10)
+        self.assertEqual(os.stat(dst("sub/b.sh")).st_mode & 0o777, 0o755)
+        self.assertTrue(os.path.isfile(dst("sub/subsub/c")))
+        self.assertEqual(os.readlink(dst("sub/link")), "b.sh")
+        self.assertFalse(os.path.exists(dst(".hidden")))
+
+    def copy_test(self):
+        (num_files, num_bytes, _duration) = utils.bulk_copy(self.src_dir,
+                                                            self.dst_dir)
+        self.assertEqual(num_files, 4)
+        self.assertEqual(num_bytes, 110)
+        self._check_copied()
+
+        # source left untouched
+        self.assertTrue(os.path.exists(os.path.join(self.src_dir, "a.xml")))
+
+    def move_test(self):
+        utils.bulk_copy(self.src_dir, self.dst_dir, move=True)
+        self._check_copied()
+
+        # only the hidden file left behind
+        self.assertEqual(os.listdir(self.src_dir), [".hidden"])
+
+    def existing_destination_test(self):
+        os.mkdir(os.path.join(self.dst_dir, "sub"))
+        with open(os.path.join(self.dst_dir, "a.xml"), "w") as fobj:
+            fobj.write("old content that is longer than the new one" * 10)
+
+        utils.bulk_copy(self.src_dir, self.dst_dir)
+        self._check_copied()
+
+    @mock.patch("org_fedora_oscap.utils._KERNEL_COPY_FUNCS", [])
+    @mock.patch("org_fedora_oscap.utils.fcntl.ioctl")
+    def fallback_copy_test(self, ioctl):
+        ioctl.side_effect = IOError(errno.EOPNOTSUPP, "Not supported")
+
+        utils.bulk_copy(self.src_dir, self.dst_dir)
+        self.assertTrue(ioctl.called)
+        self._check_copied()
+
+    @mock.patch("org_fedora_oscap.utils.fcntl.ioctl")
+    def fallback_copy_size_test(self, ioctl):
+        ioctl.side_effect = IOError(errno.EOPNOTSUPP, "Not supported")
+        nothing_copied = mock.Mock(return_value=0)
+
+        src_path = os.path.join(self.src_dir, "a.xml")
+        dst_path = os.path.join(self.dst_dir, "a.xml")
+        with mock.patch("org_fedora_oscap.utils._KERNEL_COPY_FUNCS",
+                        [nothing_copied, nothing_copied]):
+            with open(src_path, "rb") as src_obj:
+                # the file gets longer after its size is checked
+                with mock.patch("org_fedora_oscap.utils.os.fstat") as fstat:
+                    fstat.return_value.st_size = 50
+                    with open(dst_path, "wb") as dst_obj:
+                        copied = utils._copy_file_data(src_obj, dst_obj)
+
+        # the kernel copies copying nothing are skipped, the actual number of
+        # bytes copied is reported
+        self.assertEqual(nothing_copied.call_count, 2)
+        self.assertEqual(copied, 100)
+        with open(dst_path) as fobj:
+            self.assertEqual(fobj.read(), "a" * 100)
+
+    def nested_dir_symlink_test(self):
+        os.symlink("subsub", os.path.join(self.src_dir, "sub", "dirlink"))
+
+        (num_files, _num_bytes, _duration) = utils.bulk_copy(self.src_dir,
+                                                             self.dst_dir)
+        self.assertEqual(num_files, 5)
+        self._check_copied()
+        dirlink = os.path.join(self.dst_dir, "sub", "dirlink")
+        self.assertEqual(os.readlink(dirlink), "subsub")
+
+    def nested_dir_symlink_move_test(self):
+        os.symlink("subsub", os.path.join(self.src_dir, "sub", "dirlink"))
+
+        utils.bulk_copy(self.src_dir, self.dst_dir, move=True)
+        self._check_copied()
+        dirlink = os.path.join(self.dst_dir, "sub", "dirlink")
+        self.assertEqual(os.readlink(dirlink), "subsub")
+        self.assertEqual(os.listdir(self.src_dir), [".hidden"])
+
+    def kernel_copy_test(self):
+        for kernel_copy in utils._KERNEL_COPY_FUNCS:
+            src_path = os.path.join(self.src_dir, "a.xml")
+            dst_path = os.path.join(self.dst_dir, "a.xml")
+            with open(src_path, "rb") as src_obj:
+                with open(dst_path, "wb") as dst_obj:
+                    copied = kernel_copy(src_obj.fileno(), dst_obj.fileno(), 0)
+            self.assertEqual(copied, 100)
+            with open(dst_path) as fobj:
+                self.assertEqual(fobj.read(), "a" * 100)